@@ -1,8 +1,21 @@
+import io
+import json
+import os
+import struct
 import sys
+import tarfile
+import time
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
-from PIL import Image, ImageDraw, ImageFont
+import numpy as np
+from PIL import Image, ImageChops, ImageDraw, ImageFont
 import argparse
-from typing import List, Tuple, Any, ClassVar, Literal, Callable, Union
+from typing import List, Tuple, Any, ClassVar, Literal, Callable, Union, Iterator
+
+ARCHIVE_EXTENSIONS: Tuple[str, ...] = (".zip", ".tar", ".tar.gz", ".tgz")
 
 
 def _replace_text(text: str, size: tuple[int, int], index: str) -> str:
@@ -24,12 +37,394 @@ def _get_text_size(text: str, font: ImageFont, spacing : int = 2) -> Tuple[int,
     return contents_width, contents_height
 
 
+def _get_nearest_index(src_length: int, dst_length: int) -> np.ndarray:
+    """
+    NEAREST拡大で出力の各ピクセルが参照する元ピクセルの位置
+    Pillow自身に連番を拡大させるので Image.resize(NEAREST) と完全に一致する
+    """
+    indices: Image = Image.fromarray(np.arange(src_length, dtype=np.int32)[np.newaxis, :], 'I')
+    return np.asarray(indices.resize((dst_length, 1), resample=Image.Resampling.NEAREST))[0].astype(np.intp)
+
+
+def _write_png_chunk(fp: Any, chunk_type: bytes, data: bytes) -> None:
+    fp.write(struct.pack(">I", len(data)))
+    fp.write(chunk_type)
+    fp.write(data)
+    fp.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type))))
+
+
+def save_png_rows(small: Image, xs: np.ndarray, ys: np.ndarray, output: Path, compress_level: int = 6) -> None:
+    """
+    小さい画像をNEARESTで拡大しながら1行ずつPNGに書き出す
+    拡大した画像全体をメモリに持たないので、拡大元の画像の他は数MBのメモリで書き出せる
+    :param small: 拡大元のRGB画像
+    :param xs: 出力の各列が参照する元の列
+    :param ys: 出力の各行が参照する元の行
+    """
+    compressor = zlib.compressobj(compress_level)
+    with open(output, "wb") as fp:
+        fp.write(b"\x89PNG\r\n\x1a\n")
+        # 8bit RGB
+        _write_png_chunk(fp, b"IHDR", struct.pack(">IIBBBBB", len(xs), len(ys), 8, 2, 0, 0, 0))
+        row: bytes = b""
+        prev_y: int = -1
+        buffer: List[bytes] = []
+        buffer_size: int = 0
+        for y in ys:
+            if y != prev_y:
+                # フィルタなし(0) + 拡大した1行分
+                src_row: np.ndarray = np.frombuffer(small.crop((0, y, small.width, y + 1)).tobytes(), dtype=np.uint8)
+                row = b"\x00" + src_row.reshape(-1, 3)[xs].tobytes()
+                prev_y = y
+            data: bytes = compressor.compress(row)
+            if len(data) > 0:
+                buffer.append(data)
+                buffer_size += len(data)
+            if buffer_size >= 1 << 20:
+                _write_png_chunk(fp, b"IDAT", b"".join(buffer))
+                buffer, buffer_size = [], 0
+        buffer.append(compressor.flush())
+        _write_png_chunk(fp, b"IDAT", b"".join(buffer))
+        _write_png_chunk(fp, b"IEND", b"")
+
+
+class DummyImageTemplate:
+    """
+    連番で変わらない部分(背景・枠・{i}を含まない文字)を一度だけ描いて使いまわす
+    連番ごとに小さい画像へ変わる文字だけを描き足し、変わった範囲だけを拡大して大きい画像に貼る
+    """
+    size: Tuple[int, int]
+    small_size: Tuple[int, int]
+    text_color: Tuple[int, int, int]
+    font: ImageFont
+    layers: List[str]
+    first_dynamic_layer: int
+    _small_base: Image
+    _big_base: np.ndarray | None
+    _xs: np.ndarray
+    _ys: np.ndarray
+
+    def __init__(self, size: Tuple[int, int], color: Tuple[int, int, int], text_color: Tuple[int, int, int],
+                 title: str, bottom_contents: str, center_text: str, font: ImageFont):
+        self.size = size
+        self.small_size = (int(size[0] / 3), int(size[1] / 3))
+        self.text_color = text_color
+        self.font = font
+        self.layers = [title, bottom_contents, center_text]
+        # 重なったときの描画順を変えないように、最初に{i}を含む文字から後ろは連番ごとに描く
+        self.first_dynamic_layer = next((i for i, x in enumerate(self.layers) if "{i}" in x), len(self.layers))
+        image: Image = Image.new("RGB", self.small_size, color)
+        draw = ImageDraw.Draw(image)
+        xx: int = self.small_size[0] - 2 - 1
+        yy: int = self.small_size[1] - 2 - 1
+        draw.rectangle((2, 2, xx, yy), outline=text_color, width=1)
+        self._draw_layers(draw, "", 0, self.first_dynamic_layer)
+        self._small_base = image
+        # 拡大した画像は使うときに作る(streamingでは作らない)
+        self._big_base = None
+        self._xs = _get_nearest_index(self.small_size[0], size[0])
+        self._ys = _get_nearest_index(self.small_size[1], size[1])
+
+    def _draw_layers(self, draw: ImageDraw, index_with_zero_pad: str, start: int, end: int) -> None:
+        size: Tuple[int, int] = self.size
+        small_size: Tuple[int, int] = self.small_size
+        text_color: Tuple[int, int, int] = self.text_color
+        font: ImageFont = self.font
+        if start <= 0 < end:
+            # 左上のタイトル文字
+            title: str = _replace_text(self.layers[0], size, index_with_zero_pad)
+            draw.text(
+                (6, 6), "{}".format(title, size[0], size[1]),
+                text_color, spacing=2, align='left', font=font
+            )
+        if start <= 1 < end:
+            # 右下の文字
+            bottom_contents: str = _replace_text(self.layers[1], size, index_with_zero_pad)
+            bottom_contents_size = _get_text_size(bottom_contents, font, spacing=2)
+            draw.text(
+                (small_size[0] - bottom_contents_size[0] - 6, small_size[1] - bottom_contents_size[1] - 6),
+                bottom_contents, text_color, spacing=2, align='right'
+            )
+        if start <= 2 < end:
+            # 中央の文字
+            center_text: str = _replace_text(self.layers[2], size, index_with_zero_pad)
+            center_text_size = _get_text_size(center_text, font, spacing=2)
+            draw.text(
+                (small_size[0] / 2 - center_text_size[0] / 2, small_size[1] / 2 - center_text_size[1] / 2),
+                center_text, text_color, spacing=2, align='center', font=font
+            )
+
+    def render_small(self, index_with_zero_pad: str) -> Image:
+        """
+        拡大前の小さい画像を描く
+        """
+        if self.first_dynamic_layer >= len(self.layers):
+            return self._small_base
+        small: Image = self._small_base.copy()
+        self._draw_layers(ImageDraw.Draw(small), index_with_zero_pad, self.first_dynamic_layer, len(self.layers))
+        return small
+
+    def save_streaming(self, index_with_zero_pad: str, output: Path) -> None:
+        """
+        拡大した画像を作らずに1行ずつPNGに書き出す
+        """
+        save_png_rows(self.render_small(index_with_zero_pad), self._xs, self._ys, output)
+
+    def render(self, index_with_zero_pad: str) -> Image:
+        if self._big_base is None:
+            # 小さく作って拡大している 文字の見栄えの調整
+            self._big_base = np.asarray(self._small_base.resize(self.size, resample=Image.Resampling.NEAREST))
+        big: np.ndarray = self._big_base.copy()
+        if self.first_dynamic_layer < len(self.layers):
+            small: Image = self.render_small(index_with_zero_pad)
+            bbox: Tuple[int, int, int, int] | None = ImageChops.difference(small, self._small_base).getbbox()
+            if bbox is not None:
+                # 小さい画像で変わった範囲を参照する大きい画像の範囲だけ拡大し直す
+                x0, x1 = np.searchsorted(self._xs, [bbox[0], bbox[2]])
+                y0, y1 = np.searchsorted(self._ys, [bbox[1], bbox[3]])
+                big[y0:y1, x0:x1] = np.asarray(small)[self._ys[y0:y1, np.newaxis], self._xs[np.newaxis, x0:x1]]
+        return Image.fromarray(big)
+
+
+CORPUS_MODES: List[str] = ["RGB", "RGBA", "L"]
+CORPUS_ASPECTS: List[Tuple[int, int]] = [(1, 1), (4, 3), (3, 4), (16, 9), (9, 16), (2, 1), (1, 2)]
+CORPUS_CONTENTS: List[str] = ["noise", "gradient", "mixed"]
+# gradient のエントロピー1で重ねるノイズの振れ幅 グラデーションの形は残す
+CORPUS_GRADIENT_NOISE: float = 48.0
+
+
+def get_corpus_spec(seed: int, index: int, max_size: Tuple[int, int], modes: List[str],
+                    entropy_range: Tuple[float, float]) -> dict:
+    """
+    コーパス画像の仕様(サイズ・モード・内容・エントロピー)を決める
+    シードと連番だけで決まるので、並列数や生成順に関係なく同じ結果になる
+    """
+    rng: np.random.Generator = np.random.default_rng([seed, index])
+    aspect: Tuple[int, int] = CORPUS_ASPECTS[rng.integers(len(CORPUS_ASPECTS))]
+    scale: float = rng.uniform(0.25, 1.0)
+    # 最大サイズに収まるようにアスペクト比を保って縮める
+    fit: float = min(max_size[0] / aspect[0], max_size[1] / aspect[1]) * scale
+    return {
+        "index": index,
+        "seed": [seed, index],
+        "width": max(8, int(aspect[0] * fit)),
+        "height": max(8, int(aspect[1] * fit)),
+        "mode": modes[rng.integers(len(modes))],
+        "content": CORPUS_CONTENTS[rng.integers(len(CORPUS_CONTENTS))],
+        "entropy": round(float(rng.uniform(entropy_range[0], entropy_range[1])), 4),
+    }
+
+
+def _create_islands(rng: np.random.Generator, width: int, height: int) -> Tuple[np.ndarray, List[dict]]:
+    """
+    重ならない不透明の島を描いたアルファと、島ごとの正解bboxを作る
+    島は格子の別々のマスに1つずつ置くので、隣の島とは必ず2px以上離れる
+    """
+    alpha: np.ndarray = np.zeros((height, width), dtype=np.uint8)
+    cols: int = int(rng.integers(1, 5))
+    rows: int = int(rng.integers(1, 5))
+    cell_w: int = width // cols
+    cell_h: int = height // rows
+    islands: List[dict] = []
+    if cell_w < 8 or cell_h < 8:
+        return alpha, islands
+    count: int = int(rng.integers(1, cols * rows + 1))
+    for cell in rng.permutation(cols * rows)[:count]:
+        cx: int = int(cell % cols) * cell_w
+        cy: int = int(cell // cols) * cell_h
+        w: int = int(rng.integers(2, cell_w - 3))
+        h: int = int(rng.integers(2, cell_h - 3))
+        x: int = cx + 2 + int(rng.integers(0, cell_w - 3 - w))
+        y: int = cy + 2 + int(rng.integers(0, cell_h - 3 - h))
+        shape: str = ["rect", "ellipse"][rng.integers(2)]
+        mask: np.ndarray
+        if shape == "rect":
+            mask = np.ones((h, w), dtype=bool)
+        else:
+            yy, xx = np.ogrid[:h, :w]
+            mask = ((xx + 0.5 - w / 2) / (w / 2)) ** 2 + ((yy + 0.5 - h / 2) / (h / 2)) ** 2 <= 1.0
+        alpha[y:y + h, x:x + w][mask] = 255
+        # 正解は実際に塗ったピクセルから求める
+        ys, xs = np.nonzero(mask)
+        islands.append({
+            "shape": shape,
+            "bbox": [x + int(xs.min()), y + int(ys.min()), int(xs.max() - xs.min()) + 1, int(ys.max() - ys.min()) + 1],
+            "area": int(mask.sum()),
+        })
+    return alpha, islands
+
+
+def create_corpus_image(spec: dict) -> Tuple[Image, dict]:
+    """
+    仕様からコーパス画像を作る
+    エントロピー0はなめらかなグラデーション、1は一様ノイズに近づき、PNGの圧縮率が変わる
+    gradient はエントロピーに比例した振れ幅のノイズをグラデーションに重ねる
+    RGBAは透明な背景に不透明の島を置き、正解のbboxを返す
+    """
+    rng: np.random.Generator = np.random.default_rng(spec["seed"] + [1])
+    width: int = spec["width"]
+    height: int = spec["height"]
+    channels: int = 1 if spec["mode"] == "L" else 3
+    entropy: float = spec["entropy"]
+    # 向きと2色をランダムに決めた線形グラデーション
+    angle: float = rng.uniform(0.0, 2.0 * np.pi)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    t: np.ndarray = xx * np.float32(np.cos(angle) / width) + yy * np.float32(np.sin(angle) / height)
+    t -= t.min()
+    t /= max(float(t.max()), 1e-6)
+    colors: np.ndarray = rng.uniform(0.0, 255.0, (2, channels)).astype(np.float32)
+    pixels: np.ndarray = colors[0] + t[..., np.newaxis] * (colors[1] - colors[0])
+    if spec["content"] != "gradient":
+        noise: np.ndarray = rng.uniform(0.0, 255.0, (height, width, channels)).astype(np.float32)
+        if spec["content"] == "mixed":
+            # 粗いノイズを拡大して、細かさの違うノイズを混ぜる
+            coarse: np.ndarray = rng.uniform(0.0, 255.0, (height // 8 + 1, width // 8 + 1, channels))
+            noise = (noise + np.repeat(np.repeat(coarse, 8, axis=0), 8, axis=1)[:height, :width]) * 0.5
+        pixels += (noise - pixels) * np.float32(entropy)
+    elif entropy > 0.0:
+        # 島の配置が変わらないように別の乱数で作る
+        dither_rng: np.random.Generator = np.random.default_rng(spec["seed"] + [2])
+        amplitude: np.float32 = np.float32(CORPUS_GRADIENT_NOISE * entropy)
+        pixels += dither_rng.uniform(-1.0, 1.0, (height, width, channels)).astype(np.float32) * amplitude
+    data: np.ndarray = np.clip(pixels + 0.5, 0, 255).astype(np.uint8)
+    info: dict = dict(spec)
+    if spec["mode"] == "L":
+        return Image.fromarray(data[..., 0], "L"), info
+    if spec["mode"] == "RGB":
+        return Image.fromarray(data, "RGB"), info
+    alpha, info["islands"] = _create_islands(rng, width, height)
+    return Image.fromarray(np.dstack([data, alpha]), "RGBA"), info
+
+
+def _encode_image(image: Image, image_format: str) -> bytes:
+    buffer: io.BytesIO = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def _create_corpus_chunk(items: List[Tuple[dict, Path]], image_format: str = "") -> List[Tuple[Path, bytes, dict]]:
+    """
+    ワーカープロセスでコーパス画像をまとめて作って書き出す
+    image_formatを指定するとファイルに書き出さずにエンコードしたデータを返す
+    """
+    ret: List[Tuple[Path, bytes, dict]] = []
+    for spec, output in items:
+        image, info = create_corpus_image(spec)
+        data: bytes = b""
+        if len(image_format) > 0:
+            data = _encode_image(image, image_format)
+        else:
+            image.save(output)
+        info["file"] = output.name
+        ret.append((output, data, info))
+    return ret
+
+
+_worker_template: DummyImageTemplate | None = None
+
+
+def _init_worker(template_args: tuple) -> None:
+    """
+    ワーカープロセスごとにテンプレートを一度だけ作る
+    フォントはpickleできずspawnのプロセスに渡せないので、ワーカーの中で読み込む
+    :param template_args: フォント以外の DummyImageTemplate の引数
+    """
+    global _worker_template
+    font: ImageFont = ImageFont.load_default()
+    _worker_template = DummyImageTemplate(*template_args, font)
+
+
+def _render_and_save(template: DummyImageTemplate, index_with_zero_pad: str, output: Path, streaming: bool) -> None:
+    if streaming:
+        template.save_streaming(index_with_zero_pad, output)
+    else:
+        template.render(index_with_zero_pad).save(output)
+
+
+def _render_and_save_chunk(items: List[Tuple[str, Path]], streaming: bool,
+                           image_format: str = "") -> List[Tuple[Path, bytes, dict]]:
+    """
+    ワーカープロセスで連番の画像をまとめて描いて書き出す
+    image_formatを指定するとファイルに書き出さずにエンコードしたデータを返す
+    """
+    ret: List[Tuple[Path, bytes, dict]] = []
+    for index_with_zero_pad, output in items:
+        data: bytes = b""
+        if len(image_format) > 0:
+            data = _encode_image(_worker_template.render(index_with_zero_pad), image_format)
+        else:
+            _render_and_save(_worker_template, index_with_zero_pad, output, streaming)
+        ret.append((output, data, {}))
+    return ret
+
+
+def _run_chunks(func: Callable[[list], list], chunks: List[list], jobs: int,
+                initializer: Callable | None = None, initargs: tuple = ()) -> Iterator[list]:
+    """
+    チャンクをプロセス並列で処理して、結果をチャンクの順番どおりに返す
+    """
+    if jobs == 1 or len(chunks) == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        yield from map(func, chunks)
+        return
+    with ProcessPoolExecutor(max_workers=min(jobs, len(chunks)), initializer=initializer,
+                             initargs=initargs) as executor:
+        yield from executor.map(func, chunks)
+
+
+class ArchiveWriter:
+    """
+    エンコード済みの画像を1つずつ順番にzip / tar / 標準出力(tar)へ書き込む
+    """
+    _zip: zipfile.ZipFile | None
+    _tar: tarfile.TarFile | None
+    _mtime: float
+
+    def __init__(self, archive_path: str):
+        self._zip = None
+        self._tar = None
+        self._mtime = time.time()
+        if archive_path == "-":
+            # 標準出力はシークできないのでストリーム形式のtarにする
+            self._tar = tarfile.open(fileobj=sys.stdout.buffer, mode="w|")
+        elif archive_path.lower().endswith(".zip"):
+            # png/jpgは圧縮済みなので無圧縮で格納する
+            self._zip = zipfile.ZipFile(archive_path, "w", zipfile.ZIP_STORED)
+        elif archive_path.lower().endswith((".tar.gz", ".tgz")):
+            self._tar = tarfile.open(archive_path, "w:gz")
+        else:
+            self._tar = tarfile.open(archive_path, "w")
+
+    def write(self, name: str, data: bytes) -> None:
+        if self._zip is not None:
+            self._zip.writestr(name, data)
+            return
+        info: tarfile.TarInfo = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = self._mtime
+        self._tar.addfile(info, io.BytesIO(data))
+
+    def close(self) -> None:
+        if self._zip is not None:
+            self._zip.close()
+        if self._tar is not None:
+            self._tar.close()
+
+    def __enter__(self) -> 'ArchiveWriter':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
 def main() -> None:
     parser: argparse.ArgumentParser = argparse.ArgumentParser(
         description='指定された枚数とサイズでダミー画像を生成します。 '
                     'テキスト系の指定は英語のみで、{i}は連番番号に{w}は横幅に{h}は縦幅に変換されます。\nで改行指定も可能です。',
     )
-    parser.add_argument("output_path", type=str, help="画像をアウトプットするフォルダ")
+    parser.add_argument("output_path", type=str,
+                        help="画像をアウトプットするフォルダ --archive の場合はzip/tarファイル(-で標準出力)")
     parser.add_argument("width", type=int, help="出力画像の横幅")
     parser.add_argument("height", type=int, help="出力画像の高さ")
     parser.add_argument("-n", "--number_of_image", type=int, default=1, help="出力画像数")
@@ -45,16 +440,44 @@ def main() -> None:
     parser.add_argument("--center_text", type=str, default="{i}", help="画像中央に埋め込む文字")
     parser.add_argument("--bottom_contents", type=str, default="", help="画像右下に埋め込む文字")
     parser.add_argument("--force", action="store_true", help="上書き確認せずファイルを書き出すか")
+    parser.add_argument("--streaming", action="store_true",
+                        help="拡大した画像をメモリに持たずに1行ずつ書き出す(png形式のみ) 8Kや16Kの巨大な画像向け")
+    parser.add_argument("--corpus", action="store_true",
+                        help="ベンチマーク用のコーパスを生成する widthとheightは最大サイズになり、文字と色の指定は無視される")
+    parser.add_argument("--seed", type=int, default=0, help="コーパスの乱数シード")
+    parser.add_argument("--entropy", type=float, nargs=2, default=[0.0, 1.0],
+                        help="コーパス画像のエントロピーの範囲(0~1) 0はグラデーション 1はノイズ gradientの画像はノイズの振れ幅になる")
+    parser.add_argument("--modes", type=str, nargs="+", default=CORPUS_MODES, choices=CORPUS_MODES,
+                        help="コーパス画像のモード")
+    parser.add_argument("--archive", action="store_true",
+                        help="画像ファイルを作らずにoutput_pathのzip/tar(.zip .tar .tar.gz .tgz -)へ直接書き込む")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="画像を書き出す並列プロセス数")
     # デフォルトビットマップフォントがかっこいいが、サイズ指定できない
     # parser.add_argument("-fs", "--font_size", type=int, default=24, help="タイトル文字の大きさ")
-    parser.add_argument("-V", '--version', action='version', version='%(prog)s 1.1')
+    parser.add_argument("-V", '--version', action='version', version='%(prog)s 1.5')
 
     args = parser.parse_args()
     output_path: Path = Path(args.output_path)
-    if output_path.is_file():
-        output_path = output_path.parent
-    if not output_path.exists():
-        output_path.mkdir()
+    if args.archive:
+        if args.output_path != "-" and not args.output_path.lower().endswith(ARCHIVE_EXTENSIONS):
+            print("--archive のoutput_pathは {} か - を指定してください。".format(" ".join(ARCHIVE_EXTENSIONS)),
+                  file=sys.stderr)
+            sys.exit(1)
+        if args.streaming:
+            print("--archive と --streaming は同時に指定できません。", file=sys.stderr)
+            sys.exit(1)
+        if args.output_path != "-":
+            if output_path.exists() and not args.force:
+                res: str = input("{}はすでに存在します。処理を進める場合 Y と入力して下さい。".format(output_path.name))
+                if res != "Y":
+                    print("処理を中止しました。")
+                    sys.exit(0)
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+    else:
+        if output_path.is_file():
+            output_path = output_path.parent
+        if not output_path.exists():
+            output_path.mkdir()
     small_size: Tuple[int, int] = (int(args.width / 3), int(args.height / 3))
     size: Tuple[int, int] = (args.width, args.height)
     filename_template: str = args.prefix + "{}x{}" + args.suffix + "{}." + args.format
@@ -74,54 +497,100 @@ def main() -> None:
     else:
         text_color = \
             (int(text_color_str[0:2], base=16), int(text_color_str[2:4], base=16), int(text_color_str[4:6], base=16))
-    font: ImageFont = ImageFont.load_default()
-    # font = ImageFont.truetype("arial.ttf", args.font_size)
-
     # print(filename_template)
     # print(color, text_color)
 
+    if args.jobs < 1:
+        print("jobsは1以上を指定してください。", file=sys.stderr)
+        sys.exit(1)
+    if args.streaming and args.format.lower() != "png":
+        print("streamingはpng形式のみ指定できます。", file=sys.stderr)
+        sys.exit(1)
+
+    if args.corpus:
+        if not 0.0 <= args.entropy[0] <= args.entropy[1] <= 1.0:
+            print("entropyは0~1の範囲を小さい順に指定してください。", file=sys.stderr)
+            sys.exit(1)
+        if args.format.lower() in ["jpg", "jpeg"] and "RGBA" in args.modes:
+            print("jpg形式ではRGBAを指定できません。--modes RGB L を指定してください。", file=sys.stderr)
+            sys.exit(1)
+
+    # 書き出し中に止まらないように上書き確認は先にまとめて行う
     index: int
+    outputs: List[Path] = []
+    specs: List[dict] = []
     for index in range(args.number_of_image):
-        image: Image = Image.new("RGB", small_size, color)
-        draw = ImageDraw.Draw(image)
-        xx: int = small_size[0] - 2 - 1
-        yy: int = small_size[1] - 2 - 1
-        draw.rectangle((2, 2, xx, yy), outline=text_color, width=1)
-        # line_color: tuple[int, int, int] = text_color
-        # draw.line(((2, 2), (xx, yy)), fill=line_color)  # ななめ線
-        # draw.line(((2, yy), (xx, 2)), fill=line_color)  # ななめ線
         index_with_zero_pad = str(index).zfill(args.zero_padding)
-        # 左上のタイトル文字
-        title: str = _replace_text(args.title, size, index_with_zero_pad)
-        draw.text(
-            (6, 6), "{}".format(title, size[0], size[1]),
-            text_color, spacing=2, align='left', font=font
-        )
-        # 右下の文字
-        bottom_contents: str = _replace_text(args.bottom_contents, size, index_with_zero_pad)
-        bottom_contents_size = _get_text_size(bottom_contents, font, spacing=2)
-        draw.text(
-            (small_size[0] - bottom_contents_size[0] - 6, small_size[1] - bottom_contents_size[1] - 6),
-            bottom_contents, text_color, spacing=2, align='right'
-        )
-        # 中央の文字
-        center_text: str = _replace_text(args.center_text, size, index_with_zero_pad)
-        center_text_size = _get_text_size(center_text, font, spacing=2)
-        draw.text(
-            (small_size[0] / 2 - center_text_size[0] / 2, small_size[1] / 2 - center_text_size[1] / 2),
-            center_text, text_color, spacing=2, align='center', font=font
-        )
-        # 小さく作って拡大している 文字の見栄えの調整
-        image = image.resize(size, resample=Image.Resampling.NEAREST)
         index_str: str = "#{}".format(index_with_zero_pad) if args.number_of_image > 1 else ""
-        output: Path = output_path / Path(filename_template.format(size[0], size[1], index_str))
+        output_size: Tuple[int, int] = size
+        if args.corpus:
+            spec: dict = get_corpus_spec(args.seed, index, size, args.modes, tuple(args.entropy))
+            output_size = (spec["width"], spec["height"])
+            specs.append(spec)
+        # 接頭語と接尾語の{w}{h}{i}を置き換えてからサイズと連番を埋める
+        output_name: str = _replace_text(filename_template, output_size, index_with_zero_pad).format(
+            output_size[0], output_size[1], index_str)
+        if args.archive:
+            # アーカイブ内のエントリ名として使う
+            outputs.append(Path(output_name))
+            continue
+        output: Path = output_path / Path(output_name)
         if output.exists() and not args.force:
             res: str = input("{}はすでに存在します。処理を進める場合 Y と入力して下さい。".format(output.name))
             if res != "Y":
                 print("処理を中止しました。")
                 sys.exit(0)
-        print(output)
-        image.save(output)
+        outputs.append(output)
+
+    # アーカイブに書き込む場合はワーカーでエンコードまで行い、メインプロセスが順番に書き込む
+    image_format: str = ""
+    if args.archive:
+        image_format = Image.registered_extensions().get("." + args.format.lower(), args.format.upper())
+    func: Callable[[list], list]
+    chunks: List[list]
+    initializer: Callable | None = None
+    initargs: tuple = ()
+    if args.corpus:
+        items: List[tuple] = list(zip(specs, outputs))
+        func = partial(_create_corpus_chunk, image_format=image_format)
+        chunk_size: int = max(1, min(64, len(items) // (args.jobs * 4)))
+    else:
+        items = [(str(i).zfill(args.zero_padding), x) for i, x in enumerate(outputs)]
+        func = partial(_render_and_save_chunk, streaming=args.streaming, image_format=image_format)
+        # 小さい画像を大量に作るときにプロセス間のやり取りが増えないようにまとめて渡す
+        chunk_size = max(1, min(256, len(items) // (args.jobs * 4)))
+        initializer = _init_worker
+        initargs = ((size, color, text_color, args.title, args.bottom_contents, args.center_text),)
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+    # 標準出力にアーカイブを書き出すときはログを標準エラーに出す
+    log = sys.stderr if args.archive and args.output_path == "-" else sys.stdout
+    archive: ArchiveWriter | None = ArchiveWriter(args.output_path) if args.archive else None
+    infos: List[dict] = []
+    try:
+        for done in _run_chunks(func, chunks, args.jobs, initializer, initargs):
+            for output, data, info in done:
+                if archive is not None:
+                    archive.write(output.as_posix(), data)
+                infos.append(info)
+                print(output, file=log)
+        if args.corpus:
+            manifest: bytes = json.dumps({
+                "seed": args.seed,
+                "max_size": [args.width, args.height],
+                "modes": args.modes,
+                "entropy": args.entropy,
+                "images": infos,
+            }, indent=2).encode("utf-8")
+            if archive is not None:
+                archive.write("corpus_manifest.json", manifest)
+                print("corpus_manifest.json", file=log)
+            else:
+                (output_path / "corpus_manifest.json").write_bytes(manifest)
+                print(output_path / "corpus_manifest.json", file=log)
+    finally:
+        if archive is not None:
+            archive.close()
 
 
 if __name__ == "__main__":
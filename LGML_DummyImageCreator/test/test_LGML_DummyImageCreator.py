@@ -0,0 +1,55 @@
+import io
+import sys
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+from LGML_DummyImageCreator import get_corpus_spec, create_corpus_image, CORPUS_CONTENTS
+
+
+def _get_png_size(image) -> int:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return len(buffer.getvalue())
+
+
+def test_corpus_spec_is_deterministic():
+    a = [get_corpus_spec(3, i, (512, 512), ["RGB", "RGBA"], (0.2, 0.8)) for i in range(20)]
+    b = [get_corpus_spec(3, i, (512, 512), ["RGB", "RGBA"], (0.2, 0.8)) for i in reversed(range(20))]
+    assert a == b[::-1]
+    assert all(0.2 <= x["entropy"] <= 0.8 and x["width"] <= 512 and x["height"] <= 512 for x in a)
+
+
+def test_corpus_entropy_changes_every_content():
+    for content in CORPUS_CONTENTS:
+        sizes = []
+        for entropy in [0.0, 0.5, 1.0]:
+            spec = {"index": 0, "seed": [1, 0], "width": 128, "height": 96, "mode": "RGB",
+                    "content": content, "entropy": entropy}
+            sizes.append(_get_png_size(create_corpus_image(spec)[0]))
+        assert sizes[0] < sizes[1] < sizes[2], f"{content} {sizes}"
+
+
+def test_corpus_islands():
+    for entropy in [0.0, 1.0]:
+        spec = {"index": 0, "seed": [5, 2], "width": 200, "height": 160, "mode": "RGBA",
+                "content": "gradient", "entropy": entropy}
+        image, info = create_corpus_image(spec)
+        alpha = np.asarray(image)[..., 3]
+        assert sum(x["area"] for x in info["islands"]) == int((alpha > 0).sum())
+        for island in info["islands"]:
+            x, y, w, h = island["bbox"]
+            assert alpha[y:y + h, x:x + w].any()
+            assert not alpha[y - 1, x:x + w].any() and not alpha[y + h, x:x + w].any()
+        if entropy == 0.0:
+            islands = info["islands"]
+        else:
+            # エントロピーを変えても島の配置は変わらない
+            assert info["islands"] == islands
+
+
+if __name__ == "__main__":
+    test_corpus_spec_is_deterministic()
+    test_corpus_entropy_changes_every_content()
+    test_corpus_islands()
@@ -0,0 +1,153 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Tuple, Callable, Iterator
+import numpy as np
+from PIL import Image
+from lut import INTERPOLATIONS, load_lut, pack_lut, apply_lut, apply_lut_array
+from lut_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_CACHE_BYTES, compile_lut
+
+SRC_IMAGE_EXTENSIONS: Tuple[str, ...] = (".png", ".jpg", ".jpeg", ".tga", ".tif", ".tiff", ".webp", ".bmp")
+
+# 1枚だけの場合はこの行数ずつに分けてプロセス並列で処理する
+BAND_ROWS: int = 256
+
+_worker_lut: np.ndarray | None = None
+_worker_interpolation: str = "tetrahedral"
+
+
+def _init_worker(lut_path: Path, interpolation: str) -> None:
+    """
+    ワーカープロセスごとにLUTを一度だけ読み込む
+    :param lut_path: LUT画像か lut_cache.compile_lut のキャッシュ(.npy)
+    """
+    global _worker_lut, _worker_interpolation
+    if lut_path.suffix == ".npy":
+        # 全ワーカーで同じページを共有する
+        _worker_lut = np.load(lut_path, mmap_mode="r")
+    else:
+        _worker_lut = pack_lut(load_lut(lut_path))
+    _worker_interpolation = interpolation
+
+
+def _apply_file(item: Tuple[Path, Path]) -> Tuple[Path, float]:
+    """
+    ワーカープロセスで1ファイルにLUTを適用して保存する
+    :return: 出力パス / 処理時間(秒) 読み書きは含まない
+    """
+    src_path, output_path = item
+    with Image.open(src_path) as img:
+        start: float = time.perf_counter()
+        result: Image.Image = apply_lut(img, _worker_lut, _worker_interpolation)
+        elapsed: float = time.perf_counter() - start
+    result.save(output_path)
+    return output_path, elapsed
+
+
+def _apply_band(band: np.ndarray) -> np.ndarray:
+    return apply_lut_array(band, _worker_lut, _worker_interpolation)
+
+
+def _run_pool(func: Callable, items: list, jobs: int, lut_path: Path, interpolation: str) -> Iterator:
+    """
+    LUTを読み込んだワーカープロセスで並列に処理して、結果を順番どおりに返す
+    """
+    if jobs == 1 or len(items) == 1:
+        _init_worker(lut_path, interpolation)
+        yield from map(func, items)
+        return
+    with ProcessPoolExecutor(max_workers=min(jobs, len(items)), initializer=_init_worker,
+                             initargs=(lut_path, interpolation)) as executor:
+        yield from executor.map(func, items)
+
+
+def find_images(paths: List[str]) -> List[Path]:
+    """
+    ファイルとフォルダ(直下の画像)から入力画像を集める
+    """
+    ret: List[Path] = []
+    for path in paths:
+        p: Path = Path(path)
+        assert p.exists(), f"file not found: {path}"
+        if p.is_dir():
+            ret.extend(sorted(x for x in p.iterdir() if x.is_file() and x.suffix.lower() in SRC_IMAGE_EXTENSIONS))
+        else:
+            ret.append(p)
+    return ret
+
+
+def get_output_path(src_path: Path, output_dir: str, suffix: str) -> Path:
+    if len(output_dir) > 0:
+        return Path(output_dir) / src_path.name
+    return src_path.parent / f"{src_path.stem}{suffix}{src_path.suffix}"
+
+
+def apply_single(src_path: Path, output_path: Path, lut_path: Path, interpolation: str, jobs: int) -> float:
+    """
+    1枚の画像を行で分けてプロセス並列でLUTを適用する
+    :return: 処理時間(秒) 読み書きは含まない
+    """
+    with Image.open(src_path) as img:
+        has_alpha: bool = "A" in img.getbands()
+        a: np.ndarray = np.array(img.convert("RGBA" if has_alpha else "RGB"))
+    start: float = time.perf_counter()
+    rgb: np.ndarray = np.ascontiguousarray(a[..., :3])
+    rows: int = max(1, min(BAND_ROWS, -(-rgb.shape[0] // jobs)))
+    bands: List[np.ndarray] = [rgb[y:y + rows] for y in range(0, rgb.shape[0], rows)]
+    a[..., :3] = np.concatenate(list(_run_pool(_apply_band, bands, jobs, lut_path, interpolation)))
+    elapsed: float = time.perf_counter() - start
+    Image.fromarray(a).save(output_path)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="タイル状のLUT画像を画像に適用します。")
+    parser.add_argument("lut", type=str, help="LUT画像のパス (resource/64x64x64_512x512_262144.png など)")
+    parser.add_argument("images", type=str, nargs="+", help="入力画像 複数の画像かフォルダを指定できる")
+    parser.add_argument("-o", "--output_dir", type=str, default="",
+                        help="出力フォルダ 省略時は入力画像の横に{name}{suffix}で出力する")
+    parser.add_argument("--suffix", type=str, default="_lut", help="出力フォルダ省略時に出力ファイル名に付ける文字")
+    parser.add_argument("-ip", "--interpolation", type=str, default="tetrahedral", choices=INTERPOLATIONS,
+                        help="補間方法")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="並列プロセス数")
+    parser.add_argument("--cache_dir", type=str, default=DEFAULT_CACHE_DIR.as_posix(),
+                        help="読み込み済みのLUTをキャッシュするフォルダ")
+    parser.add_argument("--max_cache_size", type=int, default=DEFAULT_MAX_CACHE_BYTES // (1 << 20),
+                        help="キャッシュフォルダの上限(MB)")
+    parser.add_argument("--no_cache", action="store_true", help="キャッシュを使わずに毎回LUT画像を読み込む")
+    args = parser.parse_args()
+    assert args.jobs > 0, f"jobs must be 1~: {args.jobs}"
+
+    lut_path: Path = Path(args.lut)
+    assert lut_path.exists(), f"file not found: {args.lut}"
+    if not args.no_cache:
+        # ワーカーに渡す前に1回だけ表を作っておく
+        lut_path = compile_lut(lut_path, Path(args.cache_dir), args.max_cache_size * (1 << 20))
+    images: List[Path] = find_images(args.images)
+    assert len(images) > 0, "No image file found."
+    if len(args.output_dir) > 0:
+        Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+    items: List[Tuple[Path, Path]] = [(x, get_output_path(x, args.output_dir, args.suffix)) for x in images]
+    assert len(set(x[1] for x in items)) == len(items), "same file names in different folders"
+
+    start: float = time.perf_counter()
+    if len(items) == 1:
+        elapsed: float = apply_single(items[0][0], items[0][1], lut_path, args.interpolation, args.jobs)
+        print(f"{items[0][1].as_posix()} : {elapsed * 1000:.1f} ms")
+    else:
+        for output_path, elapsed in _run_pool(_apply_file, items, args.jobs, lut_path, args.interpolation):
+            print(f"{output_path.as_posix()} : {elapsed * 1000:.1f} ms")
+    print(f"{len(items)} images : {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+sample command
+python apply_lut.py ../resource/64x64x64_512x512_262144.png ../resource/dorakuma_render.png
+python apply_lut.py grade_64.png renders/ -o renders_graded -j 8
+python apply_lut.py grade_64.png frame_4k.png -ip trilinear -j 8
+"""
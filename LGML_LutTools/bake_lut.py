@@ -0,0 +1,189 @@
+import argparse
+import time
+from pathlib import Path
+from typing import List, Tuple
+import numpy as np
+from PIL import Image
+from lut import apply_lut_array, lut_to_image
+from apply_lut import find_images
+from create_lut import get_lut_file_name, create_identity_lut, save_lut_image
+from soft_proof import get_color_delta
+
+# 1度に集計するピクセル数 float64の作業配列がこの数 x 数十バイトになる
+BAKE_CHUNK_PIXELS: int = 1 << 20
+
+
+def find_image_pairs(before: str, after: str) -> List[Tuple[Path, Path]]:
+    """
+    フォルダの場合は同じファイル名の画像どうしを組にする
+    """
+    before_path: Path = Path(before)
+    after_path: Path = Path(after)
+    assert before_path.exists(), f"file not found: {before}"
+    assert after_path.exists(), f"file not found: {after}"
+    if not before_path.is_dir():
+        return [(before_path, after_path)]
+    ret: List[Tuple[Path, Path]] = []
+    for x in find_images([before]):
+        pair_path: Path = after_path / x.name
+        if pair_path.exists():
+            ret.append((x, pair_path))
+        else:
+            print(f"skip {x.as_posix()} : {pair_path.as_posix()} not found")
+    return ret
+
+
+def load_pair(before_path: Path, after_path: Path) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    :return: 前の画像のRGB / 後の画像のRGB / 重み(0~1) 両方で透明でないピクセルだけ (ピクセル数, 3) に並べる
+    """
+    with Image.open(before_path) as img:
+        a: np.ndarray = np.asarray(img.convert("RGBA"))
+    with Image.open(after_path) as img:
+        b: np.ndarray = np.asarray(img.convert("RGBA"))
+    assert a.shape == b.shape, f"size mismatch: {before_path.name} {a.shape[1]}x{a.shape[0]} " \
+                               f"{after_path.name} {b.shape[1]}x{b.shape[0]}"
+    alpha: np.ndarray = np.minimum(a[..., 3], b[..., 3]).reshape(-1)
+    visible: np.ndarray = alpha > 0
+    return a[..., :3].reshape(-1, 3)[visible], b[..., :3].reshape(-1, 3)[visible], \
+        alpha[visible].astype(np.float32) / np.float32(255.0)
+
+
+def accumulate_pair(before: np.ndarray, after: np.ndarray, weight: np.ndarray, n: int,
+                    sums: np.ndarray, weights: np.ndarray) -> None:
+    """
+    ピクセルの組を周りの8つの格子点に3次元線形補間の重みで振り分けて足す
+    後の色そのものを平均すると格子点と離れた色に引っ張られる(無変換でも端の格子点がずれる)ので、前の色との差を平均する
+    :param sums: (N^3, 3) 後の色と前の色の差の重み付きの合計 [B*N*N + G*N + R] の順
+    :param weights: (N^3,) 重みの合計
+    """
+    size: int = n ** 3
+    for start in range(0, len(before), BAKE_CHUNK_PIXELS):
+        pos: np.ndarray = before[start:start + BAKE_CHUNK_PIXELS].astype(np.float32) * np.float32((n - 1) / 255.0)
+        index: np.ndarray = np.minimum(pos.astype(np.int64), n - 2)
+        frac: np.ndarray = pos - index
+        base: np.ndarray = index[:, 2] * (n * n) + index[:, 1] * n + index[:, 0]
+        dst: np.ndarray = after[start:start + BAKE_CHUNK_PIXELS].astype(np.float32) - \
+            before[start:start + BAKE_CHUNK_PIXELS].astype(np.float32)
+        w: np.ndarray = weight[start:start + BAKE_CHUNK_PIXELS]
+        for corner in range(8):
+            dr, dg, db = corner & 1, (corner >> 1) & 1, (corner >> 2) & 1
+            corner_weight: np.ndarray = w * (frac[:, 0] if dr else 1 - frac[:, 0]) * \
+                (frac[:, 1] if dg else 1 - frac[:, 1]) * (frac[:, 2] if db else 1 - frac[:, 2])
+            corner_index: np.ndarray = base + (db * n * n + dg * n + dr)
+            weights += np.bincount(corner_index, weights=corner_weight, minlength=size)
+            for c in range(3):
+                sums[:, c] += np.bincount(corner_index, weights=corner_weight * dst[:, c], minlength=size)
+
+
+def _smooth_empty_cells(values: np.ndarray, known: np.ndarray, iterations: int) -> np.ndarray:
+    """
+    値の無い格子点を隣の6つの格子点の平均にすることを繰り返す 値のある格子点は変えない
+    """
+    for _ in range(iterations):
+        p: np.ndarray = np.pad(values, ((1, 1), (1, 1), (1, 1), (0, 0)), mode="edge")
+        average: np.ndarray = (p[:-2, 1:-1, 1:-1] + p[2:, 1:-1, 1:-1] + p[1:-1, :-2, 1:-1] +
+                               p[1:-1, 2:, 1:-1] + p[1:-1, 1:-1, :-2] + p[1:-1, 1:-1, 2:]) / 6
+        values = np.where(known[..., None], values, average)
+    return values
+
+
+def fill_empty_cells(values: np.ndarray, known: np.ndarray, iterations: int) -> np.ndarray:
+    """
+    値の無い格子点を周りの値のある格子点から埋める
+    半分の解像度で埋めたものを拡大して初期値にし、なめらかにする(遠い格子点まで少ない回数で届く)
+    :param values: (N, N, N, 3) known の格子点だけ値が入っている
+    :param known: (N, N, N) 値のある格子点
+    """
+    n: int = values.shape[0]
+    if known.all():
+        return values
+    if not known.any():
+        return np.zeros_like(values)
+    m: int = (n + 1) // 2
+    pad: int = m * 2 - n
+    w: np.ndarray = np.pad(known, ((0, pad),) * 3).astype(np.float64)
+    v: np.ndarray = np.pad(np.where(known[..., None], values, 0), ((0, pad),) * 3 + ((0, 0),))
+    coarse_weight: np.ndarray = w.reshape(m, 2, m, 2, m, 2).sum(axis=(1, 3, 5))
+    coarse: np.ndarray = v.reshape(m, 2, m, 2, m, 2, 3).sum(axis=(1, 3, 5))
+    coarse_known: np.ndarray = coarse_weight > 0
+    coarse[coarse_known] /= coarse_weight[coarse_known][:, None]
+    coarse = fill_empty_cells(coarse, coarse_known, iterations)
+    upsampled: np.ndarray = coarse.repeat(2, axis=0).repeat(2, axis=1).repeat(2, axis=2)[:n, :n, :n]
+    return _smooth_empty_cells(np.where(known[..., None], values, upsampled), known, iterations)
+
+
+def bake_lut(pairs: List[Tuple[Path, Path]], n: int, min_weight: float = 1.0,
+             iterations: int = 8) -> Tuple[np.ndarray, float]:
+    """
+    前後の画像の組からLUTを作る
+    :param min_weight: 重みの合計がこれより小さい格子点は値が無いものとして周りから埋める
+    :return: [B, G, R, RGB] のfloat32の表 / 値のあった格子点の割合
+    """
+    sums: np.ndarray = np.zeros((n ** 3, 3), dtype=np.float64)
+    weights: np.ndarray = np.zeros(n ** 3, dtype=np.float64)
+    for before_path, after_path in pairs:
+        accumulate_pair(*load_pair(before_path, after_path), n, sums, weights)
+    known: np.ndarray = weights >= min_weight
+    identity: np.ndarray = create_identity_lut(n).astype(np.float64)
+    # 色そのものではなく無変換との差を埋める 遠い色も近くのグレーディングと同じようにずらす
+    offset: np.ndarray = np.zeros((n ** 3, 3), dtype=np.float64)
+    offset[known] = sums[known] / weights[known][:, None]
+    offset = fill_empty_cells(offset.reshape(n, n, n, 3), known.reshape(n, n, n), iterations)
+    lut: np.ndarray = np.clip(identity + offset, 0, 255).astype(np.float32)
+    return lut, float(known.mean())
+
+
+def get_bake_error(pairs: List[Tuple[Path, Path]], lut: np.ndarray) -> float:
+    """
+    作ったLUTを前の画像に適用したときの後の画像とのRGBの距離の平均
+    """
+    total: float = 0.0
+    count: float = 0.0
+    for before_path, after_path in pairs:
+        before, after, weight = load_pair(before_path, after_path)
+        delta: np.ndarray = get_color_delta(apply_lut_array(before, lut), after)
+        total += float((delta * weight).sum())
+        count += float(weight.sum())
+    return total / max(count, 1e-6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="グレーディング前後の画像の組からタイル状のLUT画像を作ります。")
+    parser.add_argument("before", type=str, help="グレーディング前の画像 フォルダの場合は同じ名前の画像を組にする")
+    parser.add_argument("after", type=str, help="グレーディング後の画像かフォルダ")
+    parser.add_argument("-n", "--cube_size", type=int, default=33, help="キューブのサイズ(2~256)")
+    parser.add_argument("-o", "--output", type=str, default="",
+                        help="出力パス 省略時は後の画像の横に {name}_{n}x{n}x{n}_{w}x{h}_{n^3}.png")
+    parser.add_argument("--min_weight", type=float, default=1.0,
+                        help="ピクセルの重みの合計がこれより小さい格子点は周りから埋める")
+    parser.add_argument("--iterations", type=int, default=8, help="埋めた格子点をなめらかにする回数(解像度ごと)")
+    parser.add_argument("--preview", action="store_true", help="_as1k のプレビュー画像も出力する")
+    parser.add_argument("--check", action="store_true", help="作ったLUTを前の画像に適用して後の画像との差を表示する")
+    args = parser.parse_args()
+    assert 2 <= args.cube_size <= 256, f"cube_size must be 2~256: {args.cube_size}"
+    assert args.min_weight > 0, f"min_weight must be > 0: {args.min_weight}"
+
+    pairs: List[Tuple[Path, Path]] = find_image_pairs(args.before, args.after)
+    assert len(pairs) > 0, "No image pair found."
+    start: float = time.perf_counter()
+    lut, known_ratio = bake_lut(pairs, args.cube_size, args.min_weight, args.iterations)
+    print(f"bake {len(pairs)} pairs {args.cube_size}^3 : {time.perf_counter() - start:.2f} s  "
+          f"filled from pixels {known_ratio * 100:.1f} %")
+    if args.check:
+        print(f"mean RGB distance : {get_bake_error(pairs, lut):.2f}")
+
+    after_path: Path = Path(args.after)
+    output_path: Path = Path(args.output) if len(args.output) > 0 else \
+        after_path.parent / f"{after_path.stem}_{get_lut_file_name(args.cube_size)}"
+    save_lut_image(lut_to_image(lut), output_path, args.preview)
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+sample command
+python bake_lut.py ../resource/dorakuma_render.png ../resource/dorakuma_final.png -o dorakuma_grade.png --check
+python bake_lut.py renders/ renders_graded/ -n 64 --preview
+"""
@@ -0,0 +1,144 @@
+import argparse
+import time
+from pathlib import Path
+from typing import List
+import numpy as np
+from PIL import Image
+from lut import get_lut_image_size, load_lut, lut_to_image
+
+MODES: List[str] = ["identity", "resample", "preview"]
+
+# resource フォルダの *_as1k.png と同じ大きさのプレビュー
+PREVIEW_SIZE: int = 1024
+PREVIEW_SUFFIX: str = "_as1k"
+
+
+def get_lut_file_name(n: int) -> str:
+    """
+    64 -> 64x64x64_512x512_262144.png
+    """
+    width, height = get_lut_image_size(n)
+    return f"{n}x{n}x{n}_{width}x{height}_{n ** 3}.png"
+
+
+def create_identity_lut(n: int) -> np.ndarray:
+    """
+    無変換の表 格子点は0~255を等間隔に分けた位置
+    :return: [B, G, R, RGB] のfloat32配列
+    """
+    ramp: np.ndarray = np.arange(n, dtype=np.float32) * np.float32(255.0 / (n - 1))
+    lut: np.ndarray = np.empty((n, n, n, 3), dtype=np.float32)
+    lut[..., 0] = ramp[None, None, :]
+    lut[..., 1] = ramp[None, :, None]
+    lut[..., 2] = ramp[:, None, None]
+    return lut
+
+
+def create_identity_lut_image(n: int) -> Image.Image:
+    """
+    無変換のLUT画像 表を作らずに画像の並びのままuint8で作る lut_to_image(create_identity_lut(n)) と同じ結果
+    """
+    width, height = get_lut_image_size(n)
+    tiles_x: int = width // n
+    tiles_y: int = height // n
+    ramp: np.ndarray = np.rint(np.arange(n) * (255.0 / (n - 1))).astype(np.uint8)
+    # (タイル行, G, タイル列, R, RGB)
+    a: np.ndarray = np.empty((tiles_y, n, tiles_x, n, 3), dtype=np.uint8)
+    a[..., 0] = ramp[None, None, None, :]
+    a[..., 1] = ramp[None, :, None, None]
+    tile_index: np.ndarray = np.arange(tiles_x * tiles_y).reshape(tiles_y, tiles_x)
+    a[..., 2] = ramp[np.minimum(tile_index, n - 1)][:, None, :, None]
+    # 余ったタイルは黒
+    a.transpose(0, 2, 1, 3, 4)[tile_index >= n] = 0
+    return Image.fromarray(a.reshape(height, width, 3))
+
+
+def _resample_axis(lut: np.ndarray, n: int, axis: int) -> np.ndarray:
+    """
+    1つの軸を線形補間で n 個の格子点にする
+    """
+    src_n: int = lut.shape[axis]
+    pos: np.ndarray = np.arange(n, dtype=np.float64) * ((src_n - 1) / (n - 1))
+    index: np.ndarray = np.minimum(pos.astype(np.int64), src_n - 2)
+    shape: List[int] = [1] * lut.ndim
+    shape[axis] = n
+    frac: np.ndarray = (pos - index).astype(np.float32).reshape(shape)
+    lower: np.ndarray = np.take(lut, index, axis=axis)
+    upper: np.ndarray = np.take(lut, index + 1, axis=axis)
+    lower += (upper - lower) * frac
+    return lower
+
+
+def resample_lut(lut: np.ndarray, n: int) -> np.ndarray:
+    """
+    表のキューブのサイズを変える 格子が等間隔なので3次元線形補間は軸ごとの線形補間を3回行うのと同じ
+    """
+    for axis in [2, 1, 0]:  # R, G, B
+        lut = _resample_axis(lut, n, axis)
+    return lut
+
+
+def create_preview(img: Image.Image) -> Image.Image:
+    """
+    目で見て確認するためのプレビュー 色が混ざらないように最近傍で拡大縮小する
+    """
+    return img.convert("RGB").resize((PREVIEW_SIZE, PREVIEW_SIZE), Image.Resampling.NEAREST)
+
+
+def save_lut_image(img: Image.Image, output_path: Path, with_preview: bool) -> None:
+    img.save(output_path)
+    print(f"output {output_path.as_posix()}")
+    if with_preview:
+        preview_path: Path = output_path.parent / f"{output_path.stem}{PREVIEW_SUFFIX}{output_path.suffix}"
+        create_preview(img).save(preview_path)
+        print(f"output {preview_path.as_posix()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="タイル状のLUT画像を作成・リサンプルします。")
+    parser.add_argument("mode", type=str, choices=MODES,
+                        help="identity: 無変換のLUTを作る resample: LUTのキューブのサイズを変える "
+                             "preview: プレビュー画像(_as1k)だけを作る")
+    parser.add_argument("src", type=str, nargs="?", default="", help="resample / preview の入力LUT画像")
+    parser.add_argument("-n", "--cube_size", type=int, default=64, help="キューブのサイズ(2~256)")
+    parser.add_argument("-o", "--output", type=str, default="",
+                        help="出力パス 省略時は {n}x{n}x{n}_{w}x{h}_{n^3}.png (resampleは入力画像の横)")
+    parser.add_argument("--preview", action="store_true", help=f"{PREVIEW_SUFFIX} のプレビュー画像も出力する")
+    args = parser.parse_args()
+    assert 2 <= args.cube_size <= 256, f"cube_size must be 2~256: {args.cube_size}"
+
+    start: float = time.perf_counter()
+    if args.mode == "preview":
+        src_path: Path = Path(args.src)
+        assert src_path.exists(), f"file not found: {args.src}"
+        output_path: Path = Path(args.output) if len(args.output) > 0 else \
+            src_path.parent / f"{src_path.stem}{PREVIEW_SUFFIX}{src_path.suffix}"
+        with Image.open(src_path) as img:
+            create_preview(img).save(output_path)
+        print(f"output {output_path.as_posix()}")
+        return
+
+    img: Image.Image
+    output_path = Path(get_lut_file_name(args.cube_size))
+    if args.mode == "identity":
+        img = create_identity_lut_image(args.cube_size)
+    else:
+        src_path = Path(args.src)
+        assert src_path.exists(), f"file not found: {args.src}"
+        img = lut_to_image(resample_lut(load_lut(src_path), args.cube_size))
+        output_path = src_path.parent / f"{src_path.stem}_{get_lut_file_name(args.cube_size)}"
+    print(f"{args.mode} {args.cube_size}^3 : {(time.perf_counter() - start) * 1000:.1f} ms")
+    if len(args.output) > 0:
+        output_path = Path(args.output)
+    save_lut_image(img, output_path, args.preview)
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+sample command
+python create_lut.py identity -n 33 --preview
+python create_lut.py resample grade_16.png -n 64 -o grade_64.png --preview
+python create_lut.py preview grade_64.png
+"""
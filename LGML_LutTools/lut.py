@@ -0,0 +1,210 @@
+import functools
+import math
+from pathlib import Path
+from typing import Tuple
+import numpy as np
+from PIL import Image
+
+INTERPOLATIONS: Tuple[str, ...] = ("tetrahedral", "trilinear")
+
+# 1回に処理するピクセル数 中間配列がCPUキャッシュに収まるように分ける
+CHUNK_PIXELS: int = 1 << 15
+
+# 補間は整数で行う 表は16倍、重みは256倍の固定小数
+# 255 * 16 * 256 < 2^21 なので、RGBを21bitずつint64に詰めたまま重みを掛けて足せる
+TABLE_SCALE: int = 16
+WEIGHT_SCALE: int = 256
+WEIGHT_BITS: int = 8  # log2(WEIGHT_SCALE)
+PACK_BITS: int = 21
+FIXED_BITS: int = 12  # log2(TABLE_SCALE * WEIGHT_SCALE)
+
+
+def get_lut_layout(width: int, height: int) -> Tuple[int, int, int]:
+    """
+    タイル状に並べたLUT画像の大きさからキューブのサイズとタイルの並びを求める
+    N x N のタイル(横がR 縦がG)を、Bの順に左上から横に並べる 最後の行は余ってもよい
+    :return: キューブのサイズN / 横のタイル数 / 縦のタイル数
+    """
+    candidates = [round((width * height) ** (1.0 / 3.0))] + list(range(math.gcd(width, height), 1, -1))
+    for n in candidates:
+        if n < 2 or width % n != 0 or height % n != 0:
+            continue
+        tiles_x: int = width // n
+        tiles_y: int = height // n
+        # 最後の行以外は埋まっていること
+        if n <= tiles_x * tiles_y < n + tiles_x:
+            return n, tiles_x, tiles_y
+    raise ValueError(f"not a tiled lut image size: {width}x{height}")
+
+
+def get_lut_image_size(n: int) -> Tuple[int, int]:
+    """
+    キューブのサイズNのLUT画像の大きさ できるだけ正方形に近い並びにする
+    """
+    tiles_x: int = math.ceil(math.sqrt(n))
+    tiles_y: int = math.ceil(n / tiles_x)
+    return tiles_x * n, tiles_y * n
+
+
+def lut_from_image(img: Image.Image) -> np.ndarray:
+    """
+    タイル状のLUT画像を3次元の表にする
+    :return: [B, G, R, RGB] のfloat32配列 値は0~255
+    """
+    n, tiles_x, tiles_y = get_lut_layout(img.width, img.height)
+    a: np.ndarray = np.asarray(img.convert("RGB"))
+    # (タイル行, G, タイル列, R, RGB) -> (タイル行, タイル列, G, R, RGB)
+    tiles: np.ndarray = a.reshape(tiles_y, n, tiles_x, n, 3).transpose(0, 2, 1, 3, 4).reshape(-1, n, n, 3)
+    return tiles[:n].astype(np.float32)
+
+
+def lut_to_image(lut: np.ndarray) -> Image.Image:
+    """
+    3次元の表をタイル状のLUT画像にする 余ったタイルは黒
+    """
+    n: int = lut.shape[0]
+    width, height = get_lut_image_size(n)
+    tiles_x: int = width // n
+    tiles_y: int = height // n
+    tiles: np.ndarray = np.zeros((tiles_x * tiles_y, n, n, 3), dtype=np.uint8)
+    tiles[:n] = np.clip(lut + 0.5, 0, 255).astype(np.uint8)
+    a: np.ndarray = tiles.reshape(tiles_y, tiles_x, n, n, 3).transpose(0, 2, 1, 3, 4).reshape(height, width, 3)
+    return Image.fromarray(a)
+
+
+def load_lut(lut_path: Path) -> np.ndarray:
+    with Image.open(lut_path) as img:
+        return lut_from_image(img)
+
+
+def pack_lut(lut: np.ndarray) -> np.ndarray:
+    """
+    表のRGBを1つのint64に詰める 各チャンネルは TABLE_SCALE 倍の固定小数で PACK_BITS ずつ
+    補間の重みを掛けて足しても桁あふれしないので、3チャンネルを1回の参照と掛け算で計算できる
+    :return: [B*N*N + G*N + R] のint64配列
+    """
+    fixed: np.ndarray = np.clip(np.rint(lut.reshape(-1, 3) * TABLE_SCALE), 0, 255 * TABLE_SCALE).astype(np.int64)
+    return fixed[:, 0] | (fixed[:, 1] << PACK_BITS) | (fixed[:, 2] << (PACK_BITS * 2))
+
+
+@functools.lru_cache(maxsize=None)
+def _get_axis_tables(n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    8bitの値ごとの格子の番号と格子内の位置 割り算や掛け算をピクセルごとにしないように先に作る
+    :return: R,G,B それぞれの表の位置(番号にR,G,Bの間隔を掛けたもの) / 格子内の位置(WEIGHT_SCALE倍の整数)
+    """
+    pos: np.ndarray = np.arange(256, dtype=np.float64) * ((n - 1) / 255.0)
+    index: np.ndarray = np.minimum(pos.astype(np.int32), n - 2)
+    frac: np.ndarray = np.rint((pos - index) * WEIGHT_SCALE).astype(np.int16)
+    return index, index * n, index * (n * n), frac
+
+
+@functools.lru_cache(maxsize=None)
+def _get_tetrahedron_tables(n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    四面体補間で通る頂点の表
+    格子内の位置の比較 (R>=G) | (G>=B)<<1 | (R>=B)<<2 から、1番目と2番目の頂点までの表の位置のずれを引く
+    同じ値の場合も軸が重ならないように R,G,B の順で大きいとみなす
+    """
+    steps: Tuple[int, int, int] = (1, n, n * n)
+    first: np.ndarray = np.zeros(8, dtype=np.int32)
+    second: np.ndarray = np.zeros(8, dtype=np.int32)
+    for code in range(8):
+        r_ge_g: bool = (code & 1) != 0
+        g_ge_b: bool = (code & 2) != 0
+        r_ge_b: bool = (code & 4) != 0
+        if r_ge_g and r_ge_b:
+            order: Tuple[int, int] = (0, 1 if g_ge_b else 2)
+        elif g_ge_b:
+            order = (1, 0 if r_ge_b else 2)
+        else:
+            order = (2, 0 if r_ge_g else 1)
+        first[code] = steps[order[0]]
+        second[code] = steps[order[0]] + steps[order[1]]
+    return first, second
+
+
+def _apply_chunk(packed: np.ndarray, n: int, rgb: np.ndarray, interpolation: str) -> np.ndarray:
+    """
+    :param packed: pack_lut の表
+    :param rgb: (ピクセル数, 3) のuint8配列
+    :return: (ピクセル数,) の詰めたままの補間結果 各チャンネル TABLE_SCALE * WEIGHT_SCALE 倍
+    """
+    index_r, index_g, index_b, frac = _get_axis_tables(n)
+    r: np.ndarray = rgb[:, 0]
+    g: np.ndarray = rgb[:, 1]
+    b: np.ndarray = rgb[:, 2]
+    base: np.ndarray = index_b[b] + index_g[g] + index_r[r]
+    fr: np.ndarray = frac[r]
+    fg: np.ndarray = frac[g]
+    fb: np.ndarray = frac[b]
+    dg: int = n
+    db: int = n * n
+    if interpolation == "trilinear":
+        # 8頂点の重みを R -> G -> B の順に軸ごとに分けて作る 丸めは G と B で1回ずつ
+        # 分けた重みは必ず0以上で合計がちょうど WEIGHT_SCALE になるので、詰めたフィールドから桁があふれない
+        fr32: np.ndarray = fr.astype(np.int32)
+        fg32: np.ndarray = fg.astype(np.int32)
+        fb32: np.ndarray = fb.astype(np.int32)
+        half: int = WEIGHT_SCALE // 2
+        w_rg11: np.ndarray = (fr32 * fg32 + half) >> WEIGHT_BITS
+        ret: np.ndarray = np.zeros(rgb.shape[0], dtype=np.int64)
+        # Bの側の重みは累積和を丸めた差にする 4つの合計がちょうど fb になり、各軸の重みの合計が格子内の位置と一致する
+        cumulative: np.ndarray = np.zeros(rgb.shape[0], dtype=np.int32)
+        cumulative_b1: np.ndarray = np.zeros(rgb.shape[0], dtype=np.int32)
+        for offset, w_rg in [(0, WEIGHT_SCALE - fr32 - fg32 + w_rg11), (1, fr32 - w_rg11),
+                             (dg, fg32 - w_rg11), (dg + 1, w_rg11)]:
+            cumulative += w_rg
+            w_b1: np.ndarray = ((cumulative * fb32 + half) >> WEIGHT_BITS) - cumulative_b1
+            cumulative_b1 += w_b1
+            ret += packed[base + offset] * (w_rg - w_b1)
+            ret += packed[base + (offset + db)] * w_b1
+        return ret
+
+    # 四面体補間 格子内の位置の大きい軸から順に頂点をたどる 参照する頂点は4つ
+    first, second = _get_tetrahedron_tables(n)
+    code: np.ndarray = (fr >= fg).view(np.uint8) | ((fg >= fb).view(np.uint8) << 1) | \
+        ((fr >= fb).view(np.uint8) << 2)
+    f_hi: np.ndarray = np.maximum(np.maximum(fr, fg), fb)
+    f_lo: np.ndarray = np.minimum(np.minimum(fr, fg), fb)
+    f_mid: np.ndarray = fr + fg + fb - f_hi - f_lo
+    ret = packed[base] * (WEIGHT_SCALE - f_hi)
+    ret += packed[base + first[code]] * (f_hi - f_mid)
+    ret += packed[base + second[code]] * (f_mid - f_lo)
+    ret += packed[base + (1 + dg + db)] * f_lo
+    return ret
+
+
+def apply_lut_array(rgb: np.ndarray, lut: np.ndarray, interpolation: str = "tetrahedral") -> np.ndarray:
+    """
+    uint8のRGB配列にLUTを適用する
+    :param rgb: (..., 3) のuint8配列
+    :param lut: lut_from_image の表 pack_lut で詰めた表でもよい(同じLUTを何度も使う場合に速い)
+    :return: 同じ形のuint8配列
+    """
+    assert interpolation in INTERPOLATIONS, f"interpolation must be {INTERPOLATIONS}: {interpolation}"
+    packed: np.ndarray = lut if lut.ndim == 1 else pack_lut(lut)
+    n: int = round(packed.shape[0] ** (1.0 / 3.0))
+    src: np.ndarray = rgb.reshape(-1, 3)
+    dst: np.ndarray = np.empty_like(src)
+    mask: int = (1 << PACK_BITS) - 1
+    # 丸めの0.5を全チャンネルに足しておく
+    half: int = sum((TABLE_SCALE * WEIGHT_SCALE // 2) << (PACK_BITS * c) for c in range(3))
+    shifts: np.ndarray = np.array([0, PACK_BITS, PACK_BITS * 2], dtype=np.int64) + FIXED_BITS
+    for start in range(0, src.shape[0], CHUNK_PIXELS):
+        chunk: np.ndarray = _apply_chunk(packed, n, src[start:start + CHUNK_PIXELS], interpolation)
+        chunk += half
+        dst[start:start + CHUNK_PIXELS] = (chunk[:, None] >> shifts) & (mask >> FIXED_BITS)
+    return dst.reshape(rgb.shape)
+
+
+def apply_lut(img: Image.Image, lut: np.ndarray, interpolation: str = "tetrahedral") -> Image.Image:
+    """
+    画像にLUTを適用する 透明度はそのまま残す
+    """
+    has_alpha: bool = "A" in img.getbands()
+    src: Image.Image = img.convert("RGBA" if has_alpha else "RGB")
+    a: np.ndarray = np.asarray(src)
+    ret: np.ndarray = a.copy()
+    ret[..., :3] = apply_lut_array(np.ascontiguousarray(a[..., :3]), lut, interpolation)
+    return Image.fromarray(ret)
@@ -0,0 +1,158 @@
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+import numpy as np
+from lut import TABLE_SCALE, PACK_BITS, load_lut, pack_lut
+
+# pack_lut の形式が変わったら古いキャッシュを使わないように名前に入れる
+CACHE_FORMAT: str = f"packed_s{TABLE_SCALE}_b{PACK_BITS}"
+
+DEFAULT_CACHE_DIR: Path = Path(tempfile.gettempdir()) / "lgml_lut_cache"
+
+# キャッシュフォルダの上限 256^3 のLUT1つで128MB
+DEFAULT_MAX_CACHE_BYTES: int = 1 << 30
+
+# 書きかけのファイル *.npy のキャッシュとして数えたり消したりしないように拡張子を変える
+TEMP_SUFFIX: str = ".tmp"
+
+# これより古い書きかけのファイルは書いたプロセスが落ちたものとして削除する(秒)
+STALE_TEMP_SECONDS: float = 3600.0
+
+
+def get_file_hash(file_path: Path) -> str:
+    h = hashlib.sha256()
+    with open(file_path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def get_cache_path(lut_path: Path, cache_dir: Path = DEFAULT_CACHE_DIR) -> Path:
+    """
+    LUT画像の内容のハッシュで決まるキャッシュのパス 同じ内容なら別の名前のファイルでも共有する
+    """
+    return cache_dir / f"{get_file_hash(lut_path)}_{CACHE_FORMAT}.npy"
+
+
+def compile_lut(lut_path: Path, cache_dir: Path = DEFAULT_CACHE_DIR,
+                max_bytes: int = DEFAULT_MAX_CACHE_BYTES) -> Path:
+    """
+    LUT画像を pack_lut の表にして .npy で保存する 既にあればそのまま使う
+    :return: キャッシュのパス
+    """
+    cache_path: Path = get_cache_path(lut_path, cache_dir)
+    if cache_path.exists():
+        # 最近使ったものを残すように更新日時を新しくする
+        os.utime(cache_path)
+        return cache_path
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # 他のプロセスが書きかけのファイルを読まないように別名で書いてから置き換える
+    temp_path: Path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}{TEMP_SUFFIX}")
+    try:
+        # パスを渡すと .npy が付け足されるのでファイルに書く
+        with open(temp_path, "wb") as fp:
+            np.save(fp, pack_lut(load_lut(lut_path)))
+        os.replace(temp_path, cache_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    evict(cache_dir, max_bytes, keep=cache_path)
+    return cache_path
+
+
+def load_packed_lut(lut_path: Path, cache_dir: Path = DEFAULT_CACHE_DIR,
+                    max_bytes: int = DEFAULT_MAX_CACHE_BYTES) -> np.ndarray:
+    """
+    キャッシュからメモリマップで pack_lut の表を読み込む 無ければ作る
+    読み込み専用のメモリマップなので、同じLUTを使う全てのプロセスで同じページを共有する
+    """
+    return np.load(compile_lut(lut_path, cache_dir, max_bytes), mmap_mode="r")
+
+
+def list_cache(cache_dir: Path) -> List[Tuple[Path, int, float]]:
+    """
+    :return: パス / サイズ / 更新日時 を新しい順に
+    """
+    if not cache_dir.is_dir():
+        return []
+    ret: List[Tuple[Path, int, float]] = []
+    for x in cache_dir.glob("*.npy"):
+        stat: os.stat_result = x.stat()
+        ret.append((x, stat.st_size, stat.st_mtime))
+    return sorted(ret, key=lambda o: o[2], reverse=True)
+
+
+def evict(cache_dir: Path, max_bytes: int, keep: Path | None = None) -> List[Path]:
+    """
+    合計サイズが max_bytes 以下になるまで古いキャッシュから削除する
+    メモリマップで開いているプロセスがあっても、削除したファイルはそのプロセスが閉じるまで読める(Linux)
+    書きかけのファイルは STALE_TEMP_SECONDS より古いものだけ削除する
+    :param keep: 削除しないキャッシュ 今作ったもの
+    :return: 削除したパス
+    """
+    removed: List[Path] = []
+    if cache_dir.is_dir():
+        for path in cache_dir.glob(f"*{TEMP_SUFFIX}"):
+            try:
+                if time.time() - path.stat().st_mtime > STALE_TEMP_SECONDS:
+                    path.unlink()
+                    removed.append(path)
+            except OSError:
+                continue
+    items: List[Tuple[Path, int, float]] = list_cache(cache_dir)
+    total: int = sum(x[1] for x in items)
+    for path, size, _ in reversed(items):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            path.unlink()
+        except OSError:
+            # Windowsでは開いているファイルは消せないので次回にまわす
+            continue
+        total -= size
+        removed.append(path)
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LUT画像を読み込み済みの表(.npy)にしてキャッシュします。")
+    parser.add_argument("luts", type=str, nargs="*", help="キャッシュするLUT画像")
+    parser.add_argument("--cache_dir", type=str, default=DEFAULT_CACHE_DIR.as_posix(), help="キャッシュフォルダ")
+    parser.add_argument("--max_size", type=int, default=DEFAULT_MAX_CACHE_BYTES // (1 << 20),
+                        help="キャッシュフォルダの上限(MB) 超えたら古いものから削除する")
+    parser.add_argument("--list", action="store_true", help="キャッシュの一覧を表示する")
+    parser.add_argument("--clear", action="store_true", help="キャッシュを全て削除する")
+    args = parser.parse_args()
+
+    cache_dir: Path = Path(args.cache_dir)
+    max_bytes: int = args.max_size * (1 << 20)
+    if args.clear:
+        for path in evict(cache_dir, 0):
+            print(f"removed {path.name}")
+    for lut in args.luts:
+        print(f"{lut} -> {compile_lut(Path(lut), cache_dir, max_bytes).as_posix()}")
+    if not args.clear and len(args.luts) == 0:
+        for path in evict(cache_dir, max_bytes):
+            print(f"removed {path.name}")
+    if args.list:
+        items: List[Tuple[Path, int, float]] = list_cache(cache_dir)
+        for path, size, _ in items:
+            print(f"{size / (1 << 20):10.1f} MB  {path.name}")
+        print(f"{len(items)} luts {sum(x[1] for x in items) / (1 << 20):.1f} MB in {cache_dir.as_posix()}")
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+sample command
+python lut_cache.py ../resource/256x256x256_4kx4k_16777216.png --list
+python lut_cache.py --max_size 256
+python lut_cache.py --clear
+"""
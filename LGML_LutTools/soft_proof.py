@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Tuple, Any
+import numpy as np
+from PIL import Image
+from lut import INTERPOLATIONS, load_lut, pack_lut, apply_lut_array
+from lut_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_CACHE_BYTES, compile_lut
+from apply_lut import find_images
+
+# 印刷(CMYK)の見た目に変換するLUT
+DEFAULT_PROOF_LUT_PATH: Path = Path(__file__).parent.parent / "resource" / "LUT512x523_pre_rgb2cmyk.png"
+
+REPORT_FILE_NAME: str = "soft_proof_report.json"
+
+_worker_lut: np.ndarray | None = None
+_worker_options: Dict[str, Any] = {}
+
+
+def create_heat_palette() -> List[int]:
+    """
+    色差のヒートマップの色 黒 -> 青 -> 赤 -> 黄 -> 白
+    """
+    points: List[Tuple[int, Tuple[int, int, int]]] = [
+        (0, (0, 0, 0)), (64, (0, 0, 255)), (128, (255, 0, 0)), (192, (255, 255, 0)), (255, (255, 255, 255))]
+    x: np.ndarray = np.arange(256)
+    palette: np.ndarray = np.stack([np.interp(x, [p[0] for p in points], [p[1][c] for p in points])
+                                    for c in range(3)], axis=1)
+    return np.rint(palette).astype(np.uint8).flatten().tolist()
+
+
+HEAT_PALETTE: List[int] = create_heat_palette()
+
+
+def get_color_delta(src: np.ndarray, proofed: np.ndarray) -> np.ndarray:
+    """
+    元の画像と印刷の見た目のRGBのユークリッド距離(0~441)
+    """
+    diff: np.ndarray = src.astype(np.int16) - proofed.astype(np.int16)
+    return np.sqrt(np.einsum("...c,...c->...", diff, diff, dtype=np.int32).astype(np.float32))
+
+
+def create_heat_map(delta: np.ndarray, max_delta: float, alpha: np.ndarray | None) -> Image.Image:
+    """
+    色差を max_delta で 255 になるヒートマップ画像にする 透明なピクセルは透明のまま
+    """
+    level: np.ndarray = np.clip(delta * np.float32(255.0 / max_delta) + 0.5, 0, 255).astype(np.uint8)
+    heat: Image.Image = Image.fromarray(level, mode="L")
+    heat.putpalette(HEAT_PALETTE)
+    if alpha is None:
+        return heat.convert("RGB")
+    heat = heat.convert("RGBA")
+    heat.putalpha(Image.fromarray(alpha))
+    return heat
+
+
+def soft_proof_array(a: np.ndarray, lut: np.ndarray, interpolation: str, threshold: float,
+                     max_delta: float) -> Tuple[np.ndarray, Image.Image, Dict[str, Any]]:
+    """
+    :param a: RGB か RGBA のuint8配列
+    :return: 印刷の見た目 / ヒートマップ / 色差の統計
+    """
+    rgb: np.ndarray = np.ascontiguousarray(a[..., :3])
+    proofed: np.ndarray = a.copy()
+    proofed[..., :3] = apply_lut_array(rgb, lut, interpolation)
+    delta: np.ndarray = get_color_delta(rgb, proofed[..., :3])
+    alpha: np.ndarray | None = a[..., 3] if a.shape[2] == 4 else None
+    # 完全に透明なピクセルは統計に入れない
+    visible: np.ndarray = delta if alpha is None else delta[alpha > 0]
+    stats: Dict[str, Any] = {
+        "pixels": int(visible.size),
+        "out_of_gamut_ratio": float((visible > threshold).mean()) if visible.size > 0 else 0.0,
+        "mean_delta": float(visible.mean()) if visible.size > 0 else 0.0,
+        "max_delta": float(visible.max()) if visible.size > 0 else 0.0,
+        "p95_delta": float(np.percentile(visible, 95)) if visible.size > 0 else 0.0,
+    }
+    return proofed, create_heat_map(delta, max_delta, alpha), stats
+
+
+def _init_worker(lut_path: Path, options: Dict[str, Any]) -> None:
+    """
+    ワーカープロセスごとにLUTを一度だけ読み込む キャッシュ(.npy)はメモリマップで共有する
+    """
+    global _worker_lut, _worker_options
+    if lut_path.suffix == ".npy":
+        _worker_lut = np.load(lut_path, mmap_mode="r")
+    else:
+        _worker_lut = pack_lut(load_lut(lut_path))
+    _worker_options = options
+
+
+def _proof_file(item: Tuple[Path, Path]) -> Dict[str, Any]:
+    """
+    ワーカープロセスで1ファイルの印刷の見た目とヒートマップを保存する
+    """
+    src_path, output_dir = item
+    with Image.open(src_path) as img:
+        has_alpha: bool = "A" in img.getbands()
+        a: np.ndarray = np.asarray(img.convert("RGBA" if has_alpha else "RGB"))
+    start: float = time.perf_counter()
+    proofed, heat, stats = soft_proof_array(a, _worker_lut, _worker_options["interpolation"],
+                                            _worker_options["threshold"], _worker_options["max_delta"])
+    elapsed: float = time.perf_counter() - start
+    proof_path: Path = output_dir / f"{src_path.stem}_proof.png"
+    heat_path: Path = output_dir / f"{src_path.stem}_gamut.png"
+    Image.fromarray(proofed).save(proof_path)
+    heat.save(heat_path)
+    stats.update({
+        "source": src_path.as_posix(),
+        "proof": proof_path.as_posix(),
+        "heat_map": heat_path.as_posix(),
+        "elapsed": round(elapsed, 4),
+    })
+    return stats
+
+
+def soft_proof_batch(images: List[Path], output_dir: Path, lut_path: Path, options: Dict[str, Any],
+                     jobs: int) -> List[Dict[str, Any]]:
+    """
+    複数の画像をプロセス並列で処理する
+    :return: 画像ごとの色差の統計 範囲外の割合の大きい順
+    """
+    items: List[Tuple[Path, Path]] = [(x, output_dir) for x in images]
+    results: List[Dict[str, Any]]
+    if jobs == 1 or len(items) == 1:
+        _init_worker(lut_path, options)
+        results = list(map(_proof_file, items))
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(items)), initializer=_init_worker,
+                                 initargs=(lut_path, options)) as executor:
+            # 大量の小さい画像でもプロセス間のやり取りが増えないようにまとめて渡す
+            chunksize: int = max(1, min(16, len(items) // (jobs * 4)))
+            results = list(executor.map(_proof_file, items, chunksize=chunksize))
+    return sorted(results, key=lambda o: o["out_of_gamut_ratio"], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LUTで印刷(CMYK)の見た目をシミュレーションし、色が変わる部分をヒートマップにします。")
+    parser.add_argument("images", type=str, nargs="+", help="入力画像 複数の画像かフォルダを指定できる")
+    parser.add_argument("-o", "--output_dir", type=str, required=True, help="出力フォルダ")
+    parser.add_argument("--lut", type=str, default=DEFAULT_PROOF_LUT_PATH.as_posix(),
+                        help="印刷の見た目に変換するLUT画像")
+    parser.add_argument("-th", "--threshold", type=float, default=20.0,
+                        help="RGBの距離がこの値より大きいピクセルを色域外として数える")
+    parser.add_argument("--max_delta", type=float, default=64.0, help="ヒートマップが最大(白)になるRGBの距離")
+    parser.add_argument("-ip", "--interpolation", type=str, default="tetrahedral", choices=INTERPOLATIONS,
+                        help="補間方法")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="並列プロセス数")
+    parser.add_argument("--cache_dir", type=str, default=DEFAULT_CACHE_DIR.as_posix(),
+                        help="読み込み済みのLUTをキャッシュするフォルダ")
+    parser.add_argument("--max_cache_size", type=int, default=DEFAULT_MAX_CACHE_BYTES // (1 << 20),
+                        help="キャッシュフォルダの上限(MB)")
+    parser.add_argument("--no_cache", action="store_true", help="キャッシュを使わずに毎回LUT画像を読み込む")
+    args = parser.parse_args()
+    assert args.jobs > 0, f"jobs must be 1~: {args.jobs}"
+    assert args.max_delta > 0, f"max_delta must be > 0: {args.max_delta}"
+
+    lut_path: Path = Path(args.lut)
+    assert lut_path.exists(), f"file not found: {args.lut}"
+    if not args.no_cache:
+        lut_path = compile_lut(lut_path, Path(args.cache_dir), args.max_cache_size * (1 << 20))
+    images: List[Path] = find_images(args.images)
+    assert len(images) > 0, "No image file found."
+    assert len(set(x.stem for x in images)) == len(images), "same file names in different folders"
+    output_dir: Path = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    start: float = time.perf_counter()
+    options: Dict[str, Any] = {
+        "interpolation": args.interpolation,
+        "threshold": args.threshold,
+        "max_delta": args.max_delta,
+    }
+    results: List[Dict[str, Any]] = soft_proof_batch(images, output_dir, lut_path, options, args.jobs)
+    report_path: Path = output_dir / REPORT_FILE_NAME
+    with open(report_path, "w", encoding="utf-8") as fp:
+        json.dump({"lut": args.lut, **options, "items": results}, fp, indent=2)
+    for result in results[:10]:
+        print(f'{result["out_of_gamut_ratio"] * 100:6.2f} %  max {result["max_delta"]:6.1f}  {result["source"]}')
+    print(f"{len(results)} images : {time.perf_counter() - start:.2f} s  report {report_path.as_posix()}")
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+sample command
+python soft_proof.py ../resource/dorakuma_final.png -o proof
+python soft_proof.py illustrations/ -o proof -th 30 --max_delta 48 -j 8
+"""
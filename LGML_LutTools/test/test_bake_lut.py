@@ -0,0 +1,96 @@
+import sys
+import tempfile
+from pathlib import Path
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+from lut import apply_lut_array
+from create_lut import create_identity_lut
+from bake_lut import find_image_pairs, load_pair, fill_empty_cells, bake_lut, get_bake_error
+
+
+def _grade(rgb: np.ndarray) -> np.ndarray:
+    # なめらかなグレーディング 暗部を持ち上げて青を足す
+    x: np.ndarray = rgb.astype(np.float64) / 255.0
+    y: np.ndarray = x ** 0.8
+    y[..., 2] = y[..., 2] * 0.9 + 0.1
+    return np.clip(np.rint(y * 255.0), 0, 255).astype(np.uint8)
+
+
+def _save_pair(dir_path: Path, name: str, before: np.ndarray) -> None:
+    (dir_path / "before").mkdir(exist_ok=True)
+    (dir_path / "after").mkdir(exist_ok=True)
+    Image.fromarray(before).save(dir_path / "before" / name)
+    Image.fromarray(_grade(before)).save(dir_path / "after" / name)
+
+
+def test_fill_empty_cells():
+    n: int = 9
+    values: np.ndarray = np.zeros((n, n, n, 3))
+    known: np.ndarray = np.zeros((n, n, n), dtype=bool)
+    assert (fill_empty_cells(values, known, 4) == 0).all()
+    # 一定の値は遠い格子点まで同じ値で埋まる
+    known[:3, :3, :3] = True
+    values[known] = [4.0, -2.0, 8.0]
+    filled: np.ndarray = fill_empty_cells(values, known, 4)
+    assert np.allclose(filled, [4.0, -2.0, 8.0])
+    # 値のある格子点は変えない
+    values = np.random.default_rng(0).uniform(-10, 10, (n, n, n, 3))
+    known = np.random.default_rng(1).random((n, n, n)) < 0.3
+    filled = fill_empty_cells(values, known, 4)
+    assert np.array_equal(filled[known], values[known])
+    assert fill_empty_cells(values, np.ones_like(known), 4) is values
+
+
+def test_load_pair_skips_transparent():
+    with tempfile.TemporaryDirectory() as tmp:
+        a: np.ndarray = np.zeros((4, 4, 4), dtype=np.uint8)
+        a[..., 3] = 255
+        a[0, :, 3] = 0
+        a[1, :, 3] = 51
+        b: np.ndarray = a.copy()
+        b[2, 0, 3] = 0
+        Image.fromarray(a).save(Path(tmp) / "a.png")
+        Image.fromarray(b).save(Path(tmp) / "b.png")
+        before, after, weight = load_pair(Path(tmp) / "a.png", Path(tmp) / "b.png")
+        assert before.shape == after.shape == (11, 3)
+        assert np.allclose(sorted(weight)[:4], 0.2) and (weight[4:] == 1.0).all()
+
+
+def test_bake_lut_identity():
+    rng = np.random.default_rng(2)
+    with tempfile.TemporaryDirectory() as tmp:
+        before: np.ndarray = rng.integers(0, 256, (128, 128, 3), dtype=np.uint8)
+        Image.fromarray(before).save(Path(tmp) / "a.png")
+        pairs = [(Path(tmp) / "a.png", Path(tmp) / "a.png")]
+        lut, known_ratio = bake_lut(pairs, 9)
+        assert known_ratio > 0.99
+        assert np.abs(lut - create_identity_lut(9)).max() < 1.0
+
+
+def test_bake_lut_recovers_grade():
+    rng = np.random.default_rng(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        _save_pair(Path(tmp), "full.png", rng.integers(0, 256, (192, 192, 3), dtype=np.uint8))
+        # 暗い色しか無い画像 明るい格子点は周りから埋める
+        _save_pair(Path(tmp), "dark.png", rng.integers(0, 96, (64, 64, 3), dtype=np.uint8))
+        pairs = find_image_pairs((Path(tmp) / "before").as_posix(), (Path(tmp) / "after").as_posix())
+        assert [x[0].name for x in pairs] == ["dark.png", "full.png"]
+        lut, known_ratio = bake_lut(pairs, 17)
+        assert known_ratio > 0.99
+        assert get_bake_error(pairs, lut) < 1.5
+        dark_only = [x for x in pairs if x[0].name == "dark.png"]
+        lut, known_ratio = bake_lut(dark_only, 17)
+        assert known_ratio < 0.1
+        colors: np.ndarray = rng.integers(0, 256, (4096, 3), dtype=np.uint8)
+        error: np.ndarray = np.abs(apply_lut_array(colors, lut).astype(np.int16) - _grade(colors))
+        # 範囲外の色も無変換よりはグレーディングに近くなる
+        assert error.mean() < np.abs(colors.astype(np.int16) - _grade(colors)).mean()
+
+
+if __name__ == "__main__":
+    test_fill_empty_cells()
+    test_load_pair_skips_transparent()
+    test_bake_lut_identity()
+    test_bake_lut_recovers_grade()
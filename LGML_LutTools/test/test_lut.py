@@ -0,0 +1,66 @@
+import sys
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+from lut import INTERPOLATIONS, apply_lut_array, get_lut_layout, get_lut_image_size, lut_from_image, lut_to_image
+from create_lut import create_identity_lut, create_identity_lut_image
+
+
+def _get_all_colors() -> np.ndarray:
+    v: np.ndarray = np.arange(256, dtype=np.uint8)
+    return np.stack(np.meshgrid(v, v, v, indexing="ij"), axis=-1).reshape(-1, 3)
+
+
+def test_identity_round_trip():
+    # 無変換のLUTは全ての色をそのまま返す 小さいキューブほど重みの丸めの誤差が出やすい
+    colors: np.ndarray = _get_all_colors()
+    for n in [2, 3, 4, 33]:
+        lut: np.ndarray = create_identity_lut(n)
+        for interpolation in INTERPOLATIONS:
+            result: np.ndarray = apply_lut_array(colors, lut, interpolation)
+            bad: np.ndarray = np.any(result != colors, axis=1)
+            assert not bad.any(), f"{n} {interpolation} {colors[bad][:4].tolist()} -> {result[bad][:4].tolist()}"
+
+
+def test_trilinear_no_wrap():
+    # 重みが範囲外になるとRGBを詰めたフィールドの桁があふれて 255 -> 0 になっていた
+    rgb: np.ndarray = np.array([[4, 32, 255], [255, 255, 255], [0, 0, 0]], dtype=np.uint8)
+    for n in [2, 3, 4]:
+        assert apply_lut_array(rgb, create_identity_lut(n), "trilinear").tolist() == rgb.tolist()
+
+
+def test_trilinear_matches_float():
+    # なめらかなグレーディング(ガンマとチャンネルの混合)では固定小数の誤差は出力の丸め(0.5)と合わせて1未満
+    rng: np.random.Generator = np.random.default_rng(0)
+    mix: np.ndarray = np.array([[0.8, 0.15, 0.05], [0.1, 0.7, 0.2], [0.0, 0.3, 0.7]], dtype=np.float32)
+    lut: np.ndarray = 255.0 * (create_identity_lut(17) / 255.0) ** 0.6 @ mix.T
+    rgb: np.ndarray = rng.integers(0, 256, (10000, 3)).astype(np.uint8)
+    n: int = lut.shape[0]
+    pos: np.ndarray = rgb.astype(np.float64) * ((n - 1) / 255.0)
+    index: np.ndarray = np.minimum(pos.astype(np.int64), n - 2)
+    frac: np.ndarray = pos - index
+    expected: np.ndarray = np.zeros((rgb.shape[0], 3))
+    for corner in range(8):
+        dr, dg, db = corner & 1, (corner >> 1) & 1, (corner >> 2) & 1
+        w: np.ndarray = (frac[:, 0] if dr else 1 - frac[:, 0]) * (frac[:, 1] if dg else 1 - frac[:, 1]) * \
+            (frac[:, 2] if db else 1 - frac[:, 2])
+        expected += lut[index[:, 2] + db, index[:, 1] + dg, index[:, 0] + dr] * w[:, None]
+    assert np.abs(apply_lut_array(rgb, lut, "trilinear") - expected).max() < 1.0
+
+
+def test_lut_image_layout():
+    assert get_lut_layout(512, 512) == (64, 8, 8)
+    assert get_lut_layout(4096, 4096) == (256, 16, 16)
+    for n in [4, 16, 33]:
+        img = create_identity_lut_image(n)
+        assert img.size == get_lut_image_size(n)
+        assert np.abs(lut_from_image(img) - create_identity_lut(n)).max() <= 0.5
+        assert np.array_equal(np.asarray(lut_to_image(lut_from_image(img))), np.asarray(img))
+
+
+if __name__ == "__main__":
+    test_identity_round_trip()
+    test_trilinear_no_wrap()
+    test_trilinear_matches_float()
+    test_lut_image_layout()
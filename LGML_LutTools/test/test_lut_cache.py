@@ -0,0 +1,104 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+from lut import load_lut, pack_lut
+from create_lut import create_identity_lut_image
+from lut_cache import STALE_TEMP_SECONDS, compile_lut, evict, get_cache_path, list_cache, load_packed_lut
+
+
+def _save_lut(path: Path, n: int) -> Path:
+    create_identity_lut_image(n).save(path)
+    return path
+
+
+def _create_entry(cache_dir: Path, name: str, size: int, mtime: float) -> Path:
+    path: Path = cache_dir / name
+    path.write_bytes(b"\0" * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_cache_path_by_content():
+    # 同じ内容なら名前が違っても同じキャッシュ 内容が違えば別のキャッシュ
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path: Path = Path(temp_dir)
+        a: Path = _save_lut(temp_path / "a.png", 4)
+        b: Path = _save_lut(temp_path / "b.png", 4)
+        c: Path = _save_lut(temp_path / "c.png", 8)
+        cache_dir: Path = temp_path / "cache"
+        assert get_cache_path(a, cache_dir) == get_cache_path(b, cache_dir)
+        assert get_cache_path(a, cache_dir) != get_cache_path(c, cache_dir)
+        assert get_cache_path(a, cache_dir).parent == cache_dir
+
+
+def test_compile_and_hit():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path: Path = Path(temp_dir)
+        lut_path: Path = _save_lut(temp_path / "a.png", 4)
+        cache_dir: Path = temp_path / "cache"
+        cache_path: Path = compile_lut(lut_path, cache_dir)
+        assert cache_path == get_cache_path(lut_path, cache_dir)
+        assert np.array_equal(np.load(cache_path), pack_lut(load_lut(lut_path)))
+        # 書きかけのファイルは残らない
+        assert sorted(x.name for x in cache_dir.iterdir()) == [cache_path.name]
+
+        # 2回目は作り直さずに更新日時だけ新しくする
+        os.utime(cache_path, (1000000000, 1000000000))
+        inode: int = cache_path.stat().st_ino
+        assert compile_lut(lut_path, cache_dir) == cache_path
+        assert cache_path.stat().st_ino == inode
+        assert cache_path.stat().st_mtime > 1000000000
+        assert np.array_equal(load_packed_lut(lut_path, cache_dir), pack_lut(load_lut(lut_path)))
+
+
+def test_evict_oldest_first():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache_dir: Path = Path(temp_dir)
+        old: Path = _create_entry(cache_dir, "old.npy", 100, 1000)
+        middle: Path = _create_entry(cache_dir, "middle.npy", 100, 2000)
+        new: Path = _create_entry(cache_dir, "new.npy", 100, 3000)
+        assert [x[0] for x in list_cache(cache_dir)] == [new, middle, old]
+        assert evict(cache_dir, 300) == []
+        assert evict(cache_dir, 250) == [old]
+        assert evict(cache_dir, 100) == [middle]
+        assert [x[0] for x in list_cache(cache_dir)] == [new]
+        assert evict(cache_dir, 0) == [new]
+        assert list_cache(cache_dir) == []
+
+
+def test_evict_keep():
+    # keep は一番古くても残して、次に古いものを削除する
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache_dir: Path = Path(temp_dir)
+        old: Path = _create_entry(cache_dir, "old.npy", 100, 1000)
+        middle: Path = _create_entry(cache_dir, "middle.npy", 100, 2000)
+        new: Path = _create_entry(cache_dir, "new.npy", 100, 3000)
+        assert evict(cache_dir, 200, keep=old) == [middle]
+        assert evict(cache_dir, 0, keep=old) == [new]
+        assert [x[0] for x in list_cache(cache_dir)] == [old]
+
+
+def test_temp_files():
+    # 書きかけのファイルはキャッシュとして数えず、古くなったものだけ削除する
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache_dir: Path = Path(temp_dir)
+        entry: Path = _create_entry(cache_dir, "a.npy", 100, 1000)
+        writing: Path = cache_dir / "b.npy.123.tmp"
+        writing.write_bytes(b"\0" * 1000)
+        stale_mtime: float = writing.stat().st_mtime - STALE_TEMP_SECONDS * 2
+        stale: Path = _create_entry(cache_dir, "c.npy.456.tmp", 1000, stale_mtime)
+        assert [x[0] for x in list_cache(cache_dir)] == [entry]
+        assert evict(cache_dir, 100) == [stale]
+        assert writing.exists() and entry.exists()
+
+
+if __name__ == "__main__":
+    test_cache_path_by_content()
+    test_compile_and_hit()
+    test_evict_oldest_first()
+    test_evict_keep()
+    test_temp_files()
@@ -0,0 +1,87 @@
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+from lut import lut_to_image, pack_lut
+from create_lut import create_identity_lut
+from soft_proof import get_color_delta, soft_proof_array, soft_proof_batch
+
+OPTIONS: Dict[str, Any] = {"interpolation": "tetrahedral", "threshold": 20.0, "max_delta": 64.0}
+
+
+def _create_faded_lut(n: int) -> np.ndarray:
+    # 彩度を半分にする 灰色(128)はそのまま、鮮やかな色ほど色差が大きい
+    return create_identity_lut(n) * np.float32(0.5) + np.float32(64.0)
+
+
+def _create_image(gray_ratio: float, alpha: bool = False) -> np.ndarray:
+    # 左側を灰色、残りを純色の赤にする
+    a: np.ndarray = np.zeros((16, 16, 4 if alpha else 3), dtype=np.uint8)
+    a[..., :3] = (255, 0, 0)
+    a[:, :round(16 * gray_ratio), :3] = 128
+    if alpha:
+        a[..., 3] = 255
+    return a
+
+
+def test_identity_lut():
+    # 無変換のLUTは色差が0でヒートマップは真っ黒
+    rng: np.random.Generator = np.random.default_rng(0)
+    a: np.ndarray = rng.integers(0, 256, (32, 32, 3), dtype=np.uint8)
+    proofed, heat, stats = soft_proof_array(a, pack_lut(create_identity_lut(17)), **OPTIONS)
+    assert np.array_equal(proofed, a)
+    assert not get_color_delta(a, proofed).any()
+    assert heat.mode == "RGB" and heat.size == (32, 32)
+    assert not np.asarray(heat).any()
+    assert stats == {"pixels": 32 * 32, "out_of_gamut_ratio": 0.0, "mean_delta": 0.0,
+                     "max_delta": 0.0, "p95_delta": 0.0}
+
+
+def test_transparent_pixels():
+    # 完全に透明なピクセルは色が変わっても統計に入れず、ヒートマップでも透明のまま
+    a: np.ndarray = _create_image(0.5, alpha=True)
+    a[:, 8:, 3] = 0
+    a[:2, :8, 3] = 1
+    proofed, heat, stats = soft_proof_array(a, pack_lut(_create_faded_lut(17)), **OPTIONS)
+    assert np.array_equal(proofed[..., 3], a[..., 3])
+    assert heat.mode == "RGBA"
+    assert np.array_equal(np.asarray(heat)[..., 3], a[..., 3])
+    assert stats["pixels"] == 16 * 8
+    assert stats["out_of_gamut_ratio"] == 0.0
+    assert stats["max_delta"] <= 1.0
+
+    # 透明でなければ数える
+    a[:, 8:, 3] = 255
+    _, _, stats = soft_proof_array(a, pack_lut(_create_faded_lut(17)), **OPTIONS)
+    assert stats["pixels"] == 16 * 16
+    assert stats["out_of_gamut_ratio"] == 0.5
+    assert stats["max_delta"] > OPTIONS["max_delta"]
+
+
+def test_batch_report_order():
+    # レポートは範囲外の割合の大きい順
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path: Path = Path(temp_dir)
+        lut_path: Path = temp_path / "faded.png"
+        lut_to_image(_create_faded_lut(16)).save(lut_path)
+        images: List[Path] = []
+        for name, gray_ratio in [("gray", 1.0), ("half", 0.5), ("red", 0.0), ("quarter", 0.75)]:
+            images.append(temp_path / f"{name}.png")
+            Image.fromarray(_create_image(gray_ratio)).save(images[-1])
+        output_dir: Path = temp_path / "output"
+        output_dir.mkdir()
+        results: List[Dict[str, Any]] = soft_proof_batch(images, output_dir, lut_path, OPTIONS, 1)
+        assert [Path(x["source"]).stem for x in results] == ["red", "half", "quarter", "gray"]
+        assert [x["out_of_gamut_ratio"] for x in results] == [1.0, 0.5, 0.25, 0.0]
+        for result in results:
+            assert Path(result["proof"]).exists() and Path(result["heat_map"]).exists()
+
+
+if __name__ == "__main__":
+    test_identity_lut()
+    test_transparent_pixels()
+    test_batch_report_order()
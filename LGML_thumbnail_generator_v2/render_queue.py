@@ -0,0 +1,250 @@
+import json
+import subprocess
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Any
+from PIL import Image, ImageDraw, ImageFont
+
+# レンダラーがワークフォルダに出力する画像
+RENDER_OUTPUT_FILE_NAME: str = "image_00000.png"
+
+RENDER_BACKENDS: List[str] = ["afterfx", "stub"]
+
+
+class RenderJob:
+    """
+    ワークフォルダ1つ分のレンダリング
+    status: pending(待ち) / running / done / failed / timeout
+    """
+    work_dir_path: Path
+    name: str
+    version: str
+    status: str = "pending"
+    attempts: int = 0
+    error: str = ""
+    elapsed: float = 0.0
+
+    def __init__(self, work_dir_path: Path, name: str, version: str = ""):
+        """
+        :param name: 表示用の名前
+        :param version: レンダラーのバージョン(AEの西暦表記) 同じバージョンのジョブだけを1回の起動にまとめる
+        """
+        self.work_dir_path = work_dir_path
+        self.name = name
+        self.version = version
+
+    @property
+    def output_path(self) -> Path:
+        return self.work_dir_path / RENDER_OUTPUT_FILE_NAME
+
+    def create_json_obj(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "work_dir": self.work_dir_path.as_posix(),
+            "status": self.status,
+            "attempts": self.attempts,
+            "error": self.error,
+            "elapsed": round(self.elapsed, 3),
+        }
+
+
+class RenderBackend(ABC):
+    """
+    複数のワークフォルダをまとめてレンダリングするレンダラー
+    render は各ワークフォルダに RENDER_OUTPUT_FILE_NAME を出力する 出力されたかどうかは RenderQueue が調べる
+    """
+
+    @abstractmethod
+    def render(self, jobs: List[RenderJob], timeout: float) -> None:
+        """
+        :param timeout: まとめた全ジョブの制限時間(秒) 超えた場合は subprocess.TimeoutExpired を投げる
+        """
+
+
+class AfterFxBackend(RenderBackend):
+    """
+    After Effects を1回起動して、まとめたワークフォルダの template.aep を順番にレンダリングする
+    """
+
+    def render(self, jobs: List[RenderJob], timeout: float) -> None:
+        ae_version: str = jobs[0].version
+        ae_path: Path = get_afterfx_path(ae_version)
+        if not ae_path.exists():
+            raise Exception(f"Adobe After Effects {ae_version} がインストールされていません")
+        aep_paths: List[str] = [(x.work_dir_path / "template.aep").as_posix() for x in jobs]
+        # 1つのプロジェクトが失敗しても残りはレンダリングする
+        script: str = f"var files = {json.dumps(aep_paths)};" \
+                      "for (var i = 0; i < files.length; i++) {" \
+                      "try {app.open(new File(files[i]));app.project.renderQueue.render();" \
+                      "app.project.close(CloseOptions.DO_NOT_SAVE_CHANGES);} catch (e) {}" \
+                      "}"
+        commands: List[str] = [
+            ae_path.as_posix(),
+            "-s",
+            script,
+            "-noui",
+        ]
+        print(commands)
+        subprocess.run(commands, timeout=timeout)
+
+
+class StubBackend(RenderBackend):
+    """
+    After Effects の代わりにワークフォルダの bg.png・アイコン・info.json から簡単な画像を出力する
+    AEの無い環境でバッチやスケジューリングを試したり計測するためのもの
+    """
+    launch_seconds: float
+    job_seconds: float
+
+    def __init__(self, launch_seconds: float = 0.0, job_seconds: float = 0.0):
+        """
+        :param launch_seconds: レンダラーの起動にかかる時間の見立て(秒)
+        :param job_seconds: ジョブ1つのレンダリングにかかる時間の見立て(秒)
+        """
+        self.launch_seconds = launch_seconds
+        self.job_seconds = job_seconds
+
+    def render(self, jobs: List[RenderJob], timeout: float) -> None:
+        start: float = time.perf_counter()
+        time.sleep(self.launch_seconds)
+        for job in jobs:
+            time.sleep(self.job_seconds)
+            if time.perf_counter() - start > timeout:
+                raise subprocess.TimeoutExpired("stub", timeout)
+            render_stub_image(job.work_dir_path)
+
+
+def get_afterfx_path(ae_version: str) -> Path:
+    # return Path(f"C:/Program Files/Adobe/Adobe After Effects {ae_version}/Support Files/afterfx.exe")
+    return Path(f"D:/adobeApps/Adobe After Effects {ae_version}/Support Files/afterfx.exe")
+
+
+def load_default_font(size: int) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
+    """
+    Pillowのデフォルトフォント サイズを指定できるのはPillow 10.1から それより前は固定サイズのビットマップフォント
+    """
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def render_stub_image(work_dir_path: Path) -> None:
+    """
+    bg.png の上にアイコンを並べて info.json の文言を書いた画像を出力する
+    """
+    with open(work_dir_path / "info.json", "r", encoding="utf-8") as fp:
+        o: Dict[str, Any] = json.load(fp)
+    with Image.open(work_dir_path / "bg.png") as im:
+        canvas: Image.Image = im.convert("RGBA")
+    for i, icon_path in enumerate(sorted(work_dir_path.glob("icon0*.png"))):
+        with Image.open(icon_path) as im:
+            canvas.alpha_composite(im.convert("RGBA"), (16 + i * 80, 16))
+    draw: ImageDraw.ImageDraw = ImageDraw.Draw(canvas)
+    draw.multiline_text((16, 112), o.get("title", ""), fill=(255, 255, 255), font=load_default_font(64))
+    draw.multiline_text((16, 272), o.get("description", ""), fill=(255, 255, 255), font=load_default_font(32))
+    # 書きかけのファイルを出力済みと間違えないように別名で書いてから置き換える
+    temp_path: Path = work_dir_path / f"{RENDER_OUTPUT_FILE_NAME}.tmp.png"
+    canvas.save(temp_path)
+    temp_path.replace(work_dir_path / RENDER_OUTPUT_FILE_NAME)
+
+
+def create_render_backend(name: str, stub_delay: List[float] | None = None) -> RenderBackend:
+    """
+    :param stub_delay: stub の [起動時間, ジョブ1つの時間](秒)
+    """
+    assert name in RENDER_BACKENDS, f"レンダーバックエンドは {RENDER_BACKENDS} のどれかを指定してください"
+    if name == "stub":
+        return StubBackend(*(stub_delay or []))
+    return AfterFxBackend()
+
+
+class RenderQueue:
+    """
+    ワークフォルダを集めてバックエンドにまとめて渡す
+    出力されなかったジョブは retries 回まで次のまとまりに入れてやり直す
+    """
+    backend: RenderBackend
+    batch_size: int
+    timeout: float
+    retries: int
+    workers: int
+    jobs: List[RenderJob]
+
+    def __init__(self, backend: RenderBackend, batch_size: int = 8, timeout: float = 300.0, retries: int = 1,
+                 workers: int = 1):
+        """
+        :param batch_size: レンダラー1回の起動でまとめるジョブの数
+        :param timeout: ジョブ1つあたりの制限時間(秒) まとめた場合はジョブ数倍する
+        :param retries: 失敗したジョブをやり直す回数
+        :param workers: 同時に起動するレンダラーの数
+        """
+        assert batch_size > 0, "batch_sizeは1以上を指定してください"
+        assert workers > 0, "workersは1以上を指定してください"
+        self.backend = backend
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.retries = retries
+        self.workers = workers
+        self.jobs = []
+
+    def submit(self, work_dir_path: Path, name: str, version: str = "") -> RenderJob:
+        job: RenderJob = RenderJob(work_dir_path, name, version)
+        self.jobs.append(job)
+        return job
+
+    def _make_batches(self, jobs: List[RenderJob]) -> List[List[RenderJob]]:
+        batches: List[List[RenderJob]] = []
+        by_version: Dict[str, List[RenderJob]] = {}
+        for job in jobs:
+            by_version.setdefault(job.version, []).append(job)
+        for version_jobs in by_version.values():
+            for i in range(0, len(version_jobs), self.batch_size):
+                batches.append(version_jobs[i:i + self.batch_size])
+        return batches
+
+    def _render_batch(self, batch: List[RenderJob]) -> None:
+        for job in batch:
+            job.status = "running"
+            job.attempts += 1
+            # 前回の失敗で途中まで書かれた出力を使わない
+            if job.output_path.exists():
+                job.output_path.unlink()
+        status: str = "failed"
+        error: str = "画像が出力されていません"
+        start: float = time.perf_counter()
+        try:
+            self.backend.render(batch, self.timeout * len(batch))
+        except subprocess.TimeoutExpired:
+            status, error = "timeout", f"{self.timeout * len(batch):.1f}秒以内にレンダリングが終わりませんでした"
+        except Exception as e:
+            error = str(e)
+        elapsed: float = (time.perf_counter() - start) / len(batch)
+        # 止まったり落ちたりしても出力できたジョブは完了にする
+        for job in batch:
+            job.elapsed += elapsed
+            if job.output_path.exists():
+                job.status, job.error = "done", ""
+            else:
+                job.status, job.error = status, error
+
+    def run(self) -> List[RenderJob]:
+        """
+        待ちのジョブを全てレンダリングする
+        :return: 全てのジョブ
+        """
+        pending: List[RenderJob] = [x for x in self.jobs if x.status == "pending"]
+        while len(pending) > 0:
+            batches: List[List[RenderJob]] = self._make_batches(pending)
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                list(executor.map(self._render_batch, batches))
+            pending = [x for x in pending if x.status != "done" and x.attempts <= self.retries]
+            for job in pending:
+                print(f"retry {job.name}: {job.error}")
+                job.status = "pending"
+        return self.jobs
+
+    def get_status(self) -> List[Dict[str, Any]]:
+        return [x.create_json_obj() for x in self.jobs]
@@ -0,0 +1,140 @@
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Dict, Tuple
+from PIL import Image, ImageFont
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+import render_queue
+
+
+def test_render_backend_is_abstract():
+    try:
+        render_queue.RenderBackend()
+    except TypeError:
+        pass
+    else:
+        assert False, "RenderBackend must not be instantiated"
+
+
+def test_load_default_font_without_size():
+    # Pillow 10.0 の load_default はサイズを受け付けない
+    load_default = ImageFont.load_default
+    ImageFont.load_default = lambda: load_default()
+    try:
+        font = render_queue.load_default_font(64)
+    finally:
+        ImageFont.load_default = load_default
+    assert font.getbbox("A")[3] > 0
+
+
+def test_render_stub_image():
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir_path: Path = Path(tmp)
+        Image.new("RGB", (320, 240), (40, 40, 40)).save(work_dir_path / "bg.png")
+        Image.new("RGBA", (32, 32), (255, 0, 0, 255)).save(work_dir_path / "icon01.png")
+        with open(work_dir_path / "info.json", "w", encoding="utf-8") as fp:
+            json.dump({"title": "title", "description": "description"}, fp)
+        render_queue.render_stub_image(work_dir_path)
+        with Image.open(work_dir_path / render_queue.RENDER_OUTPUT_FILE_NAME) as im:
+            assert im.size == (320, 240)
+            assert im.convert("RGB").getpixel((20, 20)) == (255, 0, 0)
+
+
+class _ScriptedBackend(render_queue.RenderBackend):
+    """
+    起動ごとのジョブを記録し、fail_counts の回数だけ指定のジョブの出力を書かない
+    timeout_names のジョブが入ったまとまりは、それより前のジョブだけ出力して制限時間切れにする
+    """
+
+    def __init__(self, fail_counts: Dict[str, int] | None = None, timeout_names: List[str] | None = None):
+        self.fail_counts = dict(fail_counts or {})
+        self.timeout_names = timeout_names or []
+        self.launches: List[Tuple[str, List[str], float]] = []
+
+    def render(self, jobs: List[render_queue.RenderJob], timeout: float) -> None:
+        self.launches.append((jobs[0].version, [x.name for x in jobs], timeout))
+        for job in jobs:
+            if job.name in self.timeout_names:
+                raise subprocess.TimeoutExpired("scripted", timeout)
+            if self.fail_counts.get(job.name, 0) > 0:
+                self.fail_counts[job.name] -= 1
+                continue
+            job.output_path.write_bytes(b"png")
+
+
+def _submit(queue: render_queue.RenderQueue, root: Path, names: List[str], version: str = "") -> None:
+    for name in names:
+        (root / name).mkdir()
+        queue.submit(root / name, name, version)
+
+
+def test_one_launch_per_version():
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = _ScriptedBackend()
+        queue = render_queue.RenderQueue(backend, batch_size=2, timeout=10.0)
+        _submit(queue, Path(tmp), ["a", "b", "c"], "2024")
+        _submit(queue, Path(tmp), ["d"], "2025")
+        queue.run()
+        # バージョンごとに batch_size ずつまとめる 違うバージョンは同じ起動に入れない
+        assert sorted(backend.launches) == [("2024", ["a", "b"], 20.0), ("2024", ["c"], 10.0),
+                                            ("2025", ["d"], 10.0)]
+        assert all(x.status == "done" and x.attempts == 1 for x in queue.jobs)
+
+
+def test_retry_until_limit():
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = _ScriptedBackend({"b": 1, "c": 5})
+        queue = render_queue.RenderQueue(backend, retries=2)
+        _submit(queue, Path(tmp), ["a", "b", "c"])
+        queue.run()
+        status = {x["name"]: x for x in queue.get_status()}
+        assert (status["a"]["status"], status["a"]["attempts"]) == ("done", 1)
+        assert (status["b"]["status"], status["b"]["attempts"]) == ("done", 2)
+        assert (status["c"]["status"], status["c"]["attempts"]) == ("failed", 3)
+        assert status["c"]["error"] != "" and status["b"]["error"] == ""
+        # やり直しは失敗したものだけでまとめる
+        assert [x[1] for x in backend.launches] == [["a", "b", "c"], ["b", "c"], ["c"]]
+
+
+def test_timeout_is_failure():
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = _ScriptedBackend(timeout_names=["b"])
+        queue = render_queue.RenderQueue(backend, timeout=5.0, retries=1)
+        _submit(queue, Path(tmp), ["a", "b", "c"])
+        queue.run()
+        status = {x.name: x for x in queue.jobs}
+        # 制限時間切れの前に出力できたものは完了
+        assert (status["a"].status, status["a"].attempts) == ("done", 1)
+        for name in ["b", "c"]:
+            assert (status[name].status, status[name].attempts) == ("timeout", 2)
+            assert not status[name].output_path.exists()
+        assert [x[2] for x in backend.launches] == [15.0, 10.0]
+
+
+def test_stub_backend_queue():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = render_queue.RenderQueue(render_queue.StubBackend(), batch_size=2, workers=2)
+        for i in range(5):
+            work_dir_path: Path = Path(tmp) / f"job{i}"
+            work_dir_path.mkdir()
+            Image.new("RGB", (64, 48)).save(work_dir_path / "bg.png")
+            with open(work_dir_path / "info.json", "w", encoding="utf-8") as fp:
+                json.dump({"title": f"job{i}", "description": ""}, fp)
+            queue.submit(work_dir_path, f"job{i}", "2025" if i % 2 == 0 else "2024")
+        queue.run()
+        assert [(x["status"], x["attempts"]) for x in queue.get_status()] == [("done", 1)] * 5
+        assert all(x.output_path.exists() for x in queue.jobs)
+
+
+if __name__ == "__main__":
+    test_render_backend_is_abstract()
+    test_load_default_font_without_size()
+    test_render_stub_image()
+    test_one_launch_per_version()
+    test_retry_until_limit()
+    test_timeout_is_failure()
+    test_stub_backend_queue()
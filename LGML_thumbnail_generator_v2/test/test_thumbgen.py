@@ -0,0 +1,181 @@
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+import thumbgen
+from PIL import Image, ImageFont
+
+TEMPLATES_DIR: Path = Path(__file__).absolute().parent.parent / "templates"
+
+
+def test_merge_layout():
+    base = {"size": [1280, 854], "bg": {"fit": "cover", "desaturate": 0.3}, "icons": [{"box": [0, 0, 8, 8]}] * 2}
+    override = {"bg": {"desaturate": 0.6}, "icons": [{"box": [1, 1, 4, 4]}]}
+    ret = thumbgen.merge_layout(base, override)
+    assert ret == {"size": [1280, 854], "bg": {"fit": "cover", "desaturate": 0.6}, "icons": [{"box": [1, 1, 4, 4]}]}
+    # 元の辞書は変えない
+    assert base["bg"]["desaturate"] == 0.3
+
+
+def test_load_layout_default():
+    with tempfile.TemporaryDirectory() as tmp:
+        layout = thumbgen._load_layout(Path(tmp))
+    with open(thumbgen.DEFAULT_LAYOUT_PATH, "rb") as fp:
+        assert layout == thumbgen.tomllib.load(fp)
+
+
+def test_template_layouts():
+    default = thumbgen._load_layout(Path(tempfile.gettempdir()) / "no_such_template")
+    for template_dir in sorted(TEMPLATES_DIR.iterdir()):
+        layout = thumbgen._load_layout(template_dir)
+        assert set(layout) >= {"size", "bg", "grad_plane", "title", "description", "icons"}, template_dir.name
+        if (template_dir / thumbgen.LAYOUT_FILE_NAME).exists():
+            assert layout != default, template_dir.name
+
+
+def test_draw_text_with_default_font():
+    # フォントが見つからない場合 (Pillow 10.0 のサイズの無いデフォルトフォントでも) 書ける
+    load_default = ImageFont.load_default
+    ImageFont.load_default = lambda: load_default()
+    try:
+        thumbgen._load_font.cache_clear()
+        canvas = Image.new("RGBA", (200, 100), (0, 0, 0, 255))
+        thumbgen._draw_text_box(canvas, "title", {"box": [10, 10, 180, 80], "font": "no_such_font.ttf", "size": 48})
+    finally:
+        ImageFont.load_default = load_default
+        thumbgen._load_font.cache_clear()
+    assert canvas.convert("L").getextrema()[1] > 0
+
+
+def _create_test_image(width: int, height: int) -> Image.Image:
+    # 中央が白 左右の端の4pxが赤の画像 トリムされると赤が消える
+    im = Image.new("RGBA", (width, height), (255, 255, 255, 255))
+    im.paste((255, 0, 0, 255), (0, 0, 4, height))
+    im.paste((255, 0, 0, 255), (width - 4, 0, width, height))
+    return im
+
+
+def test_fit_to_size():
+    im = _create_test_image(200, 100)
+    # 片方が0なら縦横比から決める
+    assert thumbgen.fit_to_size(im, (100, 0), "cover").size == (100, 50)
+    assert thumbgen.fit_to_size(im, (0, 25), "cover").size == (50, 25)
+    assert thumbgen.fit_to_size(im, (0, 0), "cover") is im
+    # cover は左右をトリムする
+    cover = thumbgen.fit_to_size(im, (100, 100), "cover")
+    assert cover.size == (100, 100) and cover.getpixel((0, 50)) == (255, 255, 255, 255)
+    # contain は中央に置いて上下を pad_color で埋める
+    contain = thumbgen.fit_to_size(im, (100, 100), "contain", (0, 0, 255, 255))
+    assert contain.size == (100, 100)
+    assert contain.getpixel((50, 5)) == (0, 0, 255, 255) and contain.getpixel((50, 50)) == (255, 255, 255, 255)
+    assert contain.getpixel((0, 50))[0] == 255 and contain.getpixel((0, 50))[1] < 128
+    # stretch は全体を引き伸ばす
+    stretch = thumbgen.fit_to_size(im, (100, 100), "stretch")
+    assert stretch.size == (100, 100) and stretch.getpixel((0, 50))[1] < 128
+
+
+def test_fit_aliases():
+    im = _create_test_image(200, 100)
+    for old, new in thumbgen.FIT_ALIASES.items():
+        a = thumbgen.fit_to_size(im, (120, 90), old, (0, 0, 0, 255))
+        b = thumbgen.fit_to_size(im, (120, 90), new, (0, 0, 0, 255))
+        assert a.tobytes() == b.tobytes(), old
+        output = thumbgen.OutputSpec({"size": [120, 90], "fit": old}, Path("out"), "image")
+        assert output.fit == new
+    assert thumbgen.OutputSpec({"size": [120, 90]}, Path("out"), "image").fit == "cover"
+
+
+def test_fit_image_matches_layout():
+    # レイアウトの枠と出力画像で同じ合わせ方になる
+    im = _create_test_image(200, 100)
+    for fit in thumbgen.FITS:
+        a = thumbgen._fit_image(im, (100, 100), fit)
+        b = thumbgen.fit_to_size(im, (100, 100), fit)
+        assert b.size == (100, 100)
+        if fit != "contain":
+            assert a.tobytes() == b.tobytes(), fit
+    assert thumbgen._fit_image(im, (100, 100), "contain").size == (100, 50)
+
+
+def _create_content(contents_dir_path: Path, name: str, output_dir: str, output_file_name: str,
+                    work_dir: str = "") -> None:
+    content_dir_path: Path = contents_dir_path / name
+    content_dir_path.mkdir()
+    Image.new("RGB", (64, 48), (40, 80, 120)).save(content_dir_path / "bg.png")
+    with open(content_dir_path / "config.toml", "w", encoding="utf-8") as fp:
+        fp.write(f'template_dir = "{(TEMPLATES_DIR / "blender001").as_posix()}"\n'
+                 f'title = "{name}"\ndescription = "test"\noutput_image_size = [64, 48]\n'
+                 f'output_dir = "{output_dir}"\noutput_file_name = "{output_file_name}"\n')
+        if len(work_dir) > 0:
+            fp.write(f'work_dir = "{work_dir}"\n')
+
+
+def test_find_output_collisions():
+    collisions = thumbgen.find_output_collisions({
+        "a": [Path("/out/x.png"), Path("/out/a.png")],
+        "b": [Path("/out/b.png")],
+        "c": [Path("/out/sub/../x.png")],
+        "d": [Path("/out/x.png")],
+    })
+    assert collisions == {"a": ["c", "d"], "c": ["a", "d"], "d": ["a", "c"]}
+
+
+def test_build_all_rejects_shared_output():
+    with tempfile.TemporaryDirectory() as tmp:
+        contents_dir_path: Path = Path(tmp) / "contents"
+        output_dir_path: Path = Path(tmp) / "out"
+        contents_dir_path.mkdir()
+        output_dir_path.mkdir()
+        _create_content(contents_dir_path, "a", output_dir_path.as_posix(), "image.png")
+        _create_content(contents_dir_path, "b", output_dir_path.as_posix(), "image.png")
+        _create_content(contents_dir_path, "c", output_dir_path.as_posix(), "c.png")
+        for _ in range(2):
+            thumbgen.build_all(contents_dir_path, 2, False, False, "pillow")
+            # 出力先が重なるものはどちらも出力せず、出力済みとして記録しない
+            with open(contents_dir_path / thumbgen.BATCH_STATE_FILE_NAME, "r", encoding="utf-8") as fp:
+                state = json.load(fp)
+            assert list(state.keys()) == ["c"]
+            assert sorted(x.name for x in output_dir_path.iterdir()) == ["c.png"]
+
+
+def test_collect_garbage_without_hard_links():
+    with tempfile.TemporaryDirectory() as tmp:
+        work_root_path: Path = Path(tmp) / "work"
+        work_root_path.mkdir()
+        _create_content(Path(tmp), "a", tmp, "a.png", work_root_path.as_posix())
+        config = thumbgen.Config(Path(tmp) / "a" / "config.toml")
+        link = thumbgen.os.link
+
+        def _link_not_supported(*args):
+            raise OSError("hard links are not supported")
+
+        # ハードリンクできないドライブではコピーになり、素材置き場のファイルのリンク数は1のまま
+        thumbgen.os.link = _link_not_supported
+        try:
+            work_dir_path: Path = thumbgen.prepare_work_dir(Path(tmp) / "a", config)
+            thumbgen.release_work_dir(config, work_dir_path)
+        finally:
+            thumbgen.os.link = link
+        store_paths = [x for x in (work_root_path / thumbgen.STORE_DIR_NAME).rglob("*") if x.is_file()]
+        assert len(store_paths) > 0 and all(x.stat().st_nlink == 1 for x in store_paths)
+        # ワークフォルダが残っている間は消さない
+        thumbgen.collect_garbage(work_root_path, 1)
+        assert work_dir_path.exists() and all(x.exists() for x in store_paths)
+        thumbgen.collect_garbage(work_root_path, 0)
+        assert not work_dir_path.exists() and not any(x.exists() for x in store_paths)
+
+
+if __name__ == "__main__":
+    test_merge_layout()
+    test_load_layout_default()
+    test_template_layouts()
+    test_draw_text_with_default_font()
+    test_fit_to_size()
+    test_fit_aliases()
+    test_fit_image_matches_layout()
+    test_find_output_collisions()
+    test_build_all_rejects_shared_output()
+    test_collect_garbage_without_hard_links()
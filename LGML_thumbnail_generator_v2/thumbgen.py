@@ -1,23 +1,38 @@
 import argparse
+import functools
+import hashlib
 import os.path
+import re
 import shutil
+import threading
 import tomllib
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
 from pathlib import Path
-from typing import List, Dict, Tuple, Any
+from typing import List, Dict, Set, Tuple, Any
 import tempfile
 import json
 from datetime import datetime
-import subprocess
-from PIL import Image
+from PIL import Image, ImageDraw, ImageEnhance, ImageFont
+from render_queue import RenderQueue, RenderJob, RENDER_BACKENDS, create_render_backend, load_default_font
 
 CONTENT_ASSETS_REQUIRED: List[str] = [
     "config.toml",
     "bg.png",
 ]
 
-TEMPLATE_ASSETS_REQUIRED: List[str] = [
-    "template.aep",
-]
+RENDERERS: List[str] = ["afterfx", "pillow"]
+
+# レンダラーごとにテンプレートフォルダに必要なファイル
+TEMPLATE_ASSETS_REQUIRED: Dict[str, List[str]] = {
+    "afterfx": ["template.aep"],
+    "pillow": [],
+}
+
+# pillowレンダラーのテンプレートごとのレイアウト 共通のレイアウトとの違いだけを書く(任意)
+LAYOUT_FILE_NAME: str = "layout.toml"
+
+# pillowレンダラーの全テンプレート共通のレイアウト
+DEFAULT_LAYOUT_PATH: Path = Path(__file__).parent / "resources/layout_default.toml"
 
 ICON_FILE_NAMES: List[str] = [
     "icon01.png",
@@ -27,16 +42,101 @@ ICON_FILE_NAMES: List[str] = [
     "icon05.png",
 ]
 
+DUMMY_ICON_PATH: Path = Path(__file__).parent / "resources/transparent64x64.png"
+
+# ワークフォルダの素材を置くハードリンク元 work_dir の中に作る
+STORE_DIR_NAME: str = ".store"
+
+# ワークフォルダが使っている素材置き場のファイルの記録 ハードリンクできずにコピーした場合もこれで使用中とわかる
+STORE_REFS_FILE_NAME: str = ".store_refs.json"
+
+# work_dir に残すワークフォルダの数 古いものから削除する
+WORK_DIR_KEEP_COUNT: int = 10
+
+# ワークフォルダ名 {timestamp}_{コンテンツフォルダ名}
+WORK_DIR_NAME_PATTERN: re.Pattern = re.compile(r"^\d{14}_")
+
+# ワークフォルダで書き換えるのでリンクせずに作るファイル
+WORK_DIR_REWRITTEN_FILE_NAMES: List[str] = ["info.json"]
+
+# バッチモードで前回の出力時のフィンガープリントを記録するファイル コンテンツフォルダの親に置く
+BATCH_STATE_FILE_NAME: str = "thumbgen_state.json"
+
+# 画像の枠への合わせ方 中央でトリム / 全体が収まるように縮める(出力画像では余白を埋める) / 引き伸ばす
+FITS: List[str] = ["cover", "contain", "stretch"]
+
+# outputs の fit の以前の名前 LGMLImageSizeAdjuster.py と同じ呼び方
+FIT_ALIASES: Dict[str, str] = {"crop": "cover", "pad": "contain", "scale": "stretch"}
+
+OUTPUT_FORMATS: Dict[str, str] = {
+    "png": ".png",
+    "jpg": ".jpg",
+    "webp": ".webp",
+}
+
+
+class OutputSpec:
+    """
+    config.toml の [[outputs]] 1つ分の出力画像の設定
+    """
+    size: Tuple[int, int]
+    fit: str = "cover"
+    pad_color: Tuple[int, int, int, int] = (0, 0, 0, 0)
+    format: str
+    quality: int = 90
+    file_path: Path
+
+    def __init__(self, o: Dict[str, Any], output_dir_path: Path, default_stem: str):
+        """
+        :param o: [[outputs]] の要素 size, fit, pad_color, format, quality, file_name
+        :param default_stem: file_name が無い場合の名前 {default_stem}_{幅}x{高さ}.{format} にする
+        """
+        size: List[int] = o.get("size", [-1, -1])
+        assert len(size) == 2 and all(isinstance(x, int) for x in size), \
+            "config.tomlの outputs の size が整数2要素ではありません"
+        self.size = (size[0], size[1])
+        self.fit = FIT_ALIASES.get(o.get("fit", self.fit), o.get("fit", self.fit))
+        assert self.fit in FITS, f"config.tomlの outputs の fit は {FITS} のどれかを指定してください"
+        if "pad_color" in o:
+            self.pad_color = tuple(o["pad_color"]) + (255,) * (4 - len(o["pad_color"]))
+        self.quality = o.get("quality", self.quality)
+        if "format" in o:
+            self.format = o["format"]
+        elif "file_name" in o:
+            self.format = Path(o["file_name"]).suffix[1:].lower().replace("jpeg", "jpg")
+        else:
+            self.format = "png"
+        assert self.format in OUTPUT_FORMATS, \
+            f"config.tomlの outputs の format は {list(OUTPUT_FORMATS.keys())} のどれかを指定してください"
+        file_name: str = o.get("file_name", f"{default_stem}_{self.size[0]}x{self.size[1]}{OUTPUT_FORMATS[self.format]}")
+        self.file_path = output_dir_path / file_name
+
+    def create_json_obj(self) -> Dict[str, Any]:
+        return {
+            "size": list(self.size),
+            "fit": self.fit,
+            "pad_color": list(self.pad_color),
+            "format": self.format,
+            "quality": self.quality,
+            "file_path": self.file_path.as_posix(),
+        }
+
+
 class Config:
     template_dir_path: Path
     title: str
     description: str
     output_image_size: Tuple[int, int]
     output_file_path: Path
+    outputs: List[OutputSpec]
     work_dir_path: Path | None
     ae_version: str = "2025"
+    renderer: str = "afterfx"
 
-    def __init__(self, config_toml_path: Path):
+    def __init__(self, config_toml_path: Path, renderer: str | None = None):
+        """
+        :param renderer: config.tomlの renderer より優先するレンダラー
+        """
         config_toml_path = config_toml_path.absolute()
         with open(config_toml_path, "rb") as fp:
             o: Dict = tomllib.load(fp)
@@ -51,7 +151,12 @@ class Config:
             self.template_dir_path = self.template_dir_path.absolute()
         print(self.template_dir_path.as_posix())
         assert self.template_dir_path.is_dir(), "config.tomlの template_dir がディレクトリではありません"
-        for asset in TEMPLATE_ASSETS_REQUIRED:
+        if "renderer" in o:
+            self.renderer = o["renderer"]
+        if renderer is not None:
+            self.renderer = renderer
+        assert self.renderer in RENDERERS, f"config.tomlの renderer は {RENDERERS} のどれかを指定してください"
+        for asset in TEMPLATE_ASSETS_REQUIRED[self.renderer]:
             assert (self.template_dir_path / asset).exists(), f"{asset}が存在しません"
         if "output_image_size" in o:
             assert len(o["output_image_size"]) == 2, "config.tomlの output_image_size が配列2要素ではありません"
@@ -68,10 +173,20 @@ class Config:
             assert self.output_file_path.is_dir(), "config.tomlの output_dir がディレクトリではありません"
         else:
             self.output_file_path = config_toml_path.parent
-        if "output_file_name" in o:
-            self.output_file_path = self.output_file_path / o["output_file_name"]
+        output_dir_path: Path = self.output_file_path
+        output_file_name: str = o.get("output_file_name", f"{config_toml_path.stem}.png")
+        if "outputs" in o:
+            # 1回のレンダリングから複数のサイズ・フォーマットで出力する
+            assert isinstance(o["outputs"], list) and len(o["outputs"]) > 0, \
+                "config.tomlの outputs は [[outputs]] で1つ以上指定してください"
+            self.outputs = [OutputSpec(x, output_dir_path, Path(output_file_name).stem) for x in o["outputs"]]
         else:
-            self.output_file_path = self.output_file_path / f"{config_toml_path.stem}.png"
+            # 従来通り output_image_size に引き伸ばして output_file_name に出力する
+            self.outputs = [OutputSpec({"size": list(self.output_image_size), "fit": "stretch",
+                                        "file_name": output_file_name}, output_dir_path, "")]
+        file_paths: List[Path] = [x.file_path for x in self.outputs]
+        assert len(set(file_paths)) == len(file_paths), "config.tomlの outputs の出力ファイル名が重複しています"
+        self.output_file_path = self.outputs[0].file_path
         if "work_dir" in o:
             self.work_dir_path = Path(o["work_dir"])
             if not self.work_dir_path.is_absolute():
@@ -90,92 +205,586 @@ class Config:
         }
 
 
-def _get_afterfx_path(ae_version: str) -> Path:
-    # return Path(f"C:/Program Files/Adobe/Adobe After Effects {ae_version}/Support Files/afterfx.exe")
-    return Path(f"D:/adobeApps/Adobe After Effects {ae_version}/Support Files/afterfx.exe")
-
-
-def _export(work_dir_path: Path, config: Config):
-    output_file_path: Path = config.output_file_path
-    output_image_size: Tuple[int, int] = config.output_image_size
-    ae_path: Path = _get_afterfx_path(config.ae_version)
-    if not ae_path.exists():
-        raise Exception(f"Adobe After Effects {config.ae_version} がインストールされていません")
-    commands: List[str] = [
-        _get_afterfx_path(config.ae_version).as_posix(),
-        '-s',
-        f'var file = new File(\'{work_dir_path.as_posix()}/template.aep\');'
-        f'app.open(file);app.project.renderQueue.render();',
-        '-noui',
-    ]
-    print(commands)
+def merge_layout(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    共通のレイアウトにテンプレートのレイアウトを重ねる テーブルは項目ごとに上書きし、配列は丸ごと置き換える
+    """
+    ret: Dict[str, Any] = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(ret.get(key), dict):
+            ret[key] = merge_layout(ret[key], value)
+        else:
+            ret[key] = value
+    return ret
+
+
+@functools.lru_cache(maxsize=None)
+def _load_layout(template_dir_path: Path) -> Dict[str, Any]:
+    with open(DEFAULT_LAYOUT_PATH, "rb") as fp:
+        layout: Dict[str, Any] = tomllib.load(fp)
+    if (template_dir_path / LAYOUT_FILE_NAME).exists():
+        with open(template_dir_path / LAYOUT_FILE_NAME, "rb") as fp:
+            layout = merge_layout(layout, tomllib.load(fp))
+    return layout
+
+
+@functools.lru_cache(maxsize=None)
+def _load_font(font_names: Tuple[str, ...], size: int) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
+    """
+    フォントを読み込む 見つかった最初のフォントを使い、どれも無ければPillowのデフォルトフォント
+    Pillow 10.1より前のデフォルトフォントはサイズが変えられないので、枠に収まらなくてもそのまま書く
+    :param font_names: フォントファイルのパスかシステムフォントのファイル名
+    """
+    for font_name in font_names:
+        try:
+            return ImageFont.truetype(font_name, size)
+        except OSError:
+            continue
+    return load_default_font(size)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_layer(image_path: Path, size: Tuple[int, int]) -> Image.Image:
+    """
+    テンプレートの重ね画像を読み込んでサイズを合わせる コンテンツフォルダ間で使いまわす
+    """
+    with Image.open(image_path) as im:
+        return im.convert("RGBA").resize(size, Image.Resampling.LANCZOS)
+
+
+@functools.lru_cache(maxsize=None)
+def _create_gradient(size: Tuple[int, int], top_color: Tuple[int, ...], bottom_color: Tuple[int, ...]) -> Image.Image:
+    """
+    上から下へのグラデーション平面
+    """
+    mask: Image.Image = Image.linear_gradient("L").resize(size, Image.Resampling.BILINEAR)
+    return Image.composite(Image.new("RGBA", size, bottom_color), Image.new("RGBA", size, top_color), mask)
+
+
+def _fit_image(im: Image.Image, size: Tuple[int, int], fit: str) -> Image.Image:
+    """
+    画像を枠に合わせる cover: はみ出した分を中央でトリム contain: 全体が収まるように縮める stretch: 引き伸ばす
+    contain は縦横比が違うと枠より小さくなる
+    """
+    if fit == "stretch" or im.width * size[1] == im.height * size[0]:
+        return im.resize(size, Image.Resampling.LANCZOS)
+    if fit == "contain":
+        scale: float = min(size[0] / im.width, size[1] / im.height)
+        return im.resize((max(1, round(im.width * scale)), max(1, round(im.height * scale))),
+                         Image.Resampling.LANCZOS)
+    # トリムしてから縮めるのではなく、トリム範囲を指定して1回でリサイズする
+    scale = max(size[0] / im.width, size[1] / im.height)
+    crop_w: float = size[0] / scale
+    crop_h: float = size[1] / scale
+    left: float = (im.width - crop_w) / 2
+    top: float = (im.height - crop_h) / 2
+    return im.resize(size, Image.Resampling.LANCZOS, box=(left, top, left + crop_w, top + crop_h))
+
+
+def _grade_image(im: Image.Image, o: Dict[str, Any]) -> Image.Image:
+    """
+    彩度を落としてから色をのせる
+    """
+    if o.get("desaturate", 0.0) > 0.0:
+        alpha: Image.Image | None = im.getchannel("A") if im.mode == "RGBA" else None
+        im = ImageEnhance.Color(im.convert("RGB")).enhance(1.0 - o["desaturate"])
+        if alpha is not None:
+            im.putalpha(alpha)
+    if o.get("tint_strength", 0.0) > 0.0:
+        tint: Image.Image = Image.new(im.mode, im.size, tuple(o.get("tint", [0, 0, 0])) + (255,) * (im.mode == "RGBA"))
+        if im.mode == "RGBA":
+            tint.putalpha(im.getchannel("A"))
+        im = Image.blend(im, tint, o["tint_strength"])
+    return im
+
+
+def _draw_text_box(canvas: Image.Image, text: str, o: Dict[str, Any]) -> None:
+    """
+    枠の中に文字を描く 枠に収まらない場合は min_size までフォントを小さくする
+    """
+    if len(text) == 0:
+        return
+    x, y, w, h = o["box"]
+    fonts: Tuple[str, ...] = tuple([o["font"]] if isinstance(o.get("font", []), str) else o.get("font", []))
+    spacing: int = o.get("line_spacing", 4)
+    align: str = o.get("align", "left")
+    valign: str = o.get("valign", "top")
+    draw: ImageDraw.ImageDraw = ImageDraw.Draw(canvas)
+    size: int = o.get("size", 32)
+    font: ImageFont.FreeTypeFont | ImageFont.ImageFont = _load_font(fonts, size)
+    bbox: Tuple[int, int, int, int] = draw.multiline_textbbox((0, 0), text, font=font, spacing=spacing)
+    while (bbox[2] - bbox[0] > w or bbox[3] - bbox[1] > h) and size > o.get("min_size", 8):
+        size -= 2
+        font = _load_font(fonts, size)
+        bbox = draw.multiline_textbbox((0, 0), text, font=font, spacing=spacing)
+    tx: float = x - bbox[0] + {"left": 0, "center": (w - (bbox[2] - bbox[0])) / 2,
+                               "right": w - (bbox[2] - bbox[0])}[align]
+    ty: float = y - bbox[1] + {"top": 0, "middle": (h - (bbox[3] - bbox[1])) / 2,
+                               "bottom": h - (bbox[3] - bbox[1])}[valign]
+    draw.multiline_text((tx, ty), text, fill=tuple(o.get("color", [255, 255, 255])), font=font,
+                        spacing=spacing, align=align)
+
+
+def render_with_pillow(content_dir_path: Path, config: Config) -> Image.Image:
+    """
+    共通のレイアウトとテンプレートフォルダの layout.toml にしたがってPillowで合成する(After Effectsを使わない)
+    背景 -> グラデーション平面 -> テンプレートの重ね画像 -> アイコン -> タイトル・説明文 の順に重ねる
+    フォント・重ね画像・レイアウトはキャッシュしてコンテンツフォルダ間で使いまわす
+    """
+    layout: Dict[str, Any] = _load_layout(config.template_dir_path)
+    canvas_size: Tuple[int, int] = (layout["size"][0], layout["size"][1])
+    canvas: Image.Image = Image.new("RGBA", canvas_size, tuple(layout.get("background_color", [0, 0, 0])) + (255,))
+
+    bg: Dict[str, Any] = layout.get("bg", {})
+    x, y, w, h = bg.get("box", [0, 0, canvas_size[0], canvas_size[1]])
+    with Image.open(content_dir_path / "bg.png") as im:
+        bg_image: Image.Image = _grade_image(_fit_image(im.convert("RGBA"), (w, h), bg.get("fit", "cover")), bg)
+    canvas.alpha_composite(bg_image, (x, y))
+
+    if "grad_plane" in layout:
+        grad_plane: Dict[str, Any] = layout["grad_plane"]
+        x, y, w, h = grad_plane["box"]
+        canvas.alpha_composite(_create_gradient((w, h), tuple(grad_plane.get("top_color", [0, 0, 0, 0])),
+                                                tuple(grad_plane.get("bottom_color", [0, 0, 0, 255]))), (x, y))
+
+    for layer in layout.get("layers", []):
+        x, y, w, h = layer["box"]
+        canvas.alpha_composite(_load_layer(config.template_dir_path / layer["file"], (w, h)), (x, y))
+
+    for icon_file_name, slot in zip(ICON_FILE_NAMES, layout.get("icons", [])):
+        icon_path: Path = content_dir_path / icon_file_name
+        if not icon_path.exists():
+            # アイコンが無い枠は透明のまま
+            continue
+        x, y, w, h = slot["box"]
+        with Image.open(icon_path) as im:
+            icon: Image.Image = _grade_image(_fit_image(im.convert("RGBA"), (w, h), slot.get("fit", "contain")), slot)
+        # contain で小さくなった分は中央に寄せる
+        canvas.alpha_composite(icon, (x + (w - icon.width) // 2, y + (h - icon.height) // 2))
+
+    if "title" in layout:
+        _draw_text_box(canvas, config.title, layout["title"])
+    if "description" in layout:
+        _draw_text_box(canvas, config.description, layout["description"])
+    return canvas
+
+
+def fit_to_size(im: Image.Image, size: Tuple[int, int], fit: str,
+                pad_color: Tuple[int, int, int, int] = (0, 0, 0, 0)) -> Image.Image:
+    """
+    画像を出力サイズに合わせる 幅か高さの片方が0以下の場合は縦横比から決める 両方0以下ならそのまま
+    fit は _fit_image と同じ(以前の crop / pad / scale も使える) contain の余白は pad_color で埋める
+    """
+    w, h = size
+    if w <= 0 and h <= 0:
+        return im
+    if w <= 0:
+        w = max(1, round(im.width * h / im.height))
+    elif h <= 0:
+        h = max(1, round(im.height * w / im.width))
+    resized: Image.Image = _fit_image(im, (w, h), FIT_ALIASES.get(fit, fit))
+    if resized.size == (w, h):
+        return resized
+    padded: Image.Image = Image.new("RGBA", (w, h), pad_color)
+    padded.paste(resized.convert("RGBA"), ((w - resized.width) // 2, (h - resized.height) // 2))
+    return padded
+
+
+def _save_output_variant(im: Image.Image, output: OutputSpec) -> Path:
+    im = fit_to_size(im, output.size, output.fit, output.pad_color)
+    if output.format == "jpg":
+        im = im.convert("RGB")
+    if output.file_path.exists():
+        output.file_path.unlink()
+    if output.format == "png":
+        im.save(output.file_path.as_posix())
+    else:
+        im.save(output.file_path.as_posix(), quality=output.quality)
+    return output.file_path
+
+
+def _save_output(im: Image.Image, config: Config) -> List[Path]:
+    """
+    リサイズとフォーマット変換しつつ outputs の全ての出力画像を出力フォルダに保存する
+    レンダリング画像は1回だけ読み込んで、出力ごとのリサイズと圧縮はスレッドで並列に行う
+    :return: 出力した画像のパス
+    """
+    im.load()
+    if len(config.outputs) == 1:
+        return [_save_output_variant(im, config.outputs[0])]
+    with ThreadPoolExecutor(max_workers=min(len(config.outputs), os.cpu_count() or 1)) as executor:
+        return list(executor.map(functools.partial(_save_output_variant, im), config.outputs))
+
+
+_store_lock: threading.Lock = threading.Lock()
+
+# 作業中のワークフォルダ バッチモードで他のスレッドのガベージコレクションに消されないようにする
+_active_work_dir_paths: set = set()
+
+
+def get_work_root_path(config: Config) -> Path:
+    """
+    ワークフォルダを作るフォルダ work_dir の指定がなければ一時フォルダの下に作る
+    ハードリンクは同じドライブでしか使えないので素材置き場もここに作る
+    """
+    if config.work_dir_path is not None:
+        return config.work_dir_path
+    return Path(tempfile.gettempdir()) / "lgml_thumbgen"
+
+
+def _link_from_store(src_path: Path, dst_path: Path, store_dir_path: Path) -> Path:
+    """
+    ファイルを内容のハッシュ名で素材置き場に入れて、ワークフォルダにはハードリンクを作る
+    同じテンプレートや背景を使うワークフォルダ間でファイルの実体を共有する
+    ハードリンクが使えない場合はコピーする
+    :return: 素材置き場のファイルのパス
+    """
+    stat: os.stat_result = src_path.stat()
+    digest: str = _get_file_hash(src_path, stat.st_mtime_ns, stat.st_size)
+    store_path: Path = store_dir_path / digest[:2] / f"{digest}{src_path.suffix}"
+    with _store_lock:
+        if not store_path.exists():
+            store_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path: Path = store_path.with_name(f"{store_path.name}.{os.getpid()}.tmp")
+            shutil.copyfile(src_path, temp_path)
+            os.replace(temp_path, store_path)
+        dst_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(store_path, dst_path)
+        except OSError:
+            shutil.copyfile(store_path, dst_path)
+    return store_path
+
+
+def create_work_dir(content_dir_path: Path, config: Config, work_dir_path: Path) -> None:
+    """
+    AEに渡すワークフォルダを作る
+    テンプレートとコンテンツの素材は素材置き場からのハードリンク、info.jsonだけ新しく書き出す
+    """
+    store_dir_path: Path = get_work_root_path(config) / STORE_DIR_NAME
+    files: Dict[str, Path] = {}
+    for x in config.template_dir_path.rglob("*"):
+        if x.is_file():
+            files[x.relative_to(config.template_dir_path).as_posix()] = x
+    # bg.png とアイコンはコンテンツフォルダのもので置き換える アイコンが無ければ透明の物で埋める
+    files["bg.png"] = content_dir_path / "bg.png"
+    for icon_file_name in ICON_FILE_NAMES:
+        src_icon_path: Path = content_dir_path / icon_file_name
+        files[icon_file_name] = src_icon_path if src_icon_path.exists() else DUMMY_ICON_PATH
+    work_dir_path.mkdir(parents=True)
+    refs: List[str] = []
+    for name, src_path in files.items():
+        if name in WORK_DIR_REWRITTEN_FILE_NAMES:
+            continue
+        refs.append(_link_from_store(src_path, work_dir_path / name, store_dir_path).relative_to(
+            store_dir_path).as_posix())
+    with open(work_dir_path / STORE_REFS_FILE_NAME, "w", encoding="utf-8") as fp:
+        json.dump(sorted(set(refs)), fp, indent=4)
+
+    # config json の作成 リンク先を書き換えないように新しいファイルとして作る
+    o: Dict[str, Any] = config.create_json_obj()
+    with open((work_dir_path / "info.json").as_posix(), "w", encoding="utf-8") as fp:
+        json.dump(o, fp, indent=4, ensure_ascii=False)
+
+
+def _load_store_refs(work_dir_path: Path) -> List[str]:
     try:
-        result = subprocess.run(commands)
-    except Exception as e:
-        print(e)
+        with open(work_dir_path / STORE_REFS_FILE_NAME, "r", encoding="utf-8") as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return []
 
 
+def collect_garbage(work_root_path: Path, keep_count: int = WORK_DIR_KEEP_COUNT) -> None:
+    """
+    古いワークフォルダを新しいものから keep_count 個残して削除し、
+    どのワークフォルダからも使われなくなった素材置き場のファイルを削除する
+    ハードリンクできた素材はリンク数、コピーした素材は残ったワークフォルダの STORE_REFS_FILE_NAME で使用中とみなす
+    """
+    if not work_root_path.is_dir():
+        return
+    with _store_lock:
+        work_dir_paths: List[Path] = sorted(x for x in work_root_path.iterdir()
+                                            if x.is_dir() and WORK_DIR_NAME_PATTERN.match(x.name) is not None
+                                            and x not in _active_work_dir_paths)
+        # フォルダ名の先頭が日時なので名前順が作成順
+        for work_dir_path in work_dir_paths[:max(0, len(work_dir_paths) - keep_count)]:
+            shutil.rmtree(work_dir_path, ignore_errors=True)
+        store_dir_path: Path = work_root_path / STORE_DIR_NAME
+        if not store_dir_path.is_dir():
+            return
+        # 作成中のワークフォルダも含めて残ったワークフォルダが使っている素材
+        refs: Set[str] = set()
+        for work_dir_path in work_root_path.iterdir():
+            if work_dir_path.is_dir() and WORK_DIR_NAME_PATTERN.match(work_dir_path.name) is not None:
+                refs.update(_load_store_refs(work_dir_path))
+        for store_path in store_dir_path.rglob("*"):
+            if store_path.is_file() and store_path.stat().st_nlink <= 1 and \
+                    store_path.relative_to(store_dir_path).as_posix() not in refs:
+                store_path.unlink()
+        for sub_dir_path in store_dir_path.iterdir():
+            if sub_dir_path.is_dir() and not any(sub_dir_path.iterdir()):
+                sub_dir_path.rmdir()
 
-def main():
-    parser = argparse.ArgumentParser(description="LGML thumbnail generator")
-    parser.add_argument("content_dir", type=str, help="コンテンツフォルダのパス")
-    params = parser.parse_args()
-    content_dir_path: Path = Path(params.content_dir)
+
+def prepare_work_dir(content_dir_path: Path, config: Config) -> Path:
+    """
+    ワークフォルダを作って作業中として登録する 使い終わったら release_work_dir を呼ぶ
+    """
+    # バッチモードで同時に作られても重ならないようにコンテンツフォルダ名も付ける
+    work_dir_path: Path = get_work_root_path(config) / \
+        f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{content_dir_path.name}"
+    with _store_lock:
+        _active_work_dir_paths.add(work_dir_path)
+    try:
+        create_work_dir(content_dir_path, config, work_dir_path)
+    except Exception:
+        release_work_dir(config, work_dir_path)
+        raise
+    return work_dir_path
+
+
+def release_work_dir(config: Config, work_dir_path: Path) -> None:
+    with _store_lock:
+        _active_work_dir_paths.discard(work_dir_path)
+    # 出力画像を読み終わってから一時ワークフォルダを破棄する
+    if config.work_dir_path is None:
+        shutil.rmtree(work_dir_path, ignore_errors=True)
+    collect_garbage(get_work_root_path(config))
+
+
+def finish_work_dir(config: Config, work_dir_path: Path, job: RenderJob) -> List[Path]:
+    """
+    レンダリングされた画像を出力フォルダに保存してワークフォルダを解放する
+    :return: 出力した画像のパス
+    """
+    try:
+        assert job.status == "done", f"{job.status}: {job.error}"
+        # リサイズとフォーマット変換しつつ出力フォルダにコピー
+        with Image.open(job.output_path) as im:
+            return _save_output(im, config)
+    finally:
+        release_work_dir(config, work_dir_path)
+
+
+def build(content_dir_path: Path, renderer: str | None = None,
+          render_queue: RenderQueue | None = None) -> List[Path]:
+    """
+    コンテンツフォルダ1つ分のサムネイル画像を出力する
+    :param renderer: config.tomlの renderer より優先するレンダラー
+    :param render_queue: afterfx レンダラーで使うレンダーキュー 指定がなければAEで1つずつレンダリングする
+    :return: 出力した画像のパス
+    """
     assert content_dir_path.exists(), "コンテンツフォルダが存在しません"
     assert content_dir_path.is_dir(), "コンテンツフォルダのパスがディレクトリではありません"
     for asset in CONTENT_ASSETS_REQUIRED:
         assert (content_dir_path / asset).exists(), f"{asset}が存在しません"
-    config: Config = Config(content_dir_path / "config.toml")
-    temp_dir_path: tempfile.TemporaryDirectory | None = None
-    work_dir_path: Path = config.work_dir_path
-    if work_dir_path is None:
-        tempfile.TemporaryDirectory()
-        work_dir_path: Path = Path(temp_dir_path.name) / datetime.now().strftime("%Y%m%d%H%M%S")
-    else:
-        work_dir_path = work_dir_path / datetime.now().strftime("%Y%m%d%H%M%S")
+    config: Config = Config(content_dir_path / "config.toml", renderer)
+    if config.renderer == "pillow":
+        # ワークフォルダを使わずに直接合成する
+        return _save_output(render_with_pillow(content_dir_path, config), config)
 
-    shutil.copytree(config.template_dir_path, work_dir_path)
+    if render_queue is None:
+        render_queue = RenderQueue(create_render_backend("afterfx"))
+    work_dir_path: Path = prepare_work_dir(content_dir_path, config)
+    job: RenderJob = render_queue.submit(work_dir_path, content_dir_path.name, config.ae_version)
+    try:
+        render_queue.run()
+    except Exception:
+        release_work_dir(config, work_dir_path)
+        raise
+    return finish_work_dir(config, work_dir_path, job)
 
-    # config json の作成 上書きOK
-    o:  Dict[str, Any] = config.create_json_obj()
-    with open((work_dir_path / "info.json").as_posix(), "w", encoding="utf-8") as fp:
-        json.dump(o, fp, indent=4, ensure_ascii=False)
 
-    # bg.png のコピー 上書きOK
-    shutil.copyfile(content_dir_path / "bg.png", (work_dir_path / "bg.png").as_posix())
+@functools.lru_cache(maxsize=None)
+def _get_file_hash(file_path: Path, mtime_ns: int, size: int) -> str:
+    """
+    ファイル内容のハッシュ 同じテンプレートを使うコンテンツが多いので更新日時とサイズが同じなら使いまわす
+    """
+    h = hashlib.sha256()
+    with open(file_path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
 
-    # iconファイルのコピー 上書きOK
-    dummy_icon_path: Path = Path(__file__).parent / "resources/transparent64x64.png"
-    for icon_file_name in ICON_FILE_NAMES:
-        target_icon_path: Path = (work_dir_path / icon_file_name)
-        if target_icon_path.exists():
-            target_icon_path.unlink()
-        src_icon_path: Path = content_dir_path / icon_file_name
-        if src_icon_path.exists():
-            # アイコンファイルがあればコピー
-            shutil.copyfile(src_icon_path, target_icon_path)
-        else:
-            # 透明の物で埋める
-            shutil.copyfile(dummy_icon_path, target_icon_path)
-
-    # AEで画像出力
-    _export(work_dir_path, config)  # TODO FIX
-    if temp_dir_path is not None:
-        temp_dir_path.cleanup()
-    export_image_path: Path = work_dir_path / "image_00000.png"
-    assert export_image_path.exists(), "画像が出力されていません"
-
-    # リサイズとフォーマット変換しつつ出力フォルダにコピー
-    im = Image.open(export_image_path)
-    if config.output_image_size[0] > 0 and config.output_image_size[1] > 0:
-        # 本当は LGMLImageSizeAdjuster.py を使いたい
-        im = im.resize(config.output_image_size)
-    if config.output_file_path.suffix == ".jpg":
-        im = im.convert("RGB")
-    if config.output_file_path.exists():
-        config.output_file_path.unlink()
-    im.save(config.output_file_path.as_posix())
 
+def compute_fingerprint(content_dir_path: Path, renderer: str | None = None, config: Config | None = None) -> str:
+    """
+    出力結果に影響するファイルからコンテンツフォルダのフィンガープリントを作る
+    config.toml, bg.png, アイコン, 透明アイコン, template_dirの全ファイル
+    :param config: 読み込み済みの config.toml 省略時は読み込む
+    """
+    if config is None:
+        config = Config(content_dir_path / "config.toml", renderer)
+    files: List[Tuple[str, Path]] = [(x, content_dir_path / x) for x in CONTENT_ASSETS_REQUIRED + ICON_FILE_NAMES
+                                     if (content_dir_path / x).exists()]
+    files.append(("resources/" + DUMMY_ICON_PATH.name, DUMMY_ICON_PATH))
+    if config.renderer == "pillow":
+        files.append(("resources/" + DEFAULT_LAYOUT_PATH.name, DEFAULT_LAYOUT_PATH))
+    files.extend(("template/" + x.relative_to(config.template_dir_path).as_posix(), x)
+                 for x in sorted(config.template_dir_path.rglob("*")) if x.is_file())
+    h = hashlib.sha256()
+    for name, file_path in files:
+        stat: os.stat_result = file_path.stat()
+        h.update(f"{name}:{_get_file_hash(file_path, stat.st_mtime_ns, stat.st_size)}\n".encode("utf-8"))
+    # 出力先やレンダラーが変わった場合も作り直す
+    for output in config.outputs:
+        h.update(f"output:{json.dumps(output.create_json_obj(), sort_keys=True)}\n".encode("utf-8"))
+    h.update(f"renderer:{config.renderer}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def find_output_collisions(outputs: Dict[str, List[Path]]) -> Dict[str, List[str]]:
+    """
+    同じ出力画像のパスに書き出すコンテンツフォルダを探す
+    :param outputs: コンテンツフォルダ名ごとの出力画像のパス
+    :return: 出力先が重なるコンテンツフォルダ名ごとの、重なっている相手のコンテンツフォルダ名
+    """
+    owners: Dict[str, List[str]] = {}
+    for name, paths in outputs.items():
+        for path in paths:
+            # Windowsでは大文字小文字が違っても同じファイル
+            owners.setdefault(os.path.normcase(os.path.normpath(path)), []).append(name)
+    ret: Dict[str, List[str]] = {}
+    for names in owners.values():
+        if len(names) < 2:
+            continue
+        for name in names:
+            others: List[str] = ret.setdefault(name, [])
+            others.extend(x for x in names if x != name and x not in others)
+    return ret
+
+
+def build_all(contents_dir_path: Path, jobs: int, force: bool, dry_run: bool, renderer: str | None = None,
+              render_queue: RenderQueue | None = None, queue_status_path: Path | None = None) -> None:
+    """
+    contents_dir直下のコンテンツフォルダのうち、前回の出力からフィンガープリントが変わったものだけを出力する
+    同時に動かすレンダリングの数はjobsまで
+    出力先が他のコンテンツフォルダと重なるものは、並列に上書きし合って両方とも出力済みと記録されてしまうので出力せずに失敗にする
+    afterfx レンダラーのものは先にワークフォルダを全て作ってから、レンダーキューでまとめてレンダリングする
+    :param queue_status_path: ジョブごとのレンダリング結果を書き出すjsonファイルのパス
+    """
+    assert contents_dir_path.is_dir(), "コンテンツフォルダの親フォルダが存在しません"
+    state_path: Path = contents_dir_path / BATCH_STATE_FILE_NAME
+    state: Dict[str, Dict[str, Any]] = {}
+    if state_path.exists():
+        with open(state_path, "r", encoding="utf-8") as fp:
+            state = json.load(fp)
+
+    candidates: List[Tuple[Path, str]] = []
+    outputs: Dict[str, List[Path]] = {}
+    for content_dir_path in sorted(contents_dir_path.iterdir()):
+        if not (content_dir_path / "config.toml").exists():
+            continue
+        try:
+            config: Config = Config(content_dir_path / "config.toml", renderer)
+            fingerprint: str = compute_fingerprint(content_dir_path, renderer, config)
+        except AssertionError as e:
+            print(f"skip {content_dir_path.name}: {e}")
+            continue
+        # 変更の無いものも含めて出力先の重なりを調べる
+        outputs[content_dir_path.name] = [x.file_path for x in config.outputs]
+        candidates.append((content_dir_path, fingerprint))
+    collisions: Dict[str, List[str]] = find_output_collisions(outputs)
+    for name, others in collisions.items():
+        print(f"failed {name}: 出力先が {', '.join(others)} と重なっています")
+
+    targets: List[Tuple[Path, str]] = []
+    for content_dir_path, fingerprint in candidates:
+        if content_dir_path.name in collisions:
+            continue
+        prev: Dict[str, Any] | None = state.get(content_dir_path.name)
+        if not force and prev is not None and prev["fingerprint"] == fingerprint and \
+                all(Path(x).exists() for x in prev.get("outputs", [prev.get("output", "")])):
+            continue
+        targets.append((content_dir_path, fingerprint))
+    print(f"{len(targets)} content(s) to build")
+    for content_dir_path, _ in targets:
+        print(f"  {content_dir_path.name}")
+    if dry_run or len(targets) == 0:
+        if len(collisions) > 0 and not dry_run:
+            print(f"0 built, {len(collisions)} failed")
+        return
+
+    if render_queue is None:
+        render_queue = RenderQueue(create_render_backend("afterfx"), workers=jobs)
+    built: int = 0
+    failed: int = len(collisions)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures: Dict[Future, Tuple[Path, str]] = {}
+        queued: List[Tuple[Path, str, Config, Path, RenderJob]] = []
+        for content_dir_path, fingerprint in targets:
+            config = Config(content_dir_path / "config.toml", renderer)
+            if config.renderer == "pillow":
+                futures[executor.submit(build, content_dir_path, renderer)] = (content_dir_path, fingerprint)
+                continue
+            try:
+                work_dir_path: Path = prepare_work_dir(content_dir_path, config)
+            except Exception as e:
+                failed += 1
+                print(f"failed {content_dir_path.name}: {e}")
+                continue
+            queued.append((content_dir_path, fingerprint, config, work_dir_path,
+                           render_queue.submit(work_dir_path, content_dir_path.name, config.ae_version)))
+        if len(queued) > 0:
+            # pillow レンダラーのものはこの間もスレッドで出力が進む
+            render_queue.run()
+            for job in render_queue.jobs:
+                print(f"render {job.name}: {job.status} attempts {job.attempts} {job.elapsed:.1f}s")
+            if queue_status_path is not None:
+                with open(queue_status_path, "w", encoding="utf-8") as fp:
+                    json.dump(render_queue.get_status(), fp, indent=4, ensure_ascii=False)
+        for content_dir_path, fingerprint, config, work_dir_path, job in queued:
+            futures[executor.submit(finish_work_dir, config, work_dir_path, job)] = (content_dir_path, fingerprint)
+        for future in as_completed(futures):
+            content_dir_path, fingerprint = futures[future]
+            try:
+                output_paths: List[Path] = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"failed {content_dir_path.name}: {e}")
+                continue
+            built += 1
+            state[content_dir_path.name] = {
+                "fingerprint": fingerprint,
+                "outputs": [x.as_posix() for x in output_paths],
+                "built": datetime.now().isoformat(timespec="seconds"),
+            }
+            # 途中で止めても出力済みのものは次回作り直さないように毎回保存する
+            with open(state_path, "w", encoding="utf-8") as fp:
+                json.dump(state, fp, indent=4, ensure_ascii=False)
+            print(f"done {content_dir_path.name} -> {', '.join(x.as_posix() for x in output_paths)}")
+    print(f"{built} built, {failed} failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LGML thumbnail generator")
+    parser.add_argument("content_dir", type=str,
+                        help="コンテンツフォルダのパス --batch の場合はコンテンツフォルダをまとめたフォルダのパス")
+    parser.add_argument("--batch", action="store_true",
+                        help="content_dir直下のコンテンツフォルダのうち、変更があったものだけをまとめて出力する")
+    parser.add_argument("-j", "--jobs", type=int, default=2, help="バッチモードで同時に動かすレンダリング数")
+    parser.add_argument("--force", action="store_true", help="バッチモードで変更がなくても全て出力する")
+    parser.add_argument("--renderer", type=str, default=None, choices=RENDERERS,
+                        help="config.tomlの renderer より優先するレンダラー pillowはテンプレートの layout.toml で合成する")
+    parser.add_argument("--render_backend", type=str, default="afterfx", choices=RENDER_BACKENDS,
+                        help="afterfx レンダラーの出力に使うバックエンド stubはAEを使わずに簡単な画像を出力する(テスト用)")
+    parser.add_argument("--batch_size", type=int, default=8, help="AEを1回起動してまとめてレンダリングする数")
+    parser.add_argument("--timeout", type=float, default=300.0, help="レンダリング1つあたりの制限時間(秒)")
+    parser.add_argument("--retries", type=int, default=1, help="レンダリングに失敗したものをやり直す回数")
+    parser.add_argument("--stub_delay", type=float, nargs=2, default=None, metavar=("LAUNCH", "JOB"),
+                        help="stubバックエンドで起動とレンダリング1つにかかる時間の見立て(秒) 計測用")
+    parser.add_argument("--queue_status", type=str, default="", help="バッチモードでレンダリング結果を書き出すjsonファイル")
+    parser.add_argument("--dry_run", action="store_true", help="バッチモードで出力対象の表示だけ行う")
+    params = parser.parse_args()
+    assert params.jobs > 0, "jobsは1以上を指定してください"
+    render_queue: RenderQueue = RenderQueue(create_render_backend(params.render_backend, params.stub_delay),
+                                            params.batch_size, params.timeout, params.retries, params.jobs)
+    if params.batch:
+        build_all(Path(params.content_dir), params.jobs, params.force, params.dry_run, params.renderer, render_queue,
+                  Path(params.queue_status) if len(params.queue_status) > 0 else None)
+        return
+    build(Path(params.content_dir), params.renderer, render_queue)
 
 if __name__ == "__main__":
     main()
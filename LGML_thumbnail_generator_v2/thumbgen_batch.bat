@@ -0,0 +1,3 @@
+call %~dp0\..\venv\Scripts\activate.bat
+python %~dp0thumbgen.py %~dp0contents --batch
+pause
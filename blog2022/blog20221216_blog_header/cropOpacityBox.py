@@ -1,24 +1,135 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import List
 import PIL
 from PIL import Image
 from pathlib import Path
 import argparse
 
+SRC_IMAGE_EXTENSIONS = ['.png', '.tga', '.tif', '.tiff', '.webp']
+
+
+def find_opacity_bbox(img: Image, alpha_threshold: int = 0) -> tuple[int, int, int, int] | None:
+    """
+    find bounding box (left, top, right, bottom) of pixels whose alpha is larger than alpha_threshold.
+    the alpha is thresholded with a lookup table and the bbox is taken by Pillow in C.
+    with alpha_threshold 0 the result is the same as img.getbbox().
+    images without alpha channel fall back to img.getbbox().
+    """
+    if 'A' not in img.getbands():
+        return img.getbbox()
+    alpha: Image = img.getchannel('A')
+    if alpha_threshold > 0:
+        # 255 above the threshold, 0 otherwise
+        alpha = alpha.point([0] * (alpha_threshold + 1) + [255] * (255 - alpha_threshold))
+    return alpha.getbbox()
+
+
+def crop_image(img: Image, alpha_threshold: int, width: int, height: int) -> tuple[Image, tuple | None]:
+    """
+    不透明部分をクロップして、指定があれば横幅か縦幅に合わせてリサイズする
+    :return: クロップした画像 / クロップ範囲(left, top, right, bottom) 全部透明ならNone
+    """
+    bbox = find_opacity_bbox(img, alpha_threshold)
+    if bbox is not None:
+        img = img.crop(bbox)
+    if width > 0:
+        img = img.resize((width, int(img.height * width / img.width)))
+    elif height > 0:
+        img = img.resize((int(img.width * height / img.height), height))
+    return img, bbox
+
+
+def crop_file(image_path: Path, output_path: Path, alpha_threshold: int, width: int, height: int) -> dict:
+    """
+    1ファイルをクロップして保存する バッチモードではワーカープロセスで実行される
+    """
+    with PIL.Image.open(image_path) as src_img:
+        size = src_img.size
+        img, bbox = crop_image(src_img, alpha_threshold, width, height)
+        img.save(output_path)
+    return {
+        'source': image_path.as_posix(),
+        'output': output_path.as_posix(),
+        'size': list(size),
+        'crop': list(bbox) if bbox is not None else None,
+        'output_size': list(img.size),
+    }
+
+
+def find_images(paths: List[str]) -> List[Path]:
+    """
+    ファイルとフォルダ(直下の画像)から入力画像を集める
+    """
+    ret: List[Path] = []
+    for path in paths:
+        p = Path(path)
+        assert p.exists(), f'file not found: {path}'
+        if p.is_dir():
+            ret.extend(sorted(x for x in p.iterdir() if x.is_file() and x.suffix.lower() in SRC_IMAGE_EXTENSIONS))
+        else:
+            ret.append(p)
+    return ret
+
+
+def crop_batch(images: List[Path], output_dir: Path, alpha_threshold: int, width: int, height: int,
+               jobs: int, manifest_path: str) -> None:
+    """
+    複数の画像をプロセス並列でクロップしてoutput_dirに保存し、クロップ範囲をjsonに記録する
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_paths: List[Path] = [output_dir / x.name for x in images]
+    assert len(set(output_paths)) == len(output_paths), 'same file names in different folders'
+    args = (images, output_paths, repeat(alpha_threshold), repeat(width), repeat(height))
+    results: List[dict]
+    if jobs == 1 or len(images) == 1:
+        results = list(map(crop_file, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(images))) as executor:
+            # 大量の小さい画像でもプロセス間のやり取りが増えないようにまとめて渡す
+            chunksize = max(1, min(64, len(images) // (jobs * 4)))
+            results = list(executor.map(crop_file, *args, chunksize=chunksize))
+    if len(manifest_path) == 0:
+        manifest_path = (output_dir / 'crop_manifest.json').as_posix()
+    with open(manifest_path, 'w', encoding='utf-8') as fp:
+        json.dump({'alpha_threshold': alpha_threshold, 'items': results}, fp, indent=2)
+    print(f'{len(results)} images cropped. manifest {manifest_path}')
+
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="画像の不透明部分をクロップします。")
-    parser.add_argument('image', default="", type=str, help='不透明部分を切り出す入力画像')
+    parser.add_argument('image', type=str, nargs='+',
+                        help='不透明部分を切り出す入力画像 複数の画像かフォルダを指定するとバッチモード')
     group = parser.add_mutually_exclusive_group()
     group.add_argument('--width', type=int, default=-1, help='最終的な横幅 縦幅と同時指定無効')
     group.add_argument('--height', type=int, default=-1, help='最終的な縦幅 横幅と同時指定無効')
     parser.add_argument('--output', type=str, default="", help='出力画像のパス')
-    parser.version = '1.0.0'
+    parser.add_argument('-at', '--alpha_threshold', type=int, default=0,
+                        help='この値以下の不透明度のピクセルは透明とみなす(0~254)')
+    parser.add_argument('-o', '--output_dir', type=str, default="", help='バッチモードの出力フォルダ')
+    parser.add_argument('--manifest', type=str, default="",
+                        help='クロップ範囲を記録するjsonのパス 省略時は出力フォルダのcrop_manifest.json')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='バッチモードの並列プロセス数')
+    parser.version = '1.1.0'
     args = parser.parse_args()
-    img = PIL.Image.open(args.image)
-    img = img.crop(img.getbbox())
-    if args.width > 0:
-        img = img.resize((args.width, int(img.height * args.width / img.width)))
-    elif args.height > 0:
-        img = img.resize((int(img.width * args.height / img.height), args.height))
+    assert 0 <= args.alpha_threshold <= 254, f'alpha_threshold must be 0~254: {args.alpha_threshold}'
+    assert args.jobs > 0, f'jobs must be 1~: {args.jobs}'
+    if len(args.output_dir) > 0 or len(args.image) > 1 or Path(args.image[0]).is_dir():
+        assert len(args.output_dir) > 0, 'output_dir is required for batch mode'
+        assert len(args.output) == 0, 'use output_dir for batch mode'
+        images = find_images(args.image)
+        assert len(images) > 0, 'No image file found.'
+        crop_batch(images, Path(args.output_dir), args.alpha_threshold, args.width, args.height,
+                   args.jobs, args.manifest)
+        return
+
+    img = PIL.Image.open(args.image[0])
+    size = img.size
+    img, bbox = crop_image(img, args.alpha_threshold, args.width, args.height)
+    if bbox is not None:
+        print(f'crop {bbox[0]} {bbox[1]} {bbox[2]} {bbox[3]} from {size[0]}x{size[1]}')
     if args.output:
         img.save(args.output)
     else:
@@ -29,3 +140,10 @@ def main() -> None:
 if __name__ == '__main__':
     main()
 
+
+
+"""
+sample command
+python cropOpacityBox.py images/header.png --output images/header_crop.png -at 8
+python cropOpacityBox.py renders/ -o renders_crop -at 8 -j 8 --manifest renders_crop.json
+"""
@@ -1,3 +1,7 @@
+import functools
+import json
+import cv2
+import numpy as np
 import PIL
 from PIL import Image
 from pathlib import Path
@@ -44,23 +48,55 @@ def get_clip_position(base_size: tuple[int, int], size: tuple[int, int], valign:
     return new_pos
 
 
+@functools.lru_cache(maxsize=None)
+def read_reference_size(extract_size_image_: str, scale: float) -> tuple[int, int]:
+    """
+    size of the reference image scaled by scale. only the header is read and the image is not resampled.
+    cached per path, so batch extraction against the same reference opens it only once.
+    """
+    assert Path(extract_size_image_).exists()
+    with PIL.Image.open(extract_size_image_) as extract_size_image:
+        size: tuple[int, int] = extract_size_image.size
+    if scale != 1.0:
+        size = (int(size[0] * scale), int(size[1] * scale))
+    return size
+
+
 def extract(img: Image, extract_size_image_: str, extract_size: tuple[int, int], valign: str, align: str,
             scale: float, force_square: bool) -> Image:
     if len(extract_size_image_) > 0:
-        assert Path(extract_size_image_).exists()
-        extract_size_image: Image = PIL.Image.open(extract_size_image_)
-        if scale != 1.0:
-            extract_size_image = extract_size_image.resize(
-                (int(extract_size_image.size[0] * scale), int(extract_size_image.size[1] * scale)))
-        extract_size = extract_size_image.size
+        extract_size = read_reference_size(extract_size_image_, scale)
         extract_size = find_fit_size_power_of_2(extract_size, force_square)
 
     new_pos: tuple[int, int] = get_clip_position(img.size, extract_size, valign, align)
     return img.crop((new_pos[0], new_pos[1], new_pos[0] + extract_size[0], new_pos[1] + extract_size[1]))
 
 
+def bleed_edge_color(img: Image) -> Image:
+    """
+    fill color of fully transparent pixels with the color of the nearest non transparent pixel.
+    alpha is kept, so the image looks the same but filtering / mip-mapping does not pull in the background color.
+    nearest pixels are found with opencv labeled distance transform (no per-pixel python loop).
+    """
+    rgba: np.ndarray = np.array(img if img.mode == 'RGBA' else img.convert('RGBA'))
+    transparent: np.ndarray = (rgba[..., 3] == 0).astype(np.uint8)
+    if not transparent.any() or transparent.all():
+        return img
+    # every zero (non transparent) pixel gets its own label, transparent pixels get the label of the nearest one
+    labels: np.ndarray
+    _, labels = cv2.distanceTransformWithLabels(transparent, cv2.DIST_L2, cv2.DIST_MASK_5,
+                                                labelType=cv2.DIST_LABEL_PIXEL)
+    packed: np.ndarray = rgba.view(np.uint32).reshape(-1)
+    seeds: np.ndarray = np.flatnonzero(transparent.reshape(-1) == 0)
+    label_colors: np.ndarray = np.empty(len(seeds) + 1, dtype=np.uint32)
+    label_colors[labels.reshape(-1)[seeds]] = packed[seeds]
+    filled: np.ndarray = label_colors[labels].view(np.uint8).reshape(rgba.shape)
+    filled[..., 3] = rgba[..., 3]
+    return PIL.Image.fromarray(filled, 'RGBA')
+
+
 def resize(img: Image, scale: float, bg_color: tuple[int, int, int],
-           alpha: int, valign: str, align: str, force_square: bool) -> Image:
+           alpha: int, valign: str, align: str, force_square: bool, edge_bleed: bool = False) -> Image:
     if scale != 1.0:
         img = img.resize((int(img.size[0] * scale), int(img.size[1] * scale)))
     assert img.size[0] <= TARGET_SIZES[0] and img.size[1] <= TARGET_SIZES[0]
@@ -70,13 +106,57 @@ def resize(img: Image, scale: float, bg_color: tuple[int, int, int],
         'RGBA', new_size, (col[0], col[1], col[2], int(alpha)))
     new_pos = get_clip_position(new_size, img.size, valign, align)
     bg_img.paste(img, new_pos)
+    if edge_bleed:
+        bg_img = bleed_edge_color(bg_img)
     return bg_img
 
 
+def roundtrip(img: Image, scale: float, bg_color: tuple[int, int, int], alpha: int, valign: str, align: str,
+              force_square: bool, edge_bleed: bool = False) -> Image:
+    """
+    resize -> extract in memory without writing the intermediate image.
+    the padded canvas is cropped back to the scaled source size with the same alignment.
+    """
+    scaled_size: tuple[int, int] = (int(img.size[0] * scale), int(img.size[1] * scale))
+    img = resize(img, scale, bg_color, alpha, valign, align, force_square, edge_bleed)
+    return extract(img, '', scaled_size, valign, align, 1.0, force_square)
+
+
+def save_image(img: Image, output_image_path: Path) -> None:
+    if output_image_path.suffix == '.jpg' or output_image_path.suffix == '.gif':
+        img = img.convert('RGB')
+    img.save(output_image_path)
+
+
+def extract_batch(manifest_path: Path, valign: str, align: str, scale: float, force_square: bool) -> None:
+    """
+    extract many images listed in a manifest json in one run.
+    manifest is a list of {"src": processed image, "reference": extract size image, "output": output image}
+    and each item can override "scale", "valign", "align". relative paths are from the manifest directory.
+    "extract_size": [w, h] can be used instead of "reference".
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as fp:
+        items: list[dict] = json.load(fp)
+    base_dir: Path = manifest_path.parent
+    for item in items:
+        src_image_path: Path = base_dir / item['src']
+        output_image_path: Path = base_dir / item['output']
+        reference: str = (base_dir / item['reference']).as_posix() if 'reference' in item else ''
+        with PIL.Image.open(src_image_path) as img:
+            img = extract(img, reference, tuple(item.get('extract_size', [0, 0])),
+                          item.get('valign', valign), item.get('align', align), item.get('scale', scale),
+                          force_square)
+        save_image(img, output_image_path)
+        print(f'{src_image_path.as_posix()} -> {output_image_path.as_posix()} {img.size[0]}x{img.size[1]}')
+
+
 def main() -> None:
     parser = argparse.ArgumentParser()
-    parser.add_argument('mode', choices=['resize', 'extract'], help='resize: 画像をリサイズする。extract: 画像を切り抜く。')
-    parser.add_argument('src_image', type=str, help='source image')
+    parser.add_argument('mode', choices=['resize', 'extract', 'roundtrip', 'batch_extract'],
+                        help='resize: 画像をリサイズする。extract: 画像を切り抜く。'
+                             'roundtrip: resizeしてextractした結果を中間画像を保存せずに出力する。'
+                             'batch_extract: src_imageのjsonに書かれた画像をまとめて切り抜く。')
+    parser.add_argument('src_image', type=str, help='source image (manifest json for batch_extract mode)')
     parser.add_argument('-o', '--output_image', type=str, default='', help='output image file path')
     parser.add_argument('-s', '--scale', type=float, default=1.0,
                         help='src image scale for resize mode, target image scale for extract mode')
@@ -86,6 +166,8 @@ def main() -> None:
                         help='If True, the output image is square. resize mode only.')
     parser.add_argument('--resize_bg_color', type=int, nargs=3, default=[0, 0, 0], help='resize mode only')
     parser.add_argument('--resize_bg_alpha', type=int, default=0, help='resize mode only')
+    parser.add_argument('--edge_bleed', action='store_true',
+                        help='fill color of transparent padding with the nearest opaque color. resize mode only')
     extract_options = parser.add_mutually_exclusive_group()
     extract_options.add_argument('--extract_size_image',
                                  type=str, default="", help='extract mode only')
@@ -93,6 +175,9 @@ def main() -> None:
                                  type=int, nargs=2, default=[100, 100], help='extract mode only')
     args = parser.parse_args()
     assert Path(args.src_image).exists()
+    if args.mode == 'batch_extract':
+        extract_batch(Path(args.src_image), args.valign, args.align, args.scale, args.resize_force_square)
+        return
     if len(args.output_image) == 0:
         output_image_path: Path = Path(args.src_image).parent / Path(Path(args.src_image).stem + '_out.png')
     else:
@@ -100,13 +185,14 @@ def main() -> None:
     img: Image = PIL.Image.open(args.src_image)
     if args.mode == 'resize':
         img = resize(img, args.scale, args.resize_bg_color, args.resize_bg_alpha,
-                     args.valign, args.align, args.resize_force_square)
+                     args.valign, args.align, args.resize_force_square, args.edge_bleed)
     elif args.mode == 'extract':
         img = extract(img, args.extract_size_image, args.extract_size, args.valign, args.align,
                       args.scale, args.resize_force_square)
-    if output_image_path.suffix == '.jpg' or output_image_path.suffix == '.gif':
-        img = img.convert('RGB')
-    img.save(output_image_path)
+    elif args.mode == 'roundtrip':
+        img = roundtrip(img, args.scale, args.resize_bg_color, args.resize_bg_alpha,
+                        args.valign, args.align, args.resize_force_square, args.edge_bleed)
+    save_image(img, output_image_path)
 
 
 if __name__ == '__main__':
@@ -116,6 +202,12 @@ if __name__ == '__main__':
 """
 sample command
 python modifyImageForSubstanceInput.py resize images/qbg.jpg -o images/qbg_out.png --valign top --align left --resize_bg_color 200 20 24
+python modifyImageForSubstanceInput.py resize images/icon.png -o images/icon_out.png --edge_bleed
 python modifyImageForSubstanceInput.py extract images/qbg_out.png -o images/qbg_out2.png --extract_size_image images/qbg.jpg --valign top --align left
 python modifyImageForSubstanceInput.py extract images/qbg_out.png -o images/qbg_out3.png --extract_size 758 578 --valign top --align left
+python modifyImageForSubstanceInput.py roundtrip images/qbg.jpg -o images/qbg_out4.png -s 0.5 --valign top --align left
+python modifyImageForSubstanceInput.py batch_extract images/extract_manifest.json --valign top --align left
+# extract_manifest.json
+# [{"src": "qbg_out.png", "reference": "qbg.jpg", "output": "qbg_out2.png"},
+#  {"src": "qbg_out.png", "extract_size": [758, 578], "output": "qbg_out3.png"}]
 """
@@ -0,0 +1,50 @@
+import sys
+from pathlib import Path
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+from cropOpacityBox import find_opacity_bbox, crop_image
+
+
+def _get_bbox_reference(a: np.ndarray, alpha_threshold: int) -> tuple[int, int, int, int] | None:
+    ys, xs = np.nonzero(a[..., 3] > alpha_threshold)
+    if len(xs) == 0:
+        return None
+    return int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1
+
+
+def test_find_opacity_bbox():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        h, w = rng.integers(1, 80, 2)
+        a = np.zeros((h, w, 4), dtype=np.uint8)
+        # まばらな半透明の点 しきい値ごとに範囲が変わる
+        a[..., 3] = np.where(rng.random((h, w)) < 0.02, rng.integers(0, 256, (h, w)), 0)
+        img = Image.fromarray(a, 'RGBA')
+        for alpha_threshold in [0, 1, 8, 128, 254]:
+            assert find_opacity_bbox(img, alpha_threshold) == _get_bbox_reference(a, alpha_threshold)
+
+
+def test_find_opacity_bbox_without_alpha():
+    img = Image.new('RGB', (16, 8))
+    img.paste((255, 0, 0), (3, 2, 5, 4))
+    assert find_opacity_bbox(img, 8) == (3, 2, 5, 4)
+
+
+def test_crop_image():
+    img = Image.new('RGBA', (64, 32))
+    img.paste((255, 255, 255, 4), (0, 0, 64, 32))
+    img.paste((255, 255, 255, 255), (10, 6, 30, 16))
+    cropped, bbox = crop_image(img, 8, 40, -1)
+    assert bbox == (10, 6, 30, 16)
+    assert cropped.size == (40, 20)
+    cropped, bbox = crop_image(Image.new('RGBA', (8, 8)), 0, -1, -1)
+    assert bbox is None and cropped.size == (8, 8)
+
+
+if __name__ == '__main__':
+    test_find_opacity_bbox()
+    test_find_opacity_bbox_without_alpha()
+    test_crop_image()
@@ -0,0 +1,38 @@
+import sys
+from pathlib import Path
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+from modifyImageForSubstanceInput import bleed_edge_color, get_clip_position
+
+
+def test_bleed_edge_color():
+    img = Image.new('RGBA', (16, 8), (0, 0, 0, 0))
+    img.paste((255, 0, 0, 255), (0, 0, 2, 8))
+    img.paste((0, 0, 255, 128), (14, 0, 16, 8))
+    a = np.asarray(bleed_edge_color(img))
+    # 透明なピクセルは一番近い不透明なピクセルの色になり、透明度はそのまま
+    assert (a[..., 3] == np.asarray(img)[..., 3]).all()
+    assert (a[:, 2:7, :3] == (255, 0, 0)).all()
+    assert (a[:, 9:14, :3] == (0, 0, 255)).all()
+
+
+def test_bleed_edge_color_all_transparent():
+    img = Image.new('RGBA', (4, 4), (0, 0, 0, 0))
+    assert bleed_edge_color(img) is img
+
+
+def test_get_clip_position():
+    assert tuple(get_clip_position((100, 60), (40, 20), 'middle', 'center')) == (30, 20)
+    assert tuple(get_clip_position((100, 60), (40, 20), 'top', 'left')) == (0, 0)
+    assert tuple(get_clip_position((100, 60), (40, 20), 'bottom', 'right')) == (60, 40)
+    # 切り出す範囲の方が大きい場合は負の位置になる
+    assert tuple(get_clip_position((40, 20), (100, 60), 'middle', 'center')) == (-30, -20)
+
+
+if __name__ == '__main__':
+    test_bleed_edge_color()
+    test_bleed_edge_color_all_transparent()
+    test_get_clip_position()
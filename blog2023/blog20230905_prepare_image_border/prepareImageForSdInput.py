@@ -1,5 +1,10 @@
+import json
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from typing import List
+import cv2
+import numpy as np
 import PIL
 from PIL import Image
 from pathlib import Path
@@ -36,14 +41,68 @@ def get_clip_position(base_size: tuple[int, int], size: tuple[int, int], align:
     return new_pos[0], new_pos[1]
 
 
+def find_opacity_bbox(img: Image, alpha_threshold: int = 0) -> tuple[int, int, int, int] | None:
+    """
+    find bounding box (left, top, right, bottom) of pixels whose alpha is larger than alpha_threshold.
+    the alpha is thresholded with a lookup table and the bbox is taken by Pillow in C.
+    with alpha_threshold 0 the result is the same as img.getbbox().
+    images without alpha channel fall back to img.getbbox().
+    """
+    if 'A' not in img.getbands():
+        return img.getbbox()
+    alpha: Image = img.getchannel('A')
+    if alpha_threshold > 0:
+        # 255 above the threshold, 0 otherwise
+        alpha = alpha.point([0] * (alpha_threshold + 1) + [255] * (255 - alpha_threshold))
+    return alpha.getbbox()
+
+
+def bleed_edge_color(img: Image) -> Image:
+    """
+    fill color of fully transparent pixels with the color of the nearest non transparent pixel.
+    alpha is kept, so the image looks the same but filtering / mip-mapping does not pull in the background color.
+    nearest pixels are found with opencv labeled distance transform (no per-pixel python loop).
+    """
+    rgba: np.ndarray = np.array(img if img.mode == 'RGBA' else img.convert('RGBA'))
+    transparent: np.ndarray = (rgba[..., 3] == 0).astype(np.uint8)
+    if not transparent.any() or transparent.all():
+        return img
+    # every zero (non transparent) pixel gets its own label, transparent pixels get the label of the nearest one
+    labels: np.ndarray
+    _, labels = cv2.distanceTransformWithLabels(transparent, cv2.DIST_L2, cv2.DIST_MASK_5,
+                                                labelType=cv2.DIST_LABEL_PIXEL)
+    packed: np.ndarray = rgba.view(np.uint32).reshape(-1)
+    seeds: np.ndarray = np.flatnonzero(transparent.reshape(-1) == 0)
+    label_colors: np.ndarray = np.empty(len(seeds) + 1, dtype=np.uint32)
+    label_colors[labels.reshape(-1)[seeds]] = packed[seeds]
+    filled: np.ndarray = label_colors[labels].view(np.uint8).reshape(rgba.shape)
+    filled[..., 3] = rgba[..., 3]
+    return PIL.Image.fromarray(filled, 'RGBA')
+
+
 def resize(img: Image, border_width: int, min_size: tuple[int, int],
-           bg_color: tuple[int, int, int, int], align: str, power_of_2: bool, square: bool) -> Image:
+           bg_color: tuple[int, int, int, int], align: str, power_of_2: bool, square: bool,
+           alpha_threshold: int = 0, edge_bleed: bool = False) -> Image:
+    return resize_with_trim_info(img, border_width, min_size, bg_color, align, power_of_2, square,
+                                 alpha_threshold, edge_bleed)[0]
 
+
+def resize_with_trim_info(img: Image, border_width: int, min_size: tuple[int, int],
+                          bg_color: tuple[int, int, int, int], align: str, power_of_2: bool, square: bool,
+                          alpha_threshold: int = 0, edge_bleed: bool = False) -> tuple[Image, dict]:
+    """
+    same as resize() but also returns where the source pixels went, so the crop can be undone later.
+    source pixel (x, y) is at (x - trim_bbox[0] + offset[0], y - trim_bbox[1] + offset[1]) in the output.
+    """
     temp_img: Image
     new_size: tuple[int, int]
+    source_size: tuple[int, int] = img.size
 
     # remove transparent area first
-    img = img.crop(img.getbbox())
+    bbox: tuple[int, int, int, int] | None = find_opacity_bbox(img, alpha_threshold)
+    if bbox is None:
+        bbox = (0, 0, img.width, img.height)
+    img = img.crop(bbox)
 
     # add border
     if border_width > 0:
@@ -62,8 +121,16 @@ def resize(img: Image, border_width: int, min_size: tuple[int, int],
     if power_of_2:
         new_size = find_fit_size_power_of_2(new_size, force_square=square)
     temp_img = PIL.Image.new('RGBA', new_size, bg_color)
-    temp_img.paste(img, get_clip_position(new_size, img.size, align))
-    return temp_img
+    clip_position: tuple[int, int] = get_clip_position(new_size, img.size, align)
+    temp_img.paste(img, clip_position)
+    if edge_bleed:
+        temp_img = bleed_edge_color(temp_img)
+    return temp_img, {
+        'source_size': list(source_size),
+        'trim_bbox': list(bbox),
+        'offset': [clip_position[0] + border_width, clip_position[1] + border_width],
+        'output_size': list(new_size),
+    }
 
 
 def find_files(files: list[str], extensions: None | list[str] = None) -> list[Path]:
@@ -78,10 +145,87 @@ def find_files(files: list[str], extensions: None | list[str] = None) -> list[Pa
             if extensions is None or p.suffix in extensions:
                 ret.append(p)
         if p.is_dir():
-            ret.extend(find_files([str(x) for x in p.iterdir()]))
+            ret.extend(find_files([str(x) for x in p.iterdir()], extensions))
     return ret
 
 
+def read_image_size(file: Path) -> tuple[int, int]:
+    """
+    read image size from header only (pixel data is not decoded)
+    """
+    with PIL.Image.open(file) as img:
+        return img.size
+
+
+def create_mip_chain(img: Image, mip_min_size: int = 1) -> List[Image]:
+    """
+    create mip levels from a power of 2 image. each level is made from the previous one with 2x2 box filter.
+    levels are created until both sides are mip_min_size or less (1x1 by default).
+    color is averaged premultiplied by alpha so transparent background does not bleed into edges.
+    """
+    assert all(x & (x - 1) == 0 for x in img.size), f'image size must be power of 2: {img.size}'
+    premultiplied: bool = img.mode == 'RGBA'
+    level: Image = img.convert('RGBa') if premultiplied else img
+    levels: List[Image] = [img]
+    while max(level.size) > max(1, mip_min_size):
+        level = level.reduce((2 if level.width > 1 else 1, 2 if level.height > 1 else 1))
+        levels.append(level.convert('RGBA') if premultiplied else level)
+    return levels
+
+
+def save_mip_chain(levels: List[Image], output_image_path: Path, mip_chain: str) -> List[dict]:
+    """
+    save mip levels 1~ as separate files ({stem}_mip{level}) or as one horizontal strip ({stem}_mips)
+    with offsets json. level 0 is the output image itself.
+    """
+    infos: List[dict] = []
+    if mip_chain == 'files':
+        for i, level in enumerate(levels):
+            level_path: Path = output_image_path
+            if i > 0:
+                level_path = output_image_path.with_name(f'{output_image_path.stem}_mip{i}{output_image_path.suffix}')
+                level.save(level_path)
+            infos.append({'level': i, 'file': level_path.as_posix(), 'size': list(level.size)})
+        return infos
+
+    strip_path: Path = output_image_path.with_name(f'{output_image_path.stem}_mips{output_image_path.suffix}')
+    strip: Image = PIL.Image.new(levels[0].mode, (sum(x.width for x in levels), levels[0].height))
+    x: int = 0
+    for i, level in enumerate(levels):
+        strip.paste(level, (x, 0))
+        infos.append({'level': i, 'offset': [x, 0], 'size': list(level.size)})
+        x += level.width
+    strip.save(strip_path)
+    with open(strip_path.with_suffix('.json'), 'w', encoding='utf-8') as fp:
+        json.dump({'file': strip_path.name, 'levels': infos}, fp, indent=2)
+    return infos
+
+
+def process_file(file: Path, output_image_path: Path, border_width: int, min_size: tuple[int, int],
+                 bg_color: tuple[int, int, int, int], align: str, power_of_2: bool, square: bool,
+                 alpha_threshold: int, mip_chain: str = 'none', mip_min_size: int = 1,
+                 edge_bleed: bool = False) -> dict:
+    """
+    open, resize and save one image (and its mip chain). runs in worker processes.
+    returns trim info of the image.
+    """
+    with PIL.Image.open(file) as src_img:
+        assert src_img.size[0] <= TARGET_SIZES[0] and src_img.size[1] <= TARGET_SIZES[0]
+        img: Image
+        trim_info: dict
+        img, trim_info = resize_with_trim_info(src_img, border_width, min_size, bg_color, align, power_of_2,
+                                               square, alpha_threshold, edge_bleed)
+
+    if output_image_path.suffix == '.jpg' or output_image_path.suffix == '.gif':
+        print('Save image format should not be jpg or gif.'
+              'This program makes image with transparent background.', file=sys.stderr)
+        img = img.convert('RGB')
+    img.save(output_image_path)
+    if mip_chain != 'none':
+        trim_info['mips'] = save_mip_chain(create_mip_chain(img, mip_min_size), output_image_path, mip_chain)
+    return dict(source=file.as_posix(), output=output_image_path.as_posix(), **trim_info)
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         # 真ん中よせ時に 半ドットずれないように注意'
@@ -104,6 +248,18 @@ def main() -> None:
                         'the min_size argument  is automatically determined from the size of the input image.')
     parser.add_argument('-bg', '--bg_color', type=int, nargs=4, default=[0, 0, 0, 0],
                         help='background color like 255 255 255 255')
+    parser.add_argument('-at', '--alpha_threshold', type=int, default=0,
+                        help='pixels whose alpha is not larger than this are trimmed as transparent (0~254)')
+    parser.add_argument('--trim_report', type=str, default='',
+                        help='write trim bbox and paste offset of each image to this json file')
+    parser.add_argument('--edge_bleed', action='store_true',
+                        help='fill color of transparent border and padding with the nearest opaque color.')
+    parser.add_argument('--mip_chain', type=str, default='none', choices=['none', 'files', 'strip'],
+                        help='also write mip levels as separate files or one strip image with offsets json.' +
+                        ' implies --power_of_2.')
+    parser.add_argument('--mip_min_size', type=int, default=1, help='smallest mip level size')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='number of processes to convert images in parallel.')
     args = parser.parse_args()
     if len(args.output_dir) > 0:
         assert Path(args.output_dir).exists()
@@ -113,19 +269,27 @@ def main() -> None:
     assert len(files) > 0, 'No image file found.'
 
     if args.auto_min_size:
+        # sizes are read from headers, so each image is decoded only once in the main pass
         min_size: List[int] = [0, 0]
         for file in files:
-            img: Image = PIL.Image.open(file)
-            if img.size[0] > min_size[0]:
-                min_size[0] = img.size[0]
-            if img.size[1] > min_size[1]:
-                min_size[1] = img.size[1]
+            size: tuple[int, int] = read_image_size(file)
+            if size[0] > min_size[0]:
+                min_size[0] = size[0]
+            if size[1] > min_size[1]:
+                min_size[1] = size[1]
         if args.min_size[0] < min_size[0]:
             args.min_size[0] = min_size[0]
         if args.min_size[1] < min_size[1]:
             args.min_size[1] = min_size[1]
 
+    assert args.jobs > 0, f'jobs must be 1~: {args.jobs}'
+    assert 0 <= args.alpha_threshold <= 254, f'alpha_threshold must be 0~254: {args.alpha_threshold}'
+    assert args.mip_min_size > 0, f'mip_min_size must be 1~: {args.mip_min_size}'
+    if args.mip_chain != 'none':
+        # mip levels are made from the padded power of 2 canvas
+        args.power_of_2 = True
     output_image_path: Path
+    output_image_paths: List[Path] = []
     for file in files:
         if args.overwrite:
             output_image_path = file
@@ -133,17 +297,24 @@ def main() -> None:
             output_image_path = Path(args.output_dir) / file.name
         else:
             output_image_path = Path(args.output_dir).parent / Path(file.stem + '__out.png')
+        output_image_paths.append(output_image_path)
 
-        img: Image = PIL.Image.open(file)
-        assert img.size[0] <= TARGET_SIZES[0] and img.size[1] <= TARGET_SIZES[0]
-        img = resize(img, args.border_width, args.min_size, tuple(args.bg_color),
-                     args.align, args.power_of_2, args.square)
+    params: tuple = (args.border_width, tuple(args.min_size), tuple(args.bg_color),
+                     args.align, args.power_of_2, args.square, args.alpha_threshold,
+                     args.mip_chain, args.mip_min_size, args.edge_bleed)
+    trim_infos: List[dict]
+    if len(files) == 1 or args.jobs == 1:
+        trim_infos = [process_file(file, output_image_path, *params)
+                      for file, output_image_path in zip(files, output_image_paths)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(files))) as executor:
+            futures = [executor.submit(process_file, file, output_image_path, *params)
+                       for file, output_image_path in zip(files, output_image_paths)]
+            trim_infos = [future.result() for future in futures]
 
-        if output_image_path.suffix == '.jpg' or output_image_path.suffix == '.gif':
-            print('Save image format should not be jpg or gif.'
-                  'This program makes image with transparent background.', file=sys.stderr)
-            img = img.convert('RGB')
-        img.save(output_image_path)
+    if len(args.trim_report) > 0:
+        with open(args.trim_report, 'w', encoding='utf-8') as fp:
+            json.dump({'alpha_threshold': args.alpha_threshold, 'items': trim_infos}, fp, indent=2)
 
 
 if __name__ == '__main__':
@@ -153,4 +324,6 @@ if __name__ == '__main__':
 """
 # sample command
 python prepareImageForSdInput.py images/icon.png -o out -bw 100 -al TL -p2 -min 512 512 -bg 255 0 0 255
+python prepareImageForSdInput.py images/*.png -o out -bw 16 -at 8 --trim_report out/trim.json
+python prepareImageForSdInput.py images/icon.png -o out -bw 8 --mip_chain strip --mip_min_size 4 --edge_bleed
 """
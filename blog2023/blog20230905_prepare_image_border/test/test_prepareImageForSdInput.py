@@ -0,0 +1,58 @@
+import sys
+from pathlib import Path
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+from prepareImageForSdInput import bleed_edge_color, find_opacity_bbox, get_clip_position, resize_with_trim_info
+
+
+def test_get_clip_position():
+    assert get_clip_position((64, 64), (20, 10), 'CENTER') == (22, 27)
+    assert get_clip_position((64, 64), (20, 10), 'TL') == (0, 0)
+    assert get_clip_position((64, 64), (20, 10), 'BR') == (44, 54)
+    assert get_clip_position((21, 11), (20, 10), 'CENTER') == (0, 0)
+
+
+def test_resize_with_trim_info():
+    img = Image.new('RGBA', (100, 80), (0, 0, 0, 0))
+    img.paste((255, 255, 255, 4), (0, 0, 100, 80))
+    img.paste((255, 0, 0, 255), (10, 20, 40, 30))
+    for align in ['CENTER', 'TL', 'BR']:
+        out, info = resize_with_trim_info(img, 2, (0, 0), (0, 0, 0, 0), align, True, False, 8, True)
+        assert info['trim_bbox'] == [10, 20, 40, 30]
+        assert out.size == (64, 16) and info['output_size'] == [64, 16]
+        # 元の画像の (x, y) は出力の (x - trim_bbox[0] + offset[0], y - trim_bbox[1] + offset[1])
+        x: int = 10 - info['trim_bbox'][0] + info['offset'][0]
+        y: int = 20 - info['trim_bbox'][1] + info['offset'][1]
+        assert out.getpixel((x, y)) == (255, 0, 0, 255)
+        assert out.getpixel((x - 1, y - 1)) == (255, 0, 0, 0)
+
+
+def test_find_opacity_bbox():
+    img = Image.new('RGBA', (100, 80), (0, 0, 0, 0))
+    img.paste((255, 255, 255, 4), (5, 6, 90, 70))
+    img.paste((255, 0, 0, 255), (10, 20, 40, 30))
+    assert find_opacity_bbox(img) == img.getbbox() == (5, 6, 90, 70)
+    assert find_opacity_bbox(img, 4) == (10, 20, 40, 30)
+    assert find_opacity_bbox(img, 255) is None
+    assert find_opacity_bbox(img.convert('RGB'), 4) == img.convert('RGB').getbbox()
+
+
+def test_bleed_edge_color():
+    img = Image.new('RGBA', (16, 8), (0, 0, 0, 0))
+    img.paste((255, 0, 0, 255), (0, 0, 4, 8))
+    img.paste((0, 0, 255, 128), (12, 0, 16, 8))
+    out = bleed_edge_color(img)
+    # 色だけ一番近い不透明なピクセルの色になり、アルファはそのまま
+    assert out.getchannel('A').tobytes() == img.getchannel('A').tobytes()
+    assert out.getpixel((5, 3)) == (255, 0, 0, 0)
+    assert out.getpixel((10, 3)) == (0, 0, 255, 0)
+    assert out.getpixel((13, 3)) == (0, 0, 255, 128)
+
+
+if __name__ == '__main__':
+    test_get_clip_position()
+    test_resize_with_trim_info()
+    test_find_opacity_bbox()
+    test_bleed_edge_color()
@@ -0,0 +1,245 @@
+import argparse
+import hashlib
+import io
+import json
+import math
+import platform
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Tuple, Any, Callable
+import cv2
+import numpy as np
+from PIL import Image
+from split_image_island import detect_contours, spread_contours, iter_contour_indices, get_contour_bbox, \
+    extract_parts
+
+PHASES: List[str] = ['detection', 'spread', 'extraction', 'encoding']
+
+
+def create_sheet(width: int, height: int, count: int, island_size: int, nesting: int, spacing: int,
+                 seed: int) -> np.ndarray:
+    """
+    ベンチマーク用の合成スプライトシートを作る
+    パーツは格子状に並べ、同じ引数なら同じ画像になる
+    :param width: シートの横幅
+    :param height: シートの高さ
+    :param count: パーツの数
+    :param island_size: パーツの直径
+    :param nesting: パーツの入れ子の深さ 1以上だと穴の中に小さいパーツを入れる
+    :param spacing: パーツどうしの間隔
+    :param seed: パーツの色の乱数シード
+    """
+    cell: int = island_size + spacing
+    cols: int = max(1, (width - spacing) // cell)
+    rows: int = math.ceil(count / cols)
+    assert cols * cell + spacing <= width or cols == 1, f'sheet width is too small: {width}'
+    assert rows * cell + spacing <= height, f'sheet is too small for {count} islands: {width}x{height}'
+    rng: np.random.Generator = np.random.default_rng(seed)
+    sheet: np.ndarray = np.zeros((height, width, 4), dtype=np.uint8)
+    radius: int = island_size // 2
+    for i in range(count):
+        cx: int = spacing + (i % cols) * cell + radius
+        cy: int = spacing + (i // cols) * cell + radius
+        r: int = radius
+        for depth in range(nesting + 1):
+            # 外側から 塗り -> 穴 -> 塗り... と交互に描いて入れ子を作る
+            if r < 2:
+                break
+            color: Tuple[int, ...] = tuple(int(x) for x in rng.integers(0, 256, 3)) + (255,)
+            cv2.circle(sheet, (cx, cy), r, color, -1)
+            hole: int = r * 2 // 3
+            if depth == nesting or hole < 2:
+                break
+            cv2.circle(sheet, (cx, cy), hole, (0, 0, 0, 0), -1)
+            r = hole * 2 // 3
+    return sheet
+
+
+def _measure(func: Callable[[], Any], with_memory: bool) -> Tuple[Any, float, int]:
+    """
+    処理時間(秒)とピークメモリ(byte)を計る
+    tracemalloc は処理を遅くするので時間とメモリは別々の実行で計る
+    """
+    start: float = time.perf_counter()
+    result: Any = func()
+    elapsed: float = time.perf_counter() - start
+    peak: int = 0
+    if with_memory:
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def bench_sheet(sheet: np.ndarray, alpha_spread: int, cutout_alpha: int,
+                with_memory: bool) -> Dict[str, Any]:
+    """
+    split_image_island.split と同じ手順を工程ごとに計測する
+    """
+    height, width = sheet.shape[:2]
+    org_alpha_channel: np.ndarray = sheet[..., 3]
+    times: Dict[str, float] = {}
+    peaks: Dict[str, int] = {}
+
+    (alpha_channel, contours, hierarchy), times['detection'], peaks['detection'] = \
+        _measure(lambda: detect_contours(org_alpha_channel), with_memory)
+    contour_count: int = len(contours)
+    if alpha_spread > 0:
+        (alpha_channel, contours, hierarchy), times['spread'], peaks['spread'] = \
+            _measure(lambda: spread_contours(alpha_channel.copy(), contours, alpha_spread), with_memory)
+    else:
+        times['spread'], peaks['spread'] = 0.0, 0
+
+    def extract_all() -> List[np.ndarray]:
+        ret: List[np.ndarray] = []
+        for index in iter_contour_indices(hierarchy):
+            bbox: Tuple[int, int, int, int] = get_contour_bbox(contours[index], width, height)
+            ret.append(extract_parts(sheet, org_alpha_channel, contours[index], bbox, cutout_alpha))
+        return ret
+
+    def encode_all() -> int:
+        size: int = 0
+        for parts_img in parts_images:
+            fp: io.BytesIO = io.BytesIO()
+            Image.fromarray(parts_img).save(fp, format='PNG')
+            size += fp.tell()
+        return size
+
+    parts_images: List[np.ndarray]
+    parts_images, times['extraction'], peaks['extraction'] = _measure(extract_all, with_memory)
+    encoded_size: int
+    encoded_size, times['encoding'], peaks['encoding'] = _measure(encode_all, with_memory)
+    return {
+        'contours': contour_count,
+        'merged_contours': len(contours),
+        'parts': len(parts_images),
+        'parts_pixels': int(sum(x.shape[0] * x.shape[1] for x in parts_images)),
+        'encoded_bytes': encoded_size,
+        'times': times,
+        'peak_memory': peaks if with_memory else None,
+    }
+
+
+def _get_cases(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """
+    パーツ数を変える系列と解像度を変える系列の計測条件を作る
+    """
+    cases: List[Dict[str, Any]] = []
+    for count in args.counts:
+        cases.append({'series': 'count', 'width': args.sheet_size, 'height': args.sheet_size, 'count': count,
+                      'island_size': args.island_size})
+    for resolution in args.resolutions:
+        cases.append({'series': 'resolution', 'width': resolution, 'height': resolution, 'count': args.count,
+                      'island_size': resolution // args.resolution_island_ratio})
+    for case in cases:
+        case['nesting'] = args.nesting
+        case['spacing'] = args.spacing
+        case['alpha_spread'] = args.alpha_spread
+        case['seed'] = args.seed
+    return cases
+
+
+def _print_table(results: List[Dict[str, Any]], baseline: Dict[str, Dict[str, Any]]) -> None:
+    header: str = f'{"series":<10} {"size":>11} {"count":>6} {"parts":>6}' + \
+                  ''.join(f' {x + "[ms]":>15}' for x in PHASES) + f' {"peak[MB]":>9}'
+    if len(baseline) > 0:
+        header += f' {"vs base":>8}'
+    print(header)
+    for result in results:
+        line: str = f'{result["series"]:<10} {str(result["width"]) + "x" + str(result["height"]):>11}' \
+                    f' {result["count"]:>6} {result["parts"]:>6}'
+        line += ''.join(f' {result["times"][x] * 1000:>15.1f}' for x in PHASES)
+        peak: str = '-'
+        if result['peak_memory'] is not None:
+            peak = f'{max(result["peak_memory"].values()) / 1024 / 1024:.1f}'
+        line += f' {peak:>9}'
+        base: Dict[str, Any] | None = baseline.get(_get_result_key(result))
+        if base is not None:
+            if base['sheet_hash'] != result['sheet_hash']:
+                line += f' {"(sheet)":>8}'  # 合成シートが変わっているので比較しない
+            else:
+                total: float = sum(result['times'].values())
+                base_total: float = sum(base['times'].values())
+                line += f' {total / base_total if base_total > 0 else 0:>7.2f}x'
+        print(line)
+
+
+def _get_result_key(result: Dict[str, Any]) -> str:
+    return '/'.join(str(result[x]) for x in
+                    ['series', 'width', 'height', 'count', 'island_size', 'nesting', 'spacing', 'alpha_spread'])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='benchmark split_image_island phases on synthetic sprite sheets.')
+    parser.add_argument('-o', '--output', type=str, default='',
+                        help='output json file path. default is bench_split_image_island_{datetime}.json')
+    parser.add_argument('--compare', type=str, default='', help='previous result json to compare with.')
+    parser.add_argument('--counts', type=int, nargs='*', default=[4, 16, 64, 256],
+                        help='island counts of count series.')
+    parser.add_argument('--sheet_size', type=int, default=1024, help='sheet size of count series.')
+    parser.add_argument('--island_size', type=int, default=32, help='island diameter of count series.')
+    parser.add_argument('--resolutions', type=int, nargs='*', default=[256, 512, 1024, 2048],
+                        help='sheet sizes of resolution series.')
+    parser.add_argument('--count', type=int, default=16, help='island count of resolution series.')
+    parser.add_argument('--resolution_island_ratio', type=int, default=16,
+                        help='island diameter of resolution series is sheet size / this value.')
+    parser.add_argument('--nesting', type=int, default=1, help='nesting depth of islands(hole and inner island).')
+    parser.add_argument('--spacing', type=int, default=16, help='spacing px between islands.')
+    parser.add_argument('-as', '--alpha_spread', type=int, default=4, help='alpha_spread passed to split.')
+    parser.add_argument('-ca', '--cutout_alpha', type=int, default=0, help='cutout_alpha passed to split.')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of island colors.')
+    parser.add_argument('--save_sheets', type=str, default='', help='save synthetic sheets to this directory.')
+    parser.add_argument('--no_memory', action="store_true", help='skip peak memory measurement.')
+    args = parser.parse_args()
+
+    baseline: Dict[str, Dict[str, Any]] = {}
+    if len(args.compare) > 0:
+        with open(args.compare, 'r', encoding='utf-8') as fp:
+            baseline = {_get_result_key(x): x for x in json.load(fp)['results']}
+    if len(args.save_sheets) > 0:
+        Path(args.save_sheets).mkdir(parents=True, exist_ok=True)
+
+    results: List[Dict[str, Any]] = []
+    for case in _get_cases(args):
+        sheet: np.ndarray = create_sheet(case['width'], case['height'], case['count'], case['island_size'],
+                                         case['nesting'], case['spacing'], case['seed'])
+        result: Dict[str, Any] = dict(case)
+        result['sheet_hash'] = hashlib.sha256(sheet.tobytes()).hexdigest()
+        result.update(bench_sheet(sheet, case['alpha_spread'], args.cutout_alpha, not args.no_memory))
+        results.append(result)
+        if len(args.save_sheets) > 0:
+            Image.fromarray(sheet).save(Path(args.save_sheets) / f'sheet_{_get_result_key(case).replace("/", "_")}.png')
+        print(f'{case["series"]} {case["width"]}x{case["height"]} count {case["count"]}:'
+              f' {sum(result["times"].values()) * 1000:.1f} ms')
+
+    _print_table(results, baseline)
+    output_path: Path = Path(f'bench_split_image_island_{datetime.now().strftime("%Y%m%d%H%M%S")}.json')
+    if len(args.output) > 0:
+        output_path = Path(args.output)
+    with open(output_path, 'w', encoding='utf-8') as fp:
+        json.dump({
+            'created': datetime.now().isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'numpy': np.__version__,
+                'opencv': cv2.__version__,
+            },
+            'results': results,
+        }, fp, indent=2)
+    print(f'output {output_path.as_posix()}')
+
+
+if __name__ == '__main__':
+    main()
+
+"""
+sample command
+python bench_split_image_island.py -o bench_before.json
+python bench_split_image_island.py -o bench_after.json --compare bench_before.json
+python bench_split_image_island.py --counts 16 64 --resolutions --nesting 2 --spacing 2 -as 8 --no_memory
+"""
@@ -0,0 +1,161 @@
+import argparse
+import time
+from pathlib import Path
+from typing import Tuple
+import cv2
+import numpy as np
+from PIL import Image
+
+OUTPUT_EXTENSIONS: Tuple[str, ...] = ('.png', '.npy')
+
+
+def load_mask(image_path: Path, threshold: int) -> np.ndarray:
+    """
+    画像からマスクを作る
+    透明度を持つ画像は透明度を、持たない画像はグレースケール値を使う
+    :param image_path: 入力画像ファイルパス
+    :param threshold: この値より大きいピクセルを内側とする(0~254)
+    :return: 内側が255、外側が0のuint8配列
+    """
+    img: Image = Image.open(image_path)
+    if 'A' in img.getbands():
+        channel: Image = img.getchannel('A')
+    else:
+        channel = img.convert('L')
+    mask: np.ndarray = np.zeros((channel.height, channel.width), dtype=np.uint8)
+    mask[np.asarray(channel) > threshold] = 255
+    return mask
+
+
+def create_sdf(mask: np.ndarray, precise: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    マスクから符号付き距離場を作る
+    _test_findContours.py の pointPolygonTest と同じく内側が正、外側が負
+    境界はピクセルとピクセルの間にあるとみなして内外それぞれ0.5ずらす
+    :param mask: 内側が255、外側が0のuint8配列
+    :param precise: 正確なユークリッド距離で計算する 5x5マスクの近似より数倍遅い
+    :return: 符号付き距離(float32) / 内側の距離(float32 最大内接円の計算用)
+    """
+    assert mask.any() and not mask.all(), 'mask must have both inside and outside pixels'
+    mask_size: int = cv2.DIST_MASK_PRECISE if precise else cv2.DIST_MASK_5
+    # distanceTransformは0のピクセルまでの距離なので、内側と外側それぞれ計算する
+    inside: np.ndarray = cv2.distanceTransform(mask, cv2.DIST_L2, mask_size)
+    outside: np.ndarray = cv2.distanceTransform(cv2.bitwise_not(mask), cv2.DIST_L2, mask_size)
+    # 内側か外側のどちらかは必ず0なので引き算でまとめてから境界の0.5をずらす
+    sdf: np.ndarray = cv2.subtract(inside, outside)
+    sdf -= np.float32(0.5)
+    cv2.add(sdf, (1.0, 0.0, 0.0, 0.0), dst=sdf, mask=cv2.bitwise_not(mask))
+    return sdf, inside
+
+
+def find_max_inscribed_circle(inside: np.ndarray) -> Tuple[Tuple[int, int], float]:
+    """
+    最大内接円を求める
+    :param inside: 内側の距離
+    :return: 中心座標 / 半径
+    """
+    max_val: float
+    max_loc: Tuple[int, int]
+    _, max_val, _, max_loc = cv2.minMaxLoc(inside)
+    return max_loc, max_val
+
+
+def normalize_sdf(sdf: np.ndarray, spread: float) -> np.ndarray:
+    """
+    符号付き距離を0~1に正規化する 境界が0.5になる
+    :param sdf: 符号付き距離
+    :param spread: この距離で0または1になる 0以下の場合は距離の絶対値の最大を使う
+    """
+    if spread <= 0:
+        spread = float(max(abs(sdf.min()), abs(sdf.max())))
+    normalized: np.ndarray = sdf * np.float32(0.5 / spread)
+    normalized += np.float32(0.5)
+    return np.clip(normalized, 0.0, 1.0, out=normalized)
+
+
+def save_sdf(sdf: np.ndarray, output_path: Path, spread: float, bit_depth: int) -> None:
+    """
+    符号付き距離場を保存する
+    .npy は距離そのもの(float32)、.png は正規化して8bitまたは16bitで保存する
+    """
+    if output_path.suffix == '.npy':
+        np.save(output_path, sdf)
+        return
+    normalized: np.ndarray = normalize_sdf(sdf, spread)
+    if bit_depth == 16:
+        Image.fromarray((normalized * 65535.0 + 0.5).astype(np.uint16)).save(output_path)
+    else:
+        Image.fromarray((normalized * 255.0 + 0.5).astype(np.uint8)).save(output_path)
+
+
+def save_report_image(mask: np.ndarray, center: Tuple[int, int], radius: float, output_path: Path) -> None:
+    """
+    マスクと最大内接円を描いたレポート画像を保存する
+    """
+    report_image: np.ndarray = np.full((mask.shape[0], mask.shape[1], 3), 255, dtype=np.uint8)
+    report_image[mask > 0] = (255, 0, 255)
+    cv2.circle(report_image, center, int(radius), (0, 128, 128), 2, cv2.LINE_AA)
+    Image.fromarray(report_image).save(output_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='create signed distance field image from alpha or mask image.')
+    parser.add_argument('src_image', type=str, help='source image file path')
+    parser.add_argument('-o', '--output', type=str, default='',
+                        help='output file path(.png or .npy). default is {src_image}_sdf.png')
+    parser.add_argument('-th', '--threshold', type=int, default=127,
+                        help='pixels whose alpha(or gray) value is larger than this are inside(0~254)')
+    parser.add_argument('-sp', '--spread', type=float, default=0.0,
+                        help='distance in px mapped to 0 or 1 in png output. 0 means max distance of the image.')
+    parser.add_argument('-bd', '--bit_depth', type=int, default=8, choices=[8, 16], help='bit depth of png output')
+    parser.add_argument('--precise', action="store_true",
+                        help='use exact euclidean distance instead of 5x5 mask approximation(slower).')
+    parser.add_argument('--save_report_image', action="store_true",
+                        help='save report image including max inscribed circle.')
+    args = parser.parse_args()
+
+    src_image_path: Path = Path(args.src_image)
+    assert src_image_path.exists(), f'file not found: {args.src_image}'
+    output_path: Path = src_image_path.parent / f'{src_image_path.stem}_sdf.png'
+    if len(args.output) > 0:
+        output_path = Path(args.output)
+    assert output_path.suffix in OUTPUT_EXTENSIONS, f'output must be {OUTPUT_EXTENSIONS}: {args.output}'
+    assert 0 <= args.threshold <= 254, f'threshold must be 0~254: {args.threshold}'
+
+    mask: np.ndarray = load_mask(src_image_path, args.threshold)
+    start: float = time.perf_counter()
+    sdf, inside = create_sdf(mask, args.precise)
+    center, radius = find_max_inscribed_circle(inside)
+    print(f'sdf {mask.shape[1]}x{mask.shape[0]} : {(time.perf_counter() - start) * 1000:.1f} ms')
+    print(f'distance range {sdf.min():.2f} ~ {sdf.max():.2f}')
+    print(f'max inscribed circle center {center[0]},{center[1]} radius {radius:.2f}')
+    save_sdf(sdf, output_path, args.spread, args.bit_depth)
+    print(f'output {output_path.as_posix()}')
+    if args.save_report_image:
+        save_report_image(mask, center, radius, output_path.parent / f'{output_path.stem}@report.png')
+
+
+if __name__ == '__main__':
+    main()
+
+"""
+usage: create_sdf_image.py [-h] [-o OUTPUT] [-th THRESHOLD] [-sp SPREAD] [-bd {8,16}] [--precise] [--save_report_image] src_image
+
+create signed distance field image from alpha or mask image.
+
+positional arguments:
+  src_image             source image file path
+
+options:
+  -h, --help            show this help message and exit
+  -o OUTPUT, --output OUTPUT
+                        output file path(.png or .npy). default is {src_image}_sdf.png
+  -th THRESHOLD, --threshold THRESHOLD
+                        pixels whose alpha(or gray) value is larger than this are inside(0~254)
+  -sp SPREAD, --spread SPREAD
+                        distance in px mapped to 0 or 1 in png output. 0 means max distance of the image.
+  -bd {8,16}, --bit_depth {8,16}
+                        bit depth of png output
+  --precise             use exact euclidean distance instead of 5x5 mask approximation(slower).
+  --save_report_image   save report image including max inscribed circle.
+"""
@@ -0,0 +1,190 @@
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import List, Dict, Tuple, Any
+
+
+def _point_in_polygon(x: float, y: float, polygon: List[List[int]]) -> bool:
+    """
+    点が多角形の内側か(ray casting)
+    """
+    inside: bool = False
+    n: int = len(polygon)
+    j: int = n - 1
+    for i in range(n):
+        xi, yi = polygon[i]
+        xj, yj = polygon[j]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def _distance_to_bbox(x: float, y: float, bbox: List[int]) -> float:
+    dx: float = max(bbox[0] - x, 0.0, x - (bbox[0] + bbox[2]))
+    dy: float = max(bbox[1] - y, 0.0, y - (bbox[1] + bbox[3]))
+    return (dx * dx + dy * dy) ** 0.5
+
+
+class IslandIndex:
+    """
+    split_image_island.py が出力する {prefix}@islands.json の島テーブルを格子で索引して検索する
+    """
+    islands: List[Dict[str, Any]]
+    cell_size: int
+    _grid: Dict[Tuple[int, int], List[int]]
+    _cell_range: Tuple[int, int, int, int]
+
+    def __init__(self, islands: List[Dict[str, Any]], cell_size: int = 0):
+        """
+        :param islands: 島テーブル
+        :param cell_size: 格子の大きさ 0以下の場合は島の大きさの中央値から決める
+        """
+        self.islands = islands
+        if cell_size <= 0:
+            sizes: List[int] = sorted(max(x['bbox'][2], x['bbox'][3]) for x in islands)
+            cell_size = max(8, sizes[len(sizes) // 2]) if len(sizes) > 0 else 64
+        self.cell_size = cell_size
+        self._grid = {}
+        min_cx: int = 0
+        min_cy: int = 0
+        max_cx: int = 0
+        max_cy: int = 0
+        for i, island in enumerate(islands):
+            x0, y0, x1, y1 = self._get_cell_range(island['bbox'])
+            for cy in range(y0, y1 + 1):
+                for cx in range(x0, x1 + 1):
+                    self._grid.setdefault((cx, cy), []).append(i)
+            min_cx, min_cy = min(min_cx, x0), min(min_cy, y0)
+            max_cx, max_cy = max(max_cx, x1), max(max_cy, y1)
+        self._cell_range = (min_cx, min_cy, max_cx, max_cy)
+
+    @classmethod
+    def load(cls, islands_json_path: Path, cell_size: int = 0) -> 'IslandIndex':
+        with open(islands_json_path, 'r', encoding='utf-8') as fp:
+            o: Dict[str, Any] = json.load(fp)
+        return cls(o['islands'], cell_size)
+
+    def _get_cell_range(self, bbox: List[int]) -> Tuple[int, int, int, int]:
+        return (bbox[0] // self.cell_size, bbox[1] // self.cell_size,
+                (bbox[0] + bbox[2]) // self.cell_size, (bbox[1] + bbox[3]) // self.cell_size)
+
+    def _get_cell(self, x: float, y: float) -> Tuple[int, int]:
+        """
+        座標を含む格子 小数や負の座標も切り捨てではなく床関数で格子に合わせる
+        """
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def find_at(self, x: float, y: float) -> List[Dict[str, Any]]:
+        """
+        座標を含む島を内側(面積の小さい)順に返す
+        """
+        ret: List[Dict[str, Any]] = []
+        for i in self._grid.get(self._get_cell(x, y), []):
+            island: Dict[str, Any] = self.islands[i]
+            bx, by, bw, bh = island['bbox']
+            if bx <= x <= bx + bw and by <= y <= by + bh and _point_in_polygon(x, y, island['contour']):
+                ret.append(island)
+        return sorted(ret, key=lambda o: o['area'])
+
+    def find_in_region(self, x0: float, y0: float, x1: float, y1: float) -> List[Dict[str, Any]]:
+        """
+        矩形領域とbboxが重なる島をid順に返す
+        """
+        found: set = set()
+        # 島のある格子の範囲の外は調べない
+        cx0, cy0 = self._get_cell(x0, y0)
+        cx1, cy1 = self._get_cell(x1, y1)
+        cx0, cy0 = max(cx0, self._cell_range[0]), max(cy0, self._cell_range[1])
+        cx1, cy1 = min(cx1, self._cell_range[2]), min(cy1, self._cell_range[3])
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                for i in self._grid.get((cx, cy), []):
+                    bx, by, bw, bh = self.islands[i]['bbox']
+                    if bx <= x1 and x0 <= bx + bw and by <= y1 and y0 <= by + bh:
+                        found.add(i)
+        return [self.islands[i] for i in sorted(found)]
+
+    def find_nearest(self, x: float, y: float) -> Dict[str, Any] | None:
+        """
+        bboxまでの距離が一番近い島を返す 座標を含む島があればそれを優先する
+        """
+        at: List[Dict[str, Any]] = self.find_at(x, y)
+        if len(at) > 0:
+            return at[0]
+        if len(self.islands) == 0:
+            return None
+        min_cx, min_cy, max_cx, max_cy = self._cell_range
+        # 島のある格子の範囲の外の座標は、範囲内の一番近い格子から調べ始める
+        qx, qy = self._get_cell(x, y)
+        qx, qy = min(max(qx, min_cx), max_cx), min(max(qy, min_cy), max_cy)
+        max_ring: int = max(qx - min_cx, max_cx - qx, qy - min_cy, max_cy - qy)
+        best: Dict[str, Any] | None = None
+        best_distance: float = float('inf')
+        for ring in range(max_ring + 1):
+            # 中心の格子から外側へリング状に調べる 範囲の外の格子は飛ばす
+            for cy in range(max(qy - ring, min_cy), min(qy + ring, max_cy) + 1):
+                cxs: range | List[int] = range(max(qx - ring, min_cx), min(qx + ring, max_cx) + 1) \
+                    if cy in (qy - ring, qy + ring) else [cx for cx in (qx - ring, qx + ring) if min_cx <= cx <= max_cx]
+                for cx in cxs:
+                    for i in self._grid.get((cx, cy), []):
+                        distance: float = _distance_to_bbox(x, y, self.islands[i]['bbox'])
+                        if distance < best_distance:
+                            best, best_distance = self.islands[i], distance
+            # まだ調べていない島は調べた正方形の外の格子にしか無い その島までの距離の下限
+            bound: float = float('inf')
+            if qx - ring > min_cx:
+                bound = min(bound, max(0.0, x - (qx - ring) * self.cell_size))
+            if qx + ring < max_cx:
+                bound = min(bound, max(0.0, (qx + ring + 1) * self.cell_size - x))
+            if qy - ring > min_cy:
+                bound = min(bound, max(0.0, y - (qy - ring) * self.cell_size))
+            if qy + ring < max_cy:
+                bound = min(bound, max(0.0, (qy + ring + 1) * self.cell_size - y))
+            if best_distance <= bound:
+                break
+        return best
+
+
+def _summarize(island: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in island.items() if k != 'contour'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='query islands json exported by split_image_island.py.')
+    parser.add_argument('islands_json', type=str, help='{prefix}@islands.json file path')
+    query = parser.add_mutually_exclusive_group(required=True)
+    query.add_argument('--point', type=float, nargs=2, help='find parts containing x y')
+    query.add_argument('--region', type=float, nargs=4, help='find parts overlapping x0 y0 x1 y1')
+    query.add_argument('--nearest', type=float, nargs=2, help='find the nearest part from x y')
+    parser.add_argument('--cell_size', type=int, default=0, help='grid cell size. 0 means auto.')
+    args = parser.parse_args()
+
+    islands_json_path: Path = Path(args.islands_json)
+    assert islands_json_path.exists(), f'file not found: {args.islands_json}'
+    index: IslandIndex = IslandIndex.load(islands_json_path, args.cell_size)
+    start: float = time.perf_counter()
+    result: List[Dict[str, Any]]
+    if args.point is not None:
+        result = index.find_at(*args.point)
+    elif args.region is not None:
+        result = index.find_in_region(*args.region)
+    else:
+        nearest: Dict[str, Any] | None = index.find_nearest(*args.nearest)
+        result = [] if nearest is None else [nearest]
+    elapsed: float = time.perf_counter() - start
+    print(json.dumps([_summarize(x) for x in result], indent=2, ensure_ascii=False))
+    print(f'{len(result)} parts found in {elapsed * 1000000:.1f} us ({len(index.islands)} islands)')
+
+
+if __name__ == '__main__':
+    main()
+
+"""
+sample command
+python split_image_island.py images/sheet.png --create_subdir
+python island_index.py images/sheet/@islands.json --point 120 80
+python island_index.py images/sheet/@islands.json --region 0 0 256 256
+python island_index.py images/sheet/@islands.json --nearest 512 300
+"""
@@ -1,14 +1,223 @@
 import argparse
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, Future
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Any, Iterator, Set
 import cv2
 import numpy as np
 from PIL import Image
 
+SRC_IMAGE_EXTENSIONS: List[str] = ['.png', '.tga', '.tif', '.tiff', '.webp']
+# パーツ検出方法の識別子 検出処理を変えたらキャッシュが無効になるように値を変える
+DETECTION_MODE: str = 'gaussian5_otsu_contours_tree_simple'
+# 出力したパーツ画像のファイル名 {入力画像名}_000.png
+PARTS_FILE_NAME_PATTERN: re.Pattern = re.compile(r'(.+)_\d{3,}')
+
+
+def _save_parts_image(parts_img: np.ndarray, output_path: Path) -> None:
+    Image.fromarray(parts_img).save(output_path.as_posix())
+
+
+def _get_file_hash(file_path: Path) -> str:
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _get_cache_path(output_dir_path: Path, prefix: str) -> Path:
+    return output_dir_path / f'{prefix}@cache.json'
+
+
+def _get_islands_path(output_dir_path: Path, prefix: str) -> Path:
+    return output_dir_path / f'{prefix}@islands.json'
+
+
+def _load_cache(cache_path: Path) -> Dict[str, Any] | None:
+    if not cache_path.exists():
+        return None
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as fp:
+            return json.load(fp)
+    except (OSError, ValueError) as ex:
+        print(f'ignore broken cache: {cache_path.as_posix()} ({ex})')
+        return None
+
+
+def detect_contours(alpha_channel: np.ndarray) -> Tuple[np.ndarray, Tuple[np.ndarray, ...], np.ndarray]:
+    """
+    透明度からパーツの輪郭を検出する
+    :param alpha_channel: 入力画像の透明度
+    :return: 2値化した透明度 / 輪郭 / 輪郭の階層
+    """
+    alpha_channel = cv2.GaussianBlur(alpha_channel, (5, 5), 0)
+    alpha_channel[alpha_channel > 0] = 255
+    # cv2.imshow('alpha_channel', alpha_channel)
+    # cv2.waitKey(0)
+    _, alpha_channel = cv2.threshold(alpha_channel, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    contours, hierarchy = cv2.findContours(alpha_channel, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    return alpha_channel, contours, hierarchy
+
+
+def spread_contours(alpha_channel: np.ndarray, contours: Tuple[np.ndarray, ...],
+                    alpha_spread: int) -> Tuple[np.ndarray, Tuple[np.ndarray, ...], np.ndarray]:
+    """
+    透明度の境界線を太くして近くのパーツをくっつけ、輪郭を検出しなおす
+    :return: 境界線を太くした透明度 / 輪郭 / 輪郭の階層
+    """
+    alpha_channel = cv2.drawContours(alpha_channel, contours, -1, (255, 255, 255), alpha_spread)
+    contours, hierarchy = cv2.findContours(alpha_channel, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    return alpha_channel, contours, hierarchy
+
+
+def iter_contour_indices(hierarchy: np.ndarray) -> Iterator[int]:
+    """
+    パーツとして出力する輪郭のインデックスを順番に返す
+    次の兄弟がなければ子供に進む
+    """
+    if hierarchy is None:
+        # 輪郭が1つもない(全て透明な)画像
+        return
+    h0: List[List[int]] = hierarchy[0]
+    index: int = 0
+    while True:
+        yield index
+        node: List[int] = h0[index]
+        if node[0] >= 0:
+            index = int(node[0])
+        elif node[2] >= 0:
+            index = int(node[2])
+        else:
+            break
+
+
+def get_contour_bbox(contour: np.ndarray, width: int, height: int) -> Tuple[int, int, int, int]:
+    """
+    輪郭の外接矩形を求める
+    :return: x, y, 幅, 高さ
+    """
+    min_x: int = width
+    max_x: int = 0
+    min_y: int = height
+    max_y: int = 0
+    for ct in contour:
+        if min_x > ct[0][0]:
+            min_x = ct[0][0]
+        elif max_x < ct[0][0]:
+            max_x = ct[0][0]
+        if min_y > ct[0][1]:
+            min_y = ct[0][1]
+        elif max_y < ct[0][1]:
+            max_y = ct[0][1]
+    return int(min_x), int(min_y), int(max_x - min_x), int(max_y - min_y)
+
+
+def extract_parts(buf: np.ndarray, org_alpha_channel: np.ndarray, contour: np.ndarray,
+                  bbox: Tuple[int, int, int, int], cutout_alpha: int) -> np.ndarray:
+    """
+    輪郭の内側のピクセルをパーツ画像として切り出す
+    :param buf: 入力画像(RGBA)
+    :param org_alpha_channel: 入力画像の透明度
+    :param contour: パーツの輪郭
+    :param bbox: 輪郭の外接矩形
+    :param cutout_alpha: この値以下の透明度は0にする
+    """
+    min_x, min_y, parts_width, parts_height = bbox
+    parts_img: np.ndarray = np.empty((parts_height, parts_width, 4), dtype=np.uint8)
+    for yy in range(parts_height):
+        for xx in range(parts_width):
+            parts_img[yy, xx] = np.array([0, 0, 0, 0], dtype=np.uint8)
+            if cv2.pointPolygonTest(contour, (float(min_x + xx), float(min_y + yy)), True) >= 0:
+                parts_img[yy, xx] = buf[min_y + yy, min_x + xx]
+                new_alpha: int = org_alpha_channel[min_y + yy, min_x + xx]
+                if new_alpha <= cutout_alpha:
+                    new_alpha = 0
+                parts_img[yy, xx, 3] = new_alpha
+    return parts_img
+
+
+def create_island_info(island_id: int, contour_index: int, contour: np.ndarray,
+                       bbox: Tuple[int, int, int, int], file_name: str | None) -> Dict[str, Any]:
+    """
+    島(パーツ)テーブルの1行を作る 親子関係は create_island_table で埋める
+    """
+    moments: Dict[str, float] = cv2.moments(contour)
+    centroid: List[float]
+    if moments['m00'] != 0:
+        centroid = [moments['m10'] / moments['m00'], moments['m01'] / moments['m00']]
+    else:
+        centroid = [bbox[0] + bbox[2] / 2, bbox[1] + bbox[3] / 2]
+    return {
+        'id': island_id,
+        'contour_index': contour_index,
+        'bbox': list(bbox),
+        'area': float(cv2.contourArea(contour)),
+        'centroid': centroid,
+        'parent': None,
+        'children': [],
+        'file': file_name,
+        'contour': contour.reshape(-1, 2).tolist(),
+    }
+
+
+def create_island_table(islands: List[Dict[str, Any]], hierarchy: np.ndarray) -> List[Dict[str, Any]]:
+    """
+    輪郭の階層から島どうしの親子関係を埋める
+    親の輪郭が島として出力されていない場合はさらに上の輪郭をたどる
+    """
+    if hierarchy is None:
+        return islands
+    h0: List[List[int]] = hierarchy[0]
+    island_by_contour: Dict[int, Dict[str, Any]] = {x['contour_index']: x for x in islands}
+    for island in islands:
+        parent_index: int = h0[island['contour_index']][3]
+        while parent_index >= 0 and parent_index not in island_by_contour:
+            parent_index = h0[parent_index][3]
+        if parent_index >= 0:
+            parent: Dict[str, Any] = island_by_contour[parent_index]
+            island['parent'] = parent['id']
+            parent['children'].append(island['id'])
+    return islands
+
+
+def get_parts_cache_key(bbox: List[int], parts_hash: str) -> str:
+    """
+    前回のパーツと同じかどうかを判定するキー 位置と大きさ(bbox)と切り出したピクセルのハッシュ
+    """
+    return f'{bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]}:{parts_hash}'
+
+
+def assign_parts_file_names(prefix: str, keys: List[str], cached_names: Dict[str, str]) -> List[str]:
+    """
+    パーツのファイル名を決める
+    前回と同じパーツは前回のファイル名をそのまま使う 島が増えたり減ったりしても後ろのパーツを書き直さない
+    新しいパーツは順番どおりの連番の名前を使い、前回のパーツが使っていれば空いている番号にする
+    :param keys: get_parts_cache_key のキー 出力順
+    :param cached_names: 前回のキーからファイル名
+    :return: keys と同じ順のファイル名
+    """
+    names: List[str | None] = [cached_names.get(x) for x in keys]
+    used: Set[str] = {x for x in names if x is not None}
+    number: int = 0
+    for i, name in enumerate(names):
+        if name is not None:
+            continue
+        name = f'{prefix}{i:03d}.png'
+        while name in used:
+            name = f'{prefix}{number:03d}.png'
+            number += 1
+        used.add(name)
+        names[i] = name
+    return names
+
 
 def split(image_path: Path, output_dir_path: Path, prefix: str,
           cutout_alpha: int, min_size: Tuple[int, int], alpha_spread: int, padding: int,
-          save_report_image: bool = False) -> None:
+          save_report_image: bool = False, encode_threads: int = 1, use_cache: bool = False) -> List[Dict[str, Any]]:
     """
     大きなカラー画像を透明度を元にパーツに分割する
     ※ 透明度を持たない画像はエラーになる
@@ -20,27 +229,47 @@ def split(image_path: Path, output_dir_path: Path, prefix: str,
     :param alpha_spread: 入力画像のパーツの不透明美便を拡張する太さ 太くすると近くに配置されたパーツがくっつく
     :param padding: 出力するパーツおのおのの余白サイズ
     :param save_report_image: レポート画像を保存する
+    :param encode_threads: パーツ画像のPNGエンコードを並列で行うスレッド数
+    :param use_cache: 入力画像とパラメータが前回と同じなら処理をスキップし、変わっていれば中身の変わったパーツだけ書き出す
+    :return: 出力したパーツの情報(元画像、出力ファイル、bbox、ハッシュ)のリスト
     """
+    cache_path: Path = _get_cache_path(output_dir_path, prefix)
+    cache_key: Dict[str, Any] = {}
+    # 前回のパーツの get_parts_cache_key からファイル名
+    cached_parts: Dict[str, str] = {}
+    if use_cache:
+        cache_key = {
+            'sheet_hash': _get_file_hash(image_path),
+            'cutout_alpha': cutout_alpha,
+            'min_size': [min_size[0], min_size[1]],
+            'alpha_spread': alpha_spread,
+            'padding': padding,
+            'detection_mode': DETECTION_MODE,
+        }
+        cache: Dict[str, Any] | None = _load_cache(cache_path)
+        if cache is not None:
+            # ファイルが消されたパーツは書き直す
+            cached_parts = {get_parts_cache_key(x['bbox'], x['hash']): Path(x['file']).name for x in cache['parts']
+                            if (output_dir_path / Path(x['file']).name).exists()}
+            report_exists: bool = not save_report_image or (output_dir_path / f'{prefix}@report.png').exists()
+            if cache['key'] == cache_key and report_exists and _get_islands_path(output_dir_path, prefix).exists() and \
+                    len(cached_parts) == len(cache['parts']):
+                print(f'skip unchanged image: {image_path.as_posix()}')
+                return [dict(x, source=image_path.as_posix(), file=(output_dir_path / Path(x['file']).name).as_posix())
+                        for x in cache['parts']]
     # MEMO: cv2は透明度のある画像をch所苦節扱えないようなのでPILも併用している
     col_image: Image = Image.open(image_path)
     buf = np.array(col_image)
     org_alpha_channel = buf[..., 3]
-    alpha_channel = org_alpha_channel.copy()
-    alpha_channel = cv2.GaussianBlur(alpha_channel, (5, 5), 0)
-    alpha_channel[alpha_channel > 0] = 255
-    # cv2.imshow('alpha_channel', alpha_channel)
-    # cv2.waitKey(0)
-    _, alpha_channel = cv2.threshold(alpha_channel, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
     height: int
     width: int
-    height, width = alpha_channel.shape[:3]
-    contours: np.ndarray  # points of contours
+    height, width = org_alpha_channel.shape[:2]
+    contours: Tuple[np.ndarray, ...]  # points of contours
     hierarchy: np.ndarray
-    contours, hierarchy = cv2.findContours(alpha_channel, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    alpha_channel, contours, hierarchy = detect_contours(org_alpha_channel)
     if alpha_spread > 0:
         # 透明度の境界線を太くする
-        alpha_channel = cv2.drawContours(alpha_channel, contours, -1, (255, 255, 255), alpha_spread)
-        contours, hierarchy = cv2.findContours(alpha_channel, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+        alpha_channel, contours, hierarchy = spread_contours(alpha_channel, contours, alpha_spread)
     if save_report_image:
         # レポート画像を表示する
         report_image: np.ndarray = np.empty((height, width, 4), dtype=np.uint8)
@@ -48,61 +277,124 @@ def split(image_path: Path, output_dir_path: Path, prefix: str,
         report_image[..., 3] = alpha_channel
         report_image = cv2.drawContours(report_image, contours, -1, (255, 0, 0, 255), 8)
         Image.fromarray(report_image).save((output_dir_path / f'{prefix}@report.png').as_posix())
-    index: int = 0
     cnt: int = 0
     skip_cnt: int = 0
-    h0: List[List[int]] = hierarchy[0]
-    while True:
+    unchanged_cnt: int = 0
+    parts: List[Dict[str, Any]] = []
+    parts_images: List[np.ndarray] = []
+    islands: List[Dict[str, Any]] = []
+    for index in iter_contour_indices(hierarchy):
         contour = contours[index]
-        min_x: int = width
-        max_x: int = 0
-        min_y: int = height
-        max_y: int = 0
-        for ct in contour:
-            if min_x > ct[0][0]:
-                min_x = ct[0][0]
-            elif max_x < ct[0][0]:
-                max_x = ct[0][0]
-            if min_y > ct[0][1]:
-                min_y = ct[0][1]
-            elif max_y < ct[0][1]:
-                max_y = ct[0][1]
-        parts_width: int = max_x - min_x
-        parts_height: int = max_y - min_y
-        parts_img: np.ndarray = np.empty((parts_height, parts_width, 4), dtype=np.uint8)
+        min_x, min_y, parts_width, parts_height = get_contour_bbox(contour, width, height)
         if parts_width < min_size[0] or parts_height < min_size[1]:
             print(f'output #{cnt + skip_cnt} / {len(contours)} : skip small parts ({parts_width}x{parts_height})')
+            islands.append(create_island_info(cnt + skip_cnt, index, contour,
+                                              (min_x, min_y, parts_width, parts_height), None))
             skip_cnt += 1
         else:
-            for yy in range(parts_height):
-                for xx in range(parts_width):
-                    parts_img[yy, xx] = np.array([0, 0, 0, 0], dtype=np.uint8)
-                    if cv2.pointPolygonTest(contour, (float(min_x + xx), float(min_y + yy)), True) >= 0:
-                        parts_img[yy, xx] = buf[min_y + yy, min_x + xx]
-                        new_alpha: int = org_alpha_channel[min_y + yy, min_x + xx]
-                        if new_alpha <= cutout_alpha:
-                            new_alpha = 0
-                        parts_img[yy, xx, 3] = new_alpha
-            print(f'output #{cnt + skip_cnt} / {len(contours)} : {prefix}{cnt:03d}.png'
-                  f' ({parts_width}x{parts_height} @ {min_x},{min_y})')
+            parts_img: np.ndarray = extract_parts(buf, org_alpha_channel, contour,
+                                                  (min_x, min_y, parts_width, parts_height), cutout_alpha)
             if padding > 0:
                 parts_img = cv2.copyMakeBorder(parts_img, padding, padding, padding, padding, cv2.BORDER_CONSTANT,
                                                value=(0, 0, 0, 0))
-            Image.fromarray(parts_img).save((output_dir_path / f'{prefix}{cnt:03d}.png').as_posix())
+            bbox: List[int] = [min_x, min_y, parts_width, parts_height]
+            # ファイル名は全てのパーツを切り出してから決める
+            islands.append(create_island_info(cnt + skip_cnt, index, contour,
+                                              (min_x, min_y, parts_width, parts_height), None))
+            parts_info: Dict[str, Any] = {
+                'source': image_path.as_posix(),
+                'file': '',
+                'bbox': bbox,
+                'island': islands[-1],
+            }
+            if use_cache:
+                parts_info['hash'] = hashlib.sha256(parts_img.tobytes()).hexdigest()
+            parts.append(parts_info)
+            parts_images.append(parts_img)
             cnt += 1
-        node: List[int] = h0[index]
-        if node[0] >= 0:
-            index = node[0]
-        elif node[2] >= 0:
-            index = node[2]
+    keys: List[str] = [get_parts_cache_key(x['bbox'], x.get('hash', '')) for x in parts]
+    names: List[str] = assign_parts_file_names(prefix, keys, cached_parts)
+    executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=max(1, encode_threads))
+    futures: List[Future] = []
+    for parts_info, parts_img, key, name in zip(parts, parts_images, keys, names):
+        island: Dict[str, Any] = parts_info.pop('island')
+        island['file'] = name
+        parts_path: Path = output_dir_path / name
+        parts_info['file'] = parts_path.as_posix()
+        min_x, min_y, parts_width, parts_height = parts_info['bbox']
+        print(f'output #{island["id"]} / {len(contours)} : {name} ({parts_width}x{parts_height} @ {min_x},{min_y})')
+        if cached_parts.get(key) == name:
+            # 同じ位置で同じピクセルのパーツは書き直さない(更新日時を変えない)
+            unchanged_cnt += 1
         else:
-            break
-    print(f'output {cnt} images, skip {skip_cnt} images')
+            # エンコードはスレッドに任せる
+            futures.append(executor.submit(_save_parts_image, parts_img, parts_path))
+    executor.shutdown(wait=True)
+    for future in futures:
+        future.result()  # エンコード時の例外をここで投げる
+    # 座標からパーツを引けるように島テーブルを残す 検索は island_index.py
+    with open(_get_islands_path(output_dir_path, prefix), 'w', encoding='utf-8') as fp:
+        json.dump({
+            'source': image_path.as_posix(),
+            'width': width,
+            'height': height,
+            'padding': padding,
+            'islands': create_island_table(islands, hierarchy),
+        }, fp, ensure_ascii=False)
+    if use_cache:
+        # 前回出力してもう存在しないパーツを削除する
+        for name in cached_parts.values():
+            if name not in names and (output_dir_path / name).exists():
+                (output_dir_path / name).unlink()
+        with open(cache_path, 'w', encoding='utf-8') as fp:
+            json.dump({'key': cache_key, 'parts': parts}, fp, indent=2, ensure_ascii=False)
+    print(f'output {cnt} images ({unchanged_cnt} unchanged), skip {skip_cnt} images')
+    return parts
+
+
+def is_output_image(image_path: Path, source_stems: Set[str]) -> bool:
+    """
+    前回の出力(パーツ画像 {入力画像名}_000.png やレポート画像 {prefix}@report.png)かどうか
+    出力フォルダを指定しないと入力画像の横に出力するので、フォルダを指定したときに入力として拾わないようにする
+    :param source_stems: 同じフォルダにある画像のファイル名(拡張子なし)
+    """
+    if '@' in image_path.stem:
+        return True
+    m: re.Match | None = PARTS_FILE_NAME_PATTERN.fullmatch(image_path.stem)
+    return m is not None and m.group(1) in source_stems
+
+
+def find_images(paths: List[str]) -> List[Path]:
+    """
+    ファイルとフォルダの指定から入力画像の一覧を作る
+    フォルダは直下のファイルのみ対象にする(出力サブフォルダを拾わないため) 前回の出力も対象にしない
+    """
+    ret: List[Path] = []
+    for path in paths:
+        p: Path = Path(path)
+        assert p.exists(), f'file not found: {path}'
+        if p.is_dir():
+            files: List[Path] = sorted(x for x in p.iterdir()
+                                       if x.is_file() and x.suffix.lower() in SRC_IMAGE_EXTENSIONS)
+            source_stems: Set[str] = {x.stem for x in files}
+            for x in files:
+                if is_output_image(x, source_stems):
+                    print(f'skip output image: {x.as_posix()}')
+                else:
+                    ret.append(x)
+        else:
+            ret.append(p)
+    return ret
+
+
+def _split_sheet(params: Tuple) -> List[Dict[str, Any]]:
+    # ProcessPoolExecutorから呼ぶためトップレベルに置く
+    return split(*params)
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('src_image', type=str, help='source image file path')
+    parser.add_argument('src_images', type=str, nargs='+', help='source image file or directory paths')
     parser.add_argument('-o', '--output_dir', type=str, default='', help='output directory')
     parser.add_argument('--create_subdir', action="store_true",
                         help='create output subdirectory named by source image file name')
@@ -115,19 +407,18 @@ def main():
     parser.add_argument('-mg', '--padding', type=int, default=0,
                         help='padding px size for exported parts.')
     parser.add_argument('--save_report_image',  action="store_true", help='save report image including contours.')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='number of processes to split source images in parallel.')
+    parser.add_argument('--encode_threads', type=int, default=4,
+                        help='number of threads to encode parts images of each source image.')
+    parser.add_argument('--manifest', type=str, default='',
+                        help='write json manifest listing all exported parts to this path.')
+    parser.add_argument('--cache', action="store_true",
+                        help='skip unchanged source images and rewrite only changed parts.')
     args = parser.parse_args()
 
-    src_image_path: Path = Path(args.src_image)
-    assert src_image_path.exists(), f'file not found: {args.src_image}'
-    output_dir_path: Path = src_image_path.parent
-    if len(args.output_dir) > 0:
-        output_dir_path = Path(args.output_dir)
-    prefix: str = src_image_path.stem + '_'
-    if args.create_subdir:
-        prefix = ''
-        output_dir_path = output_dir_path / src_image_path.stem
-        output_dir_path.mkdir(parents=True, exist_ok=True)
-    assert output_dir_path.exists(), f'file not found: {args.output_dir}'
+    src_image_paths: List[Path] = find_images(args.src_images)
+    assert len(src_image_paths) > 0, f'image not found: {args.src_images}'
     cutout_alpha: int = args.cutout_alpha
     assert 0 <= cutout_alpha <= 255, f'cutout_alpha must be 0~255: {cutout_alpha}'
     min_size: Tuple[int, int] = args.min_size
@@ -137,17 +428,54 @@ def main():
     padding: int = args.padding
     assert 0 <= padding, f'padding must be 0~: {padding}'
     save_report_image: bool = args.save_report_image
-    split(src_image_path, output_dir_path, prefix, cutout_alpha, min_size, alpha_spread, padding, save_report_image)
+    assert 0 < args.jobs, f'jobs must be 1~: {args.jobs}'
+    assert 0 < args.encode_threads, f'encode_threads must be 1~: {args.encode_threads}'
+
+    jobs: List[Tuple] = []
+    for src_image_path in src_image_paths:
+        output_dir_path: Path = src_image_path.parent
+        if len(args.output_dir) > 0:
+            output_dir_path = Path(args.output_dir)
+        prefix: str = src_image_path.stem + '_'
+        if args.create_subdir:
+            prefix = ''
+            output_dir_path = output_dir_path / src_image_path.stem
+            output_dir_path.mkdir(parents=True, exist_ok=True)
+        assert output_dir_path.exists(), f'file not found: {args.output_dir}'
+        jobs.append((src_image_path, output_dir_path, prefix, cutout_alpha, min_size, alpha_spread, padding,
+                     save_report_image, args.encode_threads, args.cache))
+
+    results: List[List[Dict[str, Any]]]
+    if len(jobs) == 1 or args.jobs == 1:
+        results = [_split_sheet(job) for job in jobs]
+    else:
+        # 1プロセスで複数の画像を処理してcv2などのインポートコストを共有する
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(jobs))) as executor:
+            results = list(executor.map(_split_sheet, jobs))
+
+    if len(args.manifest) > 0:
+        manifest: Dict[str, Any] = {
+            'params': {
+                'cutout_alpha': cutout_alpha,
+                'min_size': list(min_size),
+                'alpha_spread': alpha_spread,
+                'padding': padding,
+            },
+            'parts': [part for parts in results for part in parts],
+        }
+        with open(args.manifest, 'w', encoding='utf-8') as fp:
+            json.dump(manifest, fp, indent=2, ensure_ascii=False)
+    print(f'split {len(jobs)} source images')
 
 
 if __name__ == '__main__':
     main()
 
 """
-usage: split_image_island.py [-h] [-o OUTPUT_DIR] [--create_subdir] [-ca CUTOUT_ALPHA] [-ms MIN_SIZE MIN_SIZE] [-as ALPHA_SPREAD] [-mg PADDING] [--save_report_image] src_image
+usage: split_image_island.py [-h] [-o OUTPUT_DIR] [--create_subdir] [-ca CUTOUT_ALPHA] [-ms MIN_SIZE MIN_SIZE] [-as ALPHA_SPREAD] [-mg PADDING] [--save_report_image] [-j JOBS] [--encode_threads ENCODE_THREADS] [--manifest MANIFEST] [--cache] src_images [src_images ...]
 
 positional arguments:
-  src_image             source image file path
+  src_images            source image file or directory paths
 
 options:
   -h, --help            show this help message and exit
@@ -163,6 +491,11 @@ options:
   -mg PADDING, --padding PADDING
                         padding px size for exported parts.
   --save_report_image   save report image including contours.
+  -j JOBS, --jobs JOBS  number of processes to split source images in parallel.
+  --encode_threads ENCODE_THREADS
+                        number of threads to encode parts images of each source image.
+  --manifest MANIFEST   write json manifest listing all exported parts to this path.
+  --cache               skip unchanged source images and rewrite only changed parts.
 """
 
 #  参考 https://emotionexplorer.blog.fc2.com/blog-entry-88.html
@@ -0,0 +1,78 @@
+import sys
+import tempfile
+from pathlib import Path
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+from create_sdf_image import load_mask, create_sdf, find_max_inscribed_circle, normalize_sdf, save_sdf
+
+
+def _create_disc(size: int, center: int, radius: int) -> np.ndarray:
+    yy, xx = np.mgrid[:size, :size]
+    return (((xx - center) ** 2 + (yy - center) ** 2) <= radius ** 2).astype(np.uint8) * 255
+
+
+def test_sdf_sign():
+    mask: np.ndarray = _create_disc(200, 100, 40)
+    for precise in [False, True]:
+        sdf, _ = create_sdf(mask, precise)
+        # 内側が正、外側が負 境界のピクセルは ±0.5
+        assert (sdf[mask > 0] > 0).all() and (sdf[mask == 0] < 0).all()
+        assert sdf[100, 60] == 0.5 and sdf[100, 59] == -0.5
+        assert abs(sdf[100, 100] - 39.5) < 0.6
+        assert abs(sdf[0, 0] + (np.hypot(100, 100) - 40)) < 1.5
+
+
+def test_max_inscribed_circle():
+    for precise in [False, True]:
+        _, inside = create_sdf(_create_disc(200, 100, 40), precise)
+        center, radius = find_max_inscribed_circle(inside)
+        assert center == (100, 100) and abs(radius - 40) < 0.6
+        square: np.ndarray = np.zeros((120, 160), dtype=np.uint8)
+        square[20:81, 50:111] = 255
+        _, inside = create_sdf(square, precise)
+        center, radius = find_max_inscribed_circle(inside)
+        assert center == (80, 50) and abs(radius - 31) < 0.01
+
+
+def test_precise_matches_default():
+    rng = np.random.default_rng(0)
+    mask: np.ndarray = np.zeros((256, 256), dtype=np.uint8)
+    for x, y, r in rng.integers(16, 240, (6, 3)):
+        mask = np.maximum(mask, np.roll(np.roll(_create_disc(256, 128, int(r) // 4 + 4), x - 128, 1), y - 128, 0))
+    approx, _ = create_sdf(mask)
+    precise, _ = create_sdf(mask, True)
+    # 5x5マスクの近似の誤差は距離の2%程度まで
+    assert (np.abs(approx - precise) <= np.abs(precise) * 0.02 + 0.5).all()
+    assert np.array_equal(np.sign(approx), np.sign(precise))
+
+
+def test_save_sdf():
+    mask: np.ndarray = _create_disc(64, 32, 16)
+    sdf, _ = create_sdf(mask, True)
+    with tempfile.TemporaryDirectory() as tmp:
+        save_sdf(sdf, Path(tmp) / "sdf.npy", 0.0, 8)
+        assert np.array_equal(np.load(Path(tmp) / "sdf.npy"), sdf)
+        save_sdf(sdf, Path(tmp) / "sdf8.png", 8.0, 8)
+        save_sdf(sdf, Path(tmp) / "sdf16.png", 8.0, 16)
+        a8: np.ndarray = np.asarray(Image.open(Path(tmp) / "sdf8.png"))
+        a16: np.ndarray = np.asarray(Image.open(Path(tmp) / "sdf16.png"))
+        assert a8.dtype == np.uint8 and a16.dtype == np.uint16
+        expected: np.ndarray = normalize_sdf(sdf, 8.0)
+        assert np.abs(a8 / 255.0 - expected).max() <= 0.5 / 255.0 + 1e-6
+        assert np.abs(a16 / 65535.0 - expected).max() <= 0.5 / 65535.0 + 1e-6
+        # spread の距離で 0 と 1 になり、境界(内外のピクセルの間)が 0.5
+        assert a8[32, 32] == 255 and a8[0, 0] == 0 and a8[32, 16] > 128 > a8[32, 15]
+        # 透明度のある画像は透明度からマスクを作る
+        rgba: np.ndarray = np.zeros((64, 64, 4), dtype=np.uint8)
+        rgba[..., 3] = mask
+        Image.fromarray(rgba).save(Path(tmp) / "src.png")
+        assert np.array_equal(load_mask(Path(tmp) / "src.png", 127), mask)
+
+
+if __name__ == '__main__':
+    test_sdf_sign()
+    test_max_inscribed_circle()
+    test_precise_matches_default()
+    test_save_sdf()
@@ -0,0 +1,79 @@
+import sys
+import time
+from pathlib import Path
+from typing import List, Dict, Any
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+from island_index import IslandIndex, _point_in_polygon, _distance_to_bbox
+
+
+def _create_islands(rng: np.random.Generator, count: int) -> List[Dict[str, Any]]:
+    """
+    ランダムな大きさの菱形の島 重なりや入れ子も含む
+    """
+    islands: List[Dict[str, Any]] = []
+    for i in range(count):
+        w, h = (int(v) for v in rng.integers(2, 120, 2))
+        x, y = (int(v) for v in rng.integers(0, 1000, 2))
+        contour: List[List[int]] = [[x + w // 2, y], [x + w, y + h // 2], [x + w // 2, y + h], [x, y + h // 2]]
+        islands.append({'id': i, 'bbox': [x, y, w, h], 'area': w * h // 2, 'contour': contour})
+    return islands
+
+
+def test_find_at():
+    rng = np.random.default_rng(0)
+    islands = _create_islands(rng, 300)
+    for cell_size in [0, 16, 200]:
+        index = IslandIndex(islands, cell_size)
+        for x, y in rng.uniform(-20, 1140, (500, 2)):
+            expected = sorted((o for o in islands if o['bbox'][0] <= x <= o['bbox'][0] + o['bbox'][2] and
+                               o['bbox'][1] <= y <= o['bbox'][1] + o['bbox'][3] and
+                               _point_in_polygon(x, y, o['contour'])), key=lambda o: o['area'])
+            assert [o['id'] for o in index.find_at(x, y)] == [o['id'] for o in expected]
+
+
+def test_find_in_region():
+    rng = np.random.default_rng(1)
+    islands = _create_islands(rng, 300)
+    index = IslandIndex(islands)
+    for _ in range(300):
+        x0, y0 = rng.uniform(-50, 1100, 2)
+        x1, y1 = x0 + rng.uniform(0, 300), y0 + rng.uniform(0, 300)
+        expected = [o['id'] for o in islands if o['bbox'][0] <= x1 and x0 <= o['bbox'][0] + o['bbox'][2] and
+                    o['bbox'][1] <= y1 and y0 <= o['bbox'][1] + o['bbox'][3]]
+        assert [o['id'] for o in index.find_in_region(x0, y0, x1, y1)] == expected
+
+
+def test_find_nearest():
+    rng = np.random.default_rng(2)
+    islands = _create_islands(rng, 40)
+    for cell_size in [0, 8, 64]:
+        index = IslandIndex(islands, cell_size)
+        for x, y in rng.uniform(-300, 1400, (500, 2)):
+            nearest = index.find_nearest(x, y)
+            expected: float = min(_distance_to_bbox(x, y, o['bbox']) for o in islands)
+            assert abs(_distance_to_bbox(x, y, nearest['bbox']) - expected) < 1e-9, (x, y, cell_size)
+    assert IslandIndex([]).find_nearest(10, 10) is None
+
+
+def test_far_queries():
+    rng = np.random.default_rng(3)
+    islands = _create_islands(rng, 200)
+    index = IslandIndex(islands, 8)
+    start: float = time.perf_counter()
+    for x, y in [(2000, 2000), (20000, 20000), (-50000, 500), (500, 1e6), (-1e6, -1e6)]:
+        nearest = index.find_nearest(x, y)
+        expected: float = min(_distance_to_bbox(x, y, o['bbox']) for o in islands)
+        assert abs(_distance_to_bbox(x, y, nearest['bbox']) - expected) < 1e-9, (x, y)
+    assert index.find_in_region(1e5, 1e5, 1e6, 1e6) == []
+    assert len(index.find_in_region(-1e6, -1e6, 1e6, 1e6)) == len(islands)
+    # 島の無い格子を1つずつ調べていると数秒かかる
+    assert time.perf_counter() - start < 1.0
+
+
+if __name__ == '__main__':
+    test_find_at()
+    test_find_in_region()
+    test_find_nearest()
+    test_far_queries()
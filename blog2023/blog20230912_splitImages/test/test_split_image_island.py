@@ -0,0 +1,106 @@
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Dict, Any
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+from split_image_island import is_output_image, find_images, iter_contour_indices, create_island_table, \
+    detect_contours, get_contour_bbox, split, get_parts_cache_key, assign_parts_file_names
+
+
+def _create_sheet(path: Path, rects: List[List[int]]) -> None:
+    """
+    :param rects: 不透明にする x, y, 幅, 高さ
+    """
+    a: np.ndarray = np.zeros((120, 160, 4), dtype=np.uint8)
+    for x, y, w, h in rects:
+        a[y:y + h, x:x + w] = [255, x, y, 255]
+    Image.fromarray(a).save(path)
+
+
+def test_is_output_image():
+    stems = {'s2', 's2_000', 's2_001_000', 'bg'}
+    assert is_output_image(Path('s2_000.png'), stems)
+    assert is_output_image(Path('s2_001_000.png'), stems | {'s2_001'})
+    assert is_output_image(Path('s2_@report.png'), stems)
+    assert not is_output_image(Path('s2.png'), stems)
+    # 同じ名前の入力画像が無ければ連番の付いた入力画像とみなす
+    assert not is_output_image(Path('chara_000.png'), stems)
+
+
+def test_find_images_skips_previous_output():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder: Path = Path(temp_dir)
+        for name in ['s2.png', 's2_000.png', 's2_001.png', 's2_@report.png', 'chara_000.png']:
+            _create_sheet(folder / name, [])
+        assert [x.name for x in find_images([temp_dir])] == ['chara_000.png', 's2.png']
+        # ファイルを直接指定した場合はそのまま使う
+        assert [x.name for x in find_images([(folder / 's2_000.png').as_posix()])] == ['s2_000.png']
+
+
+def test_no_contours():
+    # 全て透明な画像は findContours の階層が None になる
+    _, contours, hierarchy = detect_contours(np.zeros((32, 32), dtype=np.uint8))
+    assert len(contours) == 0 and hierarchy is None
+    assert list(iter_contour_indices(hierarchy)) == []
+    assert create_island_table([], hierarchy) == []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        _create_sheet(Path(temp_dir) / 'empty.png', [])
+        assert split(Path(temp_dir) / 'empty.png', Path(temp_dir), 'empty_', 0, (0, 0), 0, 0) == []
+
+
+def test_get_contour_bbox():
+    _, contours, hierarchy = detect_contours(np.pad(np.full((10, 20), 255, dtype=np.uint8), ((5, 5), (30, 10))))
+    x, y, w, h = get_contour_bbox(contours[next(iter_contour_indices(hierarchy))], 60, 20)
+    # 5x5でぼかしてから2値化するので2px広がる 幅と高さは端の座標の差
+    assert (x, y, w, h) == (28, 3, 23, 13)
+
+
+def test_assign_parts_file_names():
+    a: str = get_parts_cache_key([0, 0, 10, 10], 'aaa')
+    b: str = get_parts_cache_key([20, 0, 10, 10], 'bbb')
+    c: str = get_parts_cache_key([40, 0, 10, 10], 'ccc')
+    assert get_parts_cache_key([0, 0, 10, 10], 'aaa2') != a
+    assert assign_parts_file_names('s_', [a, b], {}) == ['s_000.png', 's_001.png']
+    # 前に島が増えても前回のパーツは同じ名前 新しいパーツは空いている番号
+    assert assign_parts_file_names('s_', [c, a, b], {a: 's_000.png', b: 's_001.png'}) == \
+        ['s_002.png', 's_000.png', 's_001.png']
+    assert assign_parts_file_names('s_', [c, b], {a: 's_000.png', b: 's_001.png'}) == ['s_000.png', 's_001.png']
+    # 無くなったパーツの名前は新しいパーツが使う
+    assert assign_parts_file_names('s_', [a, c], {b: 's_000.png'}) == ['s_000.png', 's_001.png']
+
+
+def test_split_cache_keeps_unchanged_parts():
+    rects: List[List[int]] = [[10, 10, 20, 20], [60, 10, 20, 20], [110, 10, 20, 20]]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder: Path = Path(temp_dir)
+        sheet_path: Path = folder / 's.png'
+        _create_sheet(sheet_path, rects)
+        first: Dict[str, List[int]] = {Path(x['file']).name: x['bbox']
+                                       for x in split(sheet_path, folder, 's_', 0, (0, 0), 0, 0, use_cache=True)}
+        mtimes: Dict[str, int] = {x: (folder / x).stat().st_mtime_ns for x in first}
+        # 先頭に島を1つ足しても、前からあるパーツは同じ名前のまま書き直されない
+        _create_sheet(sheet_path, [[10, 60, 30, 30]] + rects)
+        parts: List[Dict[str, Any]] = split(sheet_path, folder, 's_', 0, (0, 0), 0, 0, use_cache=True)
+        second: Dict[str, List[int]] = {Path(x['file']).name: x['bbox'] for x in parts}
+        assert len(second) == 4
+        for name, bbox in first.items():
+            assert second[name] == bbox
+            assert (folder / name).stat().st_mtime_ns == mtimes[name]
+        # 島を消すとそのパーツのファイルだけ消える
+        _create_sheet(sheet_path, rects)
+        third: Dict[str, List[int]] = {Path(x['file']).name: x['bbox']
+                                       for x in split(sheet_path, folder, 's_', 0, (0, 0), 0, 0, use_cache=True)}
+        assert third == first
+        assert sorted(x.name for x in folder.glob('s_0*.png')) == sorted(first)
+
+
+if __name__ == '__main__':
+    test_is_output_image()
+    test_find_images_skips_previous_output()
+    test_no_contours()
+    test_get_contour_bbox()
+    test_assign_parts_file_names()
+    test_split_cache_keeps_unchanged_parts()